@@ -2,17 +2,20 @@
 AI 助手管理后台配置
 """
 from django.contrib import admin
-from .models import AIInteraction, KnowledgeDocument, AgentConfig, ToolUsage
+from .models import (
+    AIInteraction, KnowledgeDocument, AgentConfig, ToolUsage, AgentStep,
+    CourseAnalysisRun, CourseAnalysisResult, ConversationSession
+)
 
 @admin.register(AIInteraction)
 class AIInteractionAdmin(admin.ModelAdmin):
     """
     AI 交互记录管理
     """
-    list_display = ('id', 'user', 'course', 'interaction_type', 'timestamp', 'feedback_score')
-    list_filter = ('interaction_type', 'course', 'timestamp', 'feedback_score')
+    list_display = ('id', 'user', 'course', 'interaction_type', 'status', 'cache_hit', 'model_route', 'latency', 'timestamp', 'feedback_score')
+    list_filter = ('interaction_type', 'status', 'cache_hit', 'model_route', 'course', 'timestamp', 'feedback_score')
     search_fields = ('user__username', 'course__name', 'query')
-    readonly_fields = ('timestamp',)
+    readonly_fields = ('timestamp', 'started_at', 'completed_at')
     ordering = ('-timestamp',)
     
     # 日期层次结构
@@ -29,6 +32,12 @@ class AIInteractionAdmin(admin.ModelAdmin):
         ('上下文信息', {
             'fields': ('context',)
         }),
+        ('任务状态', {
+            'fields': ('status', 'cache_hit', 'error_message', 'started_at', 'completed_at')
+        }),
+        ('模型路由', {
+            'fields': ('model_route', 'model_id', 'latency')
+        }),
         ('反馈信息', {
             'fields': ('feedback_score', 'feedback_comment')
         }),
@@ -57,7 +66,7 @@ class KnowledgeDocumentAdmin(admin.ModelAdmin):
             'fields': ('content', 'metadata')
         }),
         ('处理信息', {
-            'fields': ('chunk_index', 'embedding')
+            'fields': ('chunk_index', 'embedding', 'embedding_model', 'embedding_hash', 'tokenizer', 'tokens')
         }),
         ('时间信息', {
             'fields': ('created_at', 'updated_at')
@@ -113,4 +122,76 @@ class ToolUsageAdmin(admin.ModelAdmin):
         ('时间信息', {
             'fields': ('created_at',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(AgentStep)
+class AgentStepAdmin(admin.ModelAdmin):
+    """
+    代理步骤记录管理
+    """
+    list_display = ('id', 'interaction', 'agent_type', 'step_number', 'duration', 'llm_duration', 'input_tokens', 'output_tokens', 'created_at')
+    list_filter = ('agent_type', 'is_final_answer', 'created_at')
+    readonly_fields = ('created_at',)
+    ordering = ('-created_at',)
+    
+    # 字段集
+    fieldsets = (
+        ('关联信息', {
+            'fields': ('interaction', 'agent_type', 'step_number')
+        }),
+        ('耗时信息', {
+            'fields': ('duration', 'llm_duration', 'execution_time')
+        }),
+        ('令牌用量', {
+            'fields': ('input_tokens', 'output_tokens')
+        }),
+        ('执行信息', {
+            'fields': ('tool_calls', 'is_final_answer', 'error_message')
+        }),
+        ('时间信息', {
+            'fields': ('created_at',)
+        }),
+    )
+
+class CourseAnalysisResultInline(admin.TabularInline):
+    """
+    课程分析结果内联
+    """
+    model = CourseAnalysisResult
+    fields = ('course', 'status', 'duration', 'error_message', 'completed_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+@admin.register(CourseAnalysisRun)
+class CourseAnalysisRunAdmin(admin.ModelAdmin):
+    """
+    课程批量分析任务管理
+    """
+    list_display = ('id', 'analysis_type', 'status', 'concurrency', 'created_by', 'created_at', 'completed_at')
+    list_filter = ('analysis_type', 'status', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'completed_at')
+    ordering = ('-created_at',)
+    inlines = [CourseAnalysisResultInline]
+
+@admin.register(CourseAnalysisResult)
+class CourseAnalysisResultAdmin(admin.ModelAdmin):
+    """
+    课程分析结果管理
+    """
+    list_display = ('id', 'run', 'course', 'analysis_type', 'status', 'duration', 'completed_at')
+    list_filter = ('analysis_type', 'status', 'completed_at')
+    search_fields = ('course__name', 'report')
+    readonly_fields = ('started_at', 'completed_at')
+    ordering = ('-run', 'course')
+
+@admin.register(ConversationSession)
+class ConversationSessionAdmin(admin.ModelAdmin):
+    """
+    对话会话管理
+    """
+    list_display = ('id', 'user', 'course', 'title', 'summarized_until', 'updated_at')
+    list_filter = ('updated_at',)
+    search_fields = ('title', 'summary', 'user__username')
+    readonly_fields = ('created_at', 'updated_at')
+    ordering = ('-updated_at',)
@@ -0,0 +1,304 @@
+"""
+AI 请求准入控制
+按用户和课程的令牌桶限制提问速率；同时运行的代理数达到上限后，新请求进入有界公平队列，
+在课程之间按权重轮转、在同一课程的用户之间轮流放行，避免单个用户或课程占满全部代理
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Hashable, Iterator, Optional
+from agents.config import ADMISSION_CONFIG, POOL_CONFIG
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """
+    请求超出速率限制或排队已满
+    """
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    令牌桶
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        """
+        初始化令牌桶
+        
+        Args:
+            rate (float): 每秒补充的令牌数
+            capacity (float): 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        
+    def refill(self, now: float):
+        """
+        按经过的时间补充令牌
+        """
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            
+    def wait_time(self) -> float:
+        """
+        距离有可用令牌还需等待的时间（秒），有令牌时为0
+        """
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+class _Waiter:
+    """
+    排队中的请求
+    """
+    def __init__(self, user_id: Hashable):
+        self.user_id = user_id
+        self.event = threading.Event()
+        self.granted = False
+
+class AdmissionController:
+    """
+    AI 请求准入控制类
+    """
+    
+    def __init__(self,
+                 max_active: Optional[int] = None,
+                 max_waiting: Optional[int] = None,
+                 max_waiting_per_user: Optional[int] = None,
+                 queue_timeout: Optional[float] = None,
+                 course_weights: Optional[Dict[Any, int]] = None):
+        """
+        初始化准入控制
+        
+        Args:
+            max_active (Optional[int]): 同时运行的代理数上限，默认与代理池大小相同
+            max_waiting (Optional[int]): 排队请求总数上限
+            max_waiting_per_user (Optional[int]): 每个用户排队请求数上限
+            queue_timeout (Optional[float]): 排队的最长等待时间（秒）
+            course_weights (Optional[Dict[Any, int]]): 课程权重，每轮放行的请求数，未配置的课程为1
+        """
+        self.max_active = max_active or ADMISSION_CONFIG['MAX_ACTIVE'] or POOL_CONFIG['POOL_SIZE']
+        self.max_waiting = max_waiting or ADMISSION_CONFIG['MAX_WAITING']
+        self.max_waiting_per_user = max_waiting_per_user or ADMISSION_CONFIG['MAX_WAITING_PER_USER']
+        self.queue_timeout = queue_timeout if queue_timeout is not None else ADMISSION_CONFIG['QUEUE_TIMEOUT']
+        self.course_weights = course_weights if course_weights is not None else ADMISSION_CONFIG['COURSE_WEIGHTS']
+        self.retry_after = ADMISSION_CONFIG['RETRY_AFTER']
+        
+        self._lock = threading.Lock()
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._active = 0
+        
+        # 课程 -> 用户 -> 排队请求，课程和用户按轮转顺序排列
+        self._queues: 'OrderedDict[Any, OrderedDict[Hashable, Deque[_Waiter]]]' = OrderedDict()
+        self._credits: Dict[Any, int] = {}
+        self._waiting = 0
+        self._user_waiting: Dict[Hashable, int] = {}
+        
+        # 统计
+        self._admitted = 0
+        self._queued = 0
+        self._rejected = 0
+        
+    def _bucket(self, kind: str, key: Hashable) -> TokenBucket:
+        """
+        获取用户或课程的令牌桶
+        """
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            prefix = kind.upper()
+            bucket = self._buckets[(kind, key)] = TokenBucket(
+                ADMISSION_CONFIG[f'{prefix}_RATE'],
+                ADMISSION_CONFIG[f'{prefix}_BURST']
+            )
+        return bucket
+        
+    def check_rate(self, user_id: Hashable, course_id: Optional[Any] = None):
+        """
+        检查提问速率，用户和课程的令牌桶都有令牌时各取一个
+        
+        Args:
+            user_id (Hashable): 用户ID
+            course_id (Optional[Any]): 课程ID，通用助手为None
+            
+        Raises:
+            AdmissionRejected: 超出速率限制
+        """
+        if not ADMISSION_CONFIG['ENABLED']:
+            return
+            
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._bucket('user', user_id)]
+            if course_id is not None:
+                buckets.append(self._bucket('course', course_id))
+            for bucket in buckets:
+                bucket.refill(now)
+                
+            wait = max(bucket.wait_time() for bucket in buckets)
+            if wait > 0:
+                self._rejected += 1
+                raise AdmissionRejected("提问过于频繁，请稍后重试", max(1, int(wait + 0.999)))
+                
+            for bucket in buckets:
+                bucket.tokens -= 1
+                
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """
+        按课程权重轮转、课程内按用户轮流取出下一个排队请求
+        """
+        if not self._queues:
+            return None
+            
+        course_id, users = next(iter(self._queues.items()))
+        if self._credits.get(course_id, 0) <= 0:
+            self._credits[course_id] = max(1, int(self.course_weights.get(course_id, 1)))
+            
+        user_id, waiters = next(iter(users.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            users.move_to_end(user_id)
+        else:
+            del users[user_id]
+            
+        self._waiting -= 1
+        self._user_waiting[user_id] -= 1
+        if not self._user_waiting[user_id]:
+            del self._user_waiting[user_id]
+            
+        # 课程用完本轮的放行次数后轮到下一门课程
+        self._credits[course_id] -= 1
+        if not users:
+            del self._queues[course_id]
+            del self._credits[course_id]
+        elif self._credits[course_id] <= 0:
+            self._queues.move_to_end(course_id)
+        return waiter
+        
+    def _remove(self, waiter: _Waiter, course_id: Any):
+        """
+        把等待超时的请求移出队列
+        """
+        users = self._queues.get(course_id, {})
+        waiters = users.get(waiter.user_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del users[waiter.user_id]
+        if not users:
+            self._queues.pop(course_id, None)
+            self._credits.pop(course_id, None)
+        self._waiting -= 1
+        self._user_waiting[waiter.user_id] -= 1
+        if not self._user_waiting[waiter.user_id]:
+            del self._user_waiting[waiter.user_id]
+            
+    def acquire(self, user_id: Hashable, course_id: Optional[Any] = None, timeout: Optional[float] = None):
+        """
+        获取运行名额，名额已满时排队等待
+        
+        Args:
+            user_id (Hashable): 用户ID
+            course_id (Optional[Any]): 课程ID，通用助手为None
+            timeout (Optional[float]): 最长等待时间（秒），不超过 queue_timeout，用于请求剩余时间较短时
+            
+        Raises:
+            AdmissionRejected: 排队已满或等待超时
+        """
+        with self._lock:
+            if self._active < self.max_active and not self._waiting:
+                self._active += 1
+                self._admitted += 1
+                return
+                
+            if self._waiting >= self.max_waiting or self._user_waiting.get(user_id, 0) >= self.max_waiting_per_user:
+                self._rejected += 1
+                raise AdmissionRejected("AI 助手当前排队已满，请稍后重试", self.retry_after)
+                
+            waiter = _Waiter(user_id)
+            self._queues.setdefault(course_id, OrderedDict()).setdefault(user_id, deque()).append(waiter)
+            self._waiting += 1
+            self._user_waiting[user_id] = self._user_waiting.get(user_id, 0) + 1
+            self._queued += 1
+            
+        wait_timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        if waiter.event.wait(wait_timeout):
+            return
+            
+        with self._lock:
+            # 超时与放行同时发生时以放行为准
+            if waiter.granted:
+                return
+            self._remove(waiter, course_id)
+            self._rejected += 1
+        logger.warning(f"用户 {user_id} 的 AI 请求排队超时（{wait_timeout:.1f} 秒）")
+        raise AdmissionRejected("AI 助手当前繁忙，请稍后重试", self.retry_after)
+        
+    def release(self):
+        """
+        释放运行名额，有排队请求时直接转交给下一个请求
+        """
+        with self._lock:
+            waiter = self._next_waiter()
+            if waiter is None:
+                self._active -= 1
+                return
+            waiter.granted = True
+            self._admitted += 1
+        waiter.event.set()
+        
+    @contextmanager
+    def slot(self,
+             user_id: Optional[Hashable],
+             course_id: Optional[Any] = None,
+             timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        在运行名额内执行代理，没有用户信息（如内部任务）或未启用时不排队
+        
+        Args:
+            user_id (Optional[Hashable]): 用户ID
+            course_id (Optional[Any]): 课程ID
+            timeout (Optional[float]): 最长排队时间（秒）
+            
+        Raises:
+            AdmissionRejected: 排队已满或等待超时
+        """
+        if user_id is None or not ADMISSION_CONFIG['ENABLED']:
+            yield
+            return
+            
+        self.acquire(user_id, course_id, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+            
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取准入控制统计
+        
+        Returns:
+            Dict[str, Any]: 运行中和排队中的请求数、累计放行、排队和拒绝次数
+        """
+        with self._lock:
+            return {
+                'enabled': ADMISSION_CONFIG['ENABLED'],
+                'max_active': self.max_active,
+                'active': self._active,
+                'waiting': self._waiting,
+                'admitted': self._admitted,
+                'queued': self._queued,
+                'rejected': self._rejected,
+            }
+
+# 全局准入控制实例（每个工作进程一个）
+admission_controller = AdmissionController()
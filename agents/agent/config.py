@@ -4,9 +4,13 @@ AI 代理配置管理
 from typing import Dict, Any, Optional
 import logging
 import os
+from agents.config import RAG_CONFIG
 
 logger = logging.getLogger(__name__)
 
+# 回答方式：agent 为多步代理，rag 为检索后单次调用模型
+ANSWER_MODES = ('agent', 'rag')
+
 class AgentConfig:
     """
     AI 代理配置类
@@ -26,6 +30,9 @@ class AgentConfig:
         'verbosity_level': 2,
         'stream_outputs': True,
         
+        # 回答方式（学生答疑），rag 模式检索置信度低时自动改用多步代理
+        'answer_mode': RAG_CONFIG['DEFAULT_MODE'],
+        
         # 工具配置
         'tools': ['edusys_retriever'],
         
@@ -101,6 +108,23 @@ class AgentConfig:
         """
         return self.config.get('tools', [])
         
+    def get_answer_mode(self, mode: Optional[str] = None) -> str:
+        """
+        获取回答方式
+        
+        Args:
+            mode (Optional[str]): 请求指定的回答方式，优先于配置
+            
+        Returns:
+            str: 回答方式（'agent' 或 'rag'）
+        """
+        for candidate in (mode, self.config.get('answer_mode')):
+            if candidate in ANSWER_MODES:
+                return candidate
+            if candidate:
+                logger.warning(f"未知的回答方式: {candidate}")
+        return 'agent'
+        
     def to_dict(self) -> Dict[str, Any]:
         """
         将配置转换为字典
@@ -1,14 +1,29 @@
 """
 AI 代理核心逻辑实现
 """
-from typing import Dict, Any, Optional, Union
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Union
 from smolagents import CodeAgent
+from smolagents.memory import ActionStep, FinalAnswerStep
+from smolagents.models import ChatMessage, ChatMessageStreamDelta, MessageRole
 from agents.agent.factory import get_agent, agent_factory
-from agents.agent.config import AgentConfig
+from agents.agent.config import AgentConfig, AGENT_CONFIGS
+from agents.config import RAG_CONFIG
+from agents.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from agents.tools.context_packer import context_packer
+from agents.tracing import record_answer_step, record_tool_call
+from agents.utils import agent_context
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# 单次检索回答的系统提示词
+RAG_SYSTEM_PROMPT = (
+    "你是 EduSys 的课程答疑助手。请只根据提供的课程资料回答学生的问题，回答简洁准确；"
+    "资料中没有相关内容时，直接说明无法根据课程资料回答。"
+)
+
 class EduSysAgent:
     """
     EduSys AI 代理核心类
@@ -26,9 +41,32 @@ class EduSysAgent:
         self.config = config
         self.agent = get_agent(agent_type, config)
         
+    def _get_config(self) -> AgentConfig:
+        """
+        获取代理配置，未指定时使用该代理类型的默认配置
+        """
+        return self.config or AGENT_CONFIGS.get(self.agent_type) or AgentConfig()
+        
+    def partial_answer(self) -> str:
+        """
+        从代理记忆中取出目前得到的最好结果：最近一步的输出，其次是最近一次工具调用的观察结果
+        
+        Returns:
+            str: 部分结果，没有任何结果时为空字符串
+        """
+        for step in reversed(self.agent.memory.steps):
+            if not isinstance(step, ActionStep):
+                continue
+            if step.action_output is not None:
+                return str(step.action_output)
+            if step.observations:
+                return step.observations
+        return ""
+        
     def run(self,
             prompt: str,
             context: Optional[Dict[str, Any]] = None,
+            deadline: Optional[Deadline] = None,
             **kwargs) -> Union[str, Dict[str, Any]]:
         """
         运行代理执行任务
@@ -36,28 +74,214 @@ class EduSysAgent:
         Args:
             prompt (str): 提示词
             context (Optional[Dict[str, Any]]): 上下文信息
+            deadline (Optional[Deadline]): 截止时间，为None时使用当前请求的截止时间，不在请求中时按代理配置的 timeout 计时
             **kwargs: 其他参数
             
         Returns:
             Union[str, Dict[str, Any]]: 代理执行结果
+            
+        Raises:
+            DeadlineExceeded: 超时或被取消，异常中带有目前得到的部分结果
         """
+        deadline = deadline or current_deadline() or Deadline(self._get_config().get('timeout'))
         try:
             logger.info(f"运行 {self.agent_type} 代理，提示词: {prompt}")
             
-            # 合并上下文到 kwargs
+            # 合并上下文到提示词（不含缓存、追踪和模型路由等记录字段）
+            context = agent_context(context)
             if context:
                 prompt  = prompt + "\n" + str(context)
                 
-            # 执行代理
-            result = self.agent.run(prompt, **kwargs)
+            # 执行代理，超时或取消时中断
+            with deadline_scope(deadline), deadline.watch(self.agent.interrupt):
+                result = self.agent.run(prompt, **kwargs)
             
             logger.info(f"代理执行完成")
             return result
             
         except Exception as e:
+            if deadline.stopped:
+                raise DeadlineExceeded(deadline.reason, self.partial_answer()) from e
             logger.error(f"代理执行过程中发生错误: {str(e)}")
             raise
             
+    def run_stream(self,
+                   prompt: str,
+                   context: Optional[Dict[str, Any]] = None,
+                   deadline: Optional[Deadline] = None,
+                   **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        以流式方式运行代理，逐步产出执行事件
+        生成器被关闭（如客户端断开连接）时取消本次运行
+        
+        Args:
+            prompt (str): 提示词
+            context (Optional[Dict[str, Any]]): 上下文信息
+            deadline (Optional[Deadline]): 截止时间，为None时按代理配置的 timeout 计时
+            **kwargs: 其他参数
+            
+        Yields:
+            Dict[str, Any]: 事件字典，event 为事件类型（thinking / step / final_answer），data 为事件数据；
+                thinking 为模型的中间输出（思考过程和代码），不是回答内容，回答只在 final_answer 中给出
+            
+        Raises:
+            DeadlineExceeded: 超时或被取消，异常中带有目前得到的部分结果
+        """
+        logger.info(f"流式运行 {self.agent_type} 代理，提示词: {prompt}")
+        
+        deadline = deadline or Deadline(self._get_config().get('timeout'))
+        context = agent_context(context)
+        if context:
+            prompt = prompt + "\n" + str(context)
+            
+        with deadline.watch(self.agent.interrupt):
+            try:
+                yield from self._stream_events(prompt, deadline, **kwargs)
+            except GeneratorExit:
+                deadline.cancel()
+                raise
+            except Exception as e:
+                if deadline.stopped:
+                    raise DeadlineExceeded(deadline.reason, self.partial_answer()) from e
+                raise
+                
+        logger.info(f"代理流式执行完成")
+        
+    def _stream_events(self, prompt: str, deadline: Deadline, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        把代理的流式输出转换为事件字典
+        截止时间只在代理执行期间生效，产出事件时（调用方处理事件期间）不设置
+        """
+        steps = self.agent.run(prompt, stream=True, **kwargs)
+        try:
+            while True:
+                with deadline_scope(deadline):
+                    step = next(steps, None)
+                if step is None:
+                    return
+                    
+                if isinstance(step, ChatMessageStreamDelta):
+                    # 模型输出的增量内容（需要开启 stream_outputs），包含思考过程和生成的代码，
+                    # 单独标记为 thinking 事件，不作为回答展示
+                    if step.content:
+                        yield {"event": "thinking", "data": {"content": step.content}}
+                elif isinstance(step, ActionStep):
+                    yield {
+                        "event": "step",
+                        "data": {
+                            "step_number": step.step_number,
+                            "duration": step.timing.duration if step.timing else None,
+                            "observations": step.observations,
+                            "error": str(step.error) if step.error else None,
+                        }
+                    }
+                elif isinstance(step, FinalAnswerStep):
+                    yield {"event": "final_answer", "data": {"response": str(step.output)}}
+        finally:
+            steps.close()
+            
+    def get_answer_mode(self, mode: Optional[str] = None) -> str:
+        """
+        获取本次回答使用的方式，只有学生答疑代理支持单次检索回答
+        
+        Args:
+            mode (Optional[str]): 请求指定的回答方式，为None时使用代理配置
+            
+        Returns:
+            str: 回答方式（'agent' 或 'rag'）
+        """
+        if self.agent_type != 'question_answering':
+            return 'agent'
+        return self._get_config().get_answer_mode(mode)
+        
+    def answer_with_retrieval(self,
+                              question: str,
+                              course_id: Optional[int] = None,
+                              prompt: Optional[str] = None) -> Optional[str]:
+        """
+        单次检索回答：直接检索课程资料，用检索结果构造一个提示词，只调用一次模型
+        检索不到资料或最相关文档的分数低于阈值时返回None，由调用方改用多步代理
+        
+        Args:
+            question (str): 学生问题，用于检索
+            course_id (Optional[int]): 课程ID，用于限定检索范围
+            prompt (Optional[str]): 放入提示词的完整问题（如附带对话历史），为None时使用学生问题
+            
+        Returns:
+            Optional[str]: AI 回答，检索置信度低时为None
+        """
+        retriever_tool = self.agent.tools.get('edusys_retriever')
+        if retriever_tool is None:
+            return None
+            
+        start_time = time.perf_counter()
+        tool_input = {'query': question, 'course_id': course_id}
+        results = retriever_tool.search(question, course_id, k=RAG_CONFIG['TOP_K'])
+        # 去重、合并相邻分块并限制在令牌预算内
+        docs = context_packer.pack(results).docs
+        record_tool_call(retriever_tool.name, tool_input, retriever_tool.format_results(docs), time.perf_counter() - start_time)
+        
+        top_score = results[0][1] if results else 0.0
+        min_score = RAG_CONFIG['MIN_DENSE_SCORE'] if retriever_tool.uses_dense() else RAG_CONFIG['MIN_SCORE']
+        if top_score < min_score:
+            logger.info(f"检索置信度低（最高分 {top_score:.2f}），改用多步代理: {question[:50]}")
+            return None
+            
+        sources = [f"[资料 {i}] {doc.page_content}" for i, doc in enumerate(docs, 1)]
+        
+        messages = [
+            ChatMessage(role=MessageRole.SYSTEM, content=[{"type": "text", "text": RAG_SYSTEM_PROMPT}]),
+            ChatMessage(role=MessageRole.USER, content=[{
+                "type": "text",
+                "text": "课程资料：\n" + "\n\n".join(sources) + f"\n\n学生问题：{prompt or question}"
+            }]),
+        ]
+        response = self.agent.model.generate(messages)
+        
+        token_usage = response.token_usage
+        record_answer_step(
+            time.perf_counter() - start_time,
+            input_tokens=token_usage.input_tokens if token_usage else None,
+            output_tokens=token_usage.output_tokens if token_usage else None,
+            tool_calls=[{'name': retriever_tool.name, 'arguments': tool_input}]
+        )
+        
+        logger.info(f"单次检索回答完成（最高分 {top_score:.2f}）")
+        return response.content or ""
+        
+    def reset(self):
+        """
+        重置代理状态
+        清空对话记忆和代码执行器中的变量，使代理可以安全地被下一个请求复用
+        """
+        self.agent.memory.reset()
+        self.agent.monitor.reset()
+        self.agent.state.clear()
+        
+        python_executor = getattr(self.agent, 'python_executor', None)
+        if python_executor is not None and hasattr(python_executor, 'state'):
+            python_executor.state = {"__name__": "__main__"}
+            python_executor.custom_tools = {}
+            
+    @contextmanager
+    def use_model(self, model=None) -> Iterator[None]:
+        """
+        在上下文内使用指定的模型（如模型路由选出的小模型），退出时恢复代理原有的模型
+        
+        Args:
+            model: 模型实例，为None时使用代理原有的模型
+        """
+        if model is None:
+            yield
+            return
+            
+        original_model = self.agent.model
+        self.agent.model = model
+        try:
+            yield
+        finally:
+            self.agent.model = original_model
+            
     def ask_question(self, 
                      question: str, 
                      course_id: Optional[int] = None,
@@ -2,13 +2,20 @@
 AI 代理工厂
 用于创建不同类型的代理实例
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from smolagents import CodeAgent, OpenAIServerModel
+from smolagents.memory import ActionStep, PlanningStep
 from agents.tools.retriever_tool import EduSysRetrieverTool
+from agents.agent.model import EduSysOpenAIServerModel
 from agents.agent.config import AgentConfig, AGENT_CONFIGS
-from agents.knowledge_base import update_knowledge_base
+from agents.knowledge_base import update_knowledge_base, load_indexed_knowledge_base
+from agents.cache import index_versions
+from agents.config import KNOWLEDGE_BASE_CONFIG
+from agents.tracing import record_action_step, record_planning_step
+from langchain.docstore.document import Document
 import logging
 import os
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -20,10 +27,89 @@ class AgentFactory:
     def __init__(self):
         """
         初始化代理工厂
+        知识库在首次使用时才加载，导入模块和启动工作进程时不访问数据库
         """
-        # 初始化知识库
-        self.knowledge_docs = update_knowledge_base()
-        logger.info(f"知识库加载完成，共 {len(self.knowledge_docs)} 个文档分块")
+        self._knowledge_docs = None
+        self._knowledge_tokens = None
+        self._knowledge_embeddings = None
+        self._knowledge_version = None
+        self._knowledge_lock = threading.Lock()
+        
+        # 检索工具只读且可在代理之间共享，索引只构建一次
+        self._retriever_tool = None
+        self._retriever_lock = threading.Lock()
+        
+    @property
+    def knowledge_docs(self) -> List[Document]:
+        """
+        知识库文档分块，首次访问时加载
+        
+        Returns:
+            List[Document]: 文档分块列表
+        """
+        if self._knowledge_docs is None:
+            with self._knowledge_lock:
+                if self._knowledge_docs is None:
+                    # 先读取版本号再加载，加载期间的更新在下次检索时同步
+                    self._knowledge_version = index_versions.current()
+                    self._knowledge_docs, self._knowledge_tokens, self._knowledge_embeddings = self.load_knowledge_docs()
+        return self._knowledge_docs
+        
+    def load_knowledge_docs(self) -> Tuple[List[Document], List[Optional[List[str]]], List[Optional[List[float]]]]:
+        """
+        加载知识库文档及保存的分词结果和向量
+        默认以只读方式读取已构建的知识库；配置为 rebuild 时重新构建并写入数据库
+        
+        Returns:
+            Tuple[List[Document], List[Optional[List[str]]], List[Optional[List[float]]]]: 文档分块列表、每个分块的分词结果和向量
+        """
+        if KNOWLEDGE_BASE_CONFIG.get('load_mode') == 'rebuild':
+            docs = update_knowledge_base()
+            tokens = embeddings = [None] * len(docs)
+        else:
+            docs, tokens, embeddings = load_indexed_knowledge_base()
+        logger.info(f"知识库加载完成，共 {len(docs)} 个文档分块")
+        return docs, tokens, embeddings
+        
+    def reload(self):
+        """
+        丢弃已加载的知识库和检索工具，下次使用时重新加载
+        """
+        with self._knowledge_lock, self._retriever_lock:
+            self._knowledge_docs = None
+            self._knowledge_tokens = None
+            self._knowledge_embeddings = None
+            self._retriever_tool = None
+            
+    def refresh_knowledge(self, course_id: Optional[int] = None):
+        """
+        知识库更新后递增检索索引版本号，各工作进程的检索工具在下次检索时重新加载该课程的文档；
+        本进程已构建的检索工具立即同步：只重新加载变化过的课程文档并使这些课程的检索索引失效，
+        其他课程的索引保持不变。course_id 为None时所有进程重新加载全部文档
+        检索工具尚未构建时只递增版本号，首次使用时会加载最新的知识库
+        
+        Args:
+            course_id (Optional[int]): 课程ID
+        """
+        index_versions.bump(course_id)
+        
+        retriever_tool = self._retriever_tool
+        if retriever_tool is None:
+            return
+            
+        retriever_tool.sync(load_indexed_knowledge_base)
+        self._knowledge_docs = retriever_tool.docs
+        self._knowledge_tokens = self._knowledge_embeddings = None
+        
+    def retriever_index_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        获取课程检索索引缓存统计
+        
+        Returns:
+            Optional[Dict[str, Any]]: 统计信息，检索工具尚未构建时为None
+        """
+        retriever_tool = self._retriever_tool
+        return retriever_tool.index_stats() if retriever_tool is not None else None
         
     def create_retriever_tool(self) -> EduSysRetrieverTool:
         """
@@ -32,7 +118,27 @@ class AgentFactory:
         Returns:
             EduSysRetrieverTool: 检索工具实例
         """
-        return EduSysRetrieverTool(self.knowledge_docs)
+        docs = self.knowledge_docs
+        return EduSysRetrieverTool(
+            docs,
+            self._knowledge_tokens,
+            self._knowledge_embeddings,
+            loader=load_indexed_knowledge_base,
+            version=self._knowledge_version
+        )
+        
+    def get_retriever_tool(self) -> EduSysRetrieverTool:
+        """
+        获取共享的检索工具实例，首次调用时构建 BM25 索引
+        
+        Returns:
+            EduSysRetrieverTool: 检索工具实例
+        """
+        if self._retriever_tool is None:
+            with self._retriever_lock:
+                if self._retriever_tool is None:
+                    self._retriever_tool = self.create_retriever_tool()
+        return self._retriever_tool
         
     def create_model(self, model_config: Dict[str, Any]) -> OpenAIServerModel:
         """
@@ -48,7 +154,7 @@ class AgentFactory:
         model_kwargs = model_config.get('model_kwargs', {})
         
         logger.info(f"创建模型实例: {model_id}")
-        return OpenAIServerModel(model_id=model_id, api_base=os.getenv("BASE_URL"), api_key=os.getenv("API_KEY"), **model_kwargs)
+        return EduSysOpenAIServerModel(model_id=model_id, api_base=os.getenv("BASE_URL"), api_key=os.getenv("API_KEY"), **model_kwargs)
         
     def create_agent(self, 
                      agent_type: str = 'question_answering',
@@ -88,7 +194,7 @@ class AgentFactory:
                 
                 # 根据配置创建工具
                 if 'edusys_retriever' in tool_names:
-                    retriever_tool = self.create_retriever_tool()
+                    retriever_tool = self.get_retriever_tool()
                     tools.append(retriever_tool)
                 
             
@@ -97,9 +203,14 @@ class AgentFactory:
             
             # 创建代理
             logger.info(f"创建 {agent_type} 类型的 AI 代理")
+            # 每个步骤结束时记录耗时和令牌用量
             agent = CodeAgent(
                 tools=tools,
                 model=model,
+                step_callbacks={
+                    ActionStep: [record_action_step],
+                    PlanningStep: [record_planning_step],
+                },
                 **agent_config
             )
             
@@ -134,7 +245,7 @@ class AgentFactory:
         return self.create_agent('course_analysis', config)
         
 
-# 全局代理工厂实例
+# 全局代理工厂实例（知识库延迟加载，创建时没有副作用）
 agent_factory = AgentFactory()
 
 def get_agent(agent_type: str = 'question_answering', 
@@ -0,0 +1,226 @@
+"""
+模型服务 HTTP 客户端
+进程内所有模型实例共享同一个带连接池的 HTTP 客户端，复用到模型服务的 TCP/TLS 连接，
+并限制每个服务地址的并发请求数，同时统计连接池的使用情况
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from agents.config import LLM_HTTP_CONFIG
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    响应流包装，响应关闭时归还并发名额
+    """
+    
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+        
+    def __iter__(self):
+        yield from self._stream
+        
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    带并发限制和统计的 HTTP 传输层
+    每个服务地址的并发请求数不超过 max_per_host，超出时等待，等待超过 pool_timeout 时抛出 PoolTimeout
+    """
+    
+    def __init__(self, max_per_host: int, pool_timeout: float, **kwargs):
+        """
+        初始化传输层
+        
+        Args:
+            max_per_host (int): 每个服务地址的最大并发请求数
+            pool_timeout (float): 等待并发名额的超时（秒）
+            **kwargs: httpx.HTTPTransport 的参数
+        """
+        super().__init__(**kwargs)
+        self.max_per_host = max_per_host
+        self.pool_timeout = pool_timeout
+        
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        
+        # 统计数据
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.total_requests = 0
+        self.total_wait_time = 0.0
+        self.pool_timeouts = 0
+        
+    def _get_host_slots(self, host: str) -> threading.BoundedSemaphore:
+        """
+        获取服务地址的并发名额
+        """
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+            
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        """
+        发送请求，响应关闭后归还并发名额
+        """
+        slots = self._get_host_slots(f"{request.url.host}:{request.url.port}")
+        
+        start_time = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        acquired = slots.acquire(timeout=self.pool_timeout)
+        wait_time = time.perf_counter() - start_time
+        
+        with self._lock:
+            self.waiting -= 1
+            self.total_wait_time += wait_time
+            if not acquired:
+                self.pool_timeouts += 1
+            else:
+                self.in_flight += 1
+                self.total_requests += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                
+        if not acquired:
+            raise httpx.PoolTimeout(f"等待模型服务连接超时（{self.pool_timeout} 秒）", request=request)
+        if wait_time > 1:
+            logger.warning(f"模型服务连接池已饱和，请求等待了 {wait_time:.2f} 秒")
+            
+        released = False
+        
+        def release():
+            nonlocal released
+            with self._lock:
+                if released:
+                    return
+                released = True
+                self.in_flight -= 1
+            slots.release()
+            
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            release()
+            raise
+            
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+        
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取连接池统计
+        
+        Returns:
+            Dict[str, Any]: 并发请求数、等待数、连接数等统计
+        """
+        connections = list(getattr(self._pool, 'connections', []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'waiting': self.waiting,
+                'max_per_host': self.max_per_host,
+                'total_requests': self.total_requests,
+                'avg_wait_time': self.total_wait_time / self.total_requests if self.total_requests else 0.0,
+                'pool_timeouts': self.pool_timeouts,
+                'connections': len(connections),
+                'idle_connections': idle,
+            }
+
+_http_client: Optional[httpx.Client] = None
+_transport: Optional[PooledTransport] = None
+_openai_clients: Dict[Tuple, Any] = {}
+_client_lock = threading.Lock()
+
+def get_timeout() -> httpx.Timeout:
+    """
+    获取模型服务请求超时设置
+    
+    Returns:
+        httpx.Timeout: 超时设置
+    """
+    return httpx.Timeout(
+        LLM_HTTP_CONFIG['READ_TIMEOUT'],
+        connect=LLM_HTTP_CONFIG['CONNECT_TIMEOUT'],
+        pool=LLM_HTTP_CONFIG['POOL_TIMEOUT'],
+    )
+
+def get_http_client() -> httpx.Client:
+    """
+    获取进程内共享的 HTTP 客户端，首次调用时创建
+    
+    Returns:
+        httpx.Client: HTTP 客户端
+    """
+    global _http_client, _transport
+    
+    if _http_client is None:
+        with _client_lock:
+            if _http_client is None:
+                limits = httpx.Limits(
+                    max_connections=LLM_HTTP_CONFIG['MAX_CONNECTIONS'],
+                    max_keepalive_connections=LLM_HTTP_CONFIG['MAX_KEEPALIVE_CONNECTIONS'],
+                    keepalive_expiry=LLM_HTTP_CONFIG['KEEPALIVE_EXPIRY'],
+                )
+                _transport = PooledTransport(
+                    max_per_host=LLM_HTTP_CONFIG['MAX_PER_HOST'],
+                    pool_timeout=LLM_HTTP_CONFIG['POOL_TIMEOUT'],
+                    limits=limits,
+                )
+                _http_client = httpx.Client(transport=_transport, timeout=get_timeout())
+                logger.info(f"模型服务 HTTP 连接池已创建，最大连接数 {LLM_HTTP_CONFIG['MAX_CONNECTIONS']}")
+                
+    return _http_client
+
+def get_openai_client(**client_kwargs):
+    """
+    获取共享连接池的 OpenAI 客户端，相同服务地址和密钥的模型实例共用一个客户端
+    
+    Args:
+        **client_kwargs: openai.OpenAI 的参数
+        
+    Returns:
+        openai.OpenAI: OpenAI 客户端
+    """
+    import openai
+    
+    key = tuple(sorted((name, str(value)) for name, value in client_kwargs.items()))
+    with _client_lock:
+        client = _openai_clients.get(key)
+    if client is not None:
+        return client
+        
+    client_kwargs.setdefault('timeout', get_timeout())
+    client_kwargs.setdefault('max_retries', LLM_HTTP_CONFIG['MAX_RETRIES'])
+    client = openai.OpenAI(http_client=get_http_client(), **client_kwargs)
+    
+    with _client_lock:
+        return _openai_clients.setdefault(key, client)
+
+def http_client_stats() -> Dict[str, Any]:
+    """
+    获取模型服务连接池统计
+    
+    Returns:
+        Dict[str, Any]: 连接池统计，客户端尚未创建时为空字典
+    """
+    if _transport is None:
+        return {}
+    return _transport.stats()
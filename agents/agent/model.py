@@ -0,0 +1,59 @@
+"""
+AI 代理模型封装
+"""
+import time
+from smolagents import OpenAIServerModel
+from agents.agent.http_client import get_openai_client
+from agents.deadline import current_deadline
+from agents.tracing import record_model_call
+
+def _apply_deadline(kwargs):
+    """
+    调用模型前检查当前请求的截止时间，并把请求超时限制在剩余时间内
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return None
+    deadline.check()
+    remaining = deadline.remaining()
+    if remaining is not None:
+        kwargs['timeout'] = min(kwargs.get('timeout') or remaining, remaining)
+    return deadline
+
+class EduSysOpenAIServerModel(OpenAIServerModel):
+    """
+    EduSys OpenAI 兼容模型
+    使用进程内共享连接池的客户端，并记录每次模型调用的耗时，供代理步骤记录区分模型耗时和代码执行耗时；
+    请求超时不超过当前请求的剩余时间
+    """
+    
+    def create_client(self):
+        """
+        创建客户端，相同服务地址的模型实例共用连接池
+        """
+        return get_openai_client(**self.client_kwargs)
+        
+    def generate(self, *args, **kwargs):
+        """
+        调用模型生成回复
+        """
+        _apply_deadline(kwargs)
+        start_time = time.perf_counter()
+        try:
+            return super().generate(*args, **kwargs)
+        finally:
+            record_model_call(time.perf_counter() - start_time)
+            
+    def generate_stream(self, *args, **kwargs):
+        """
+        以流式方式调用模型生成回复，耗时计算到流结束为止；每收到一段输出检查一次截止时间
+        """
+        deadline = _apply_deadline(kwargs)
+        start_time = time.perf_counter()
+        try:
+            for event in super().generate_stream(*args, **kwargs):
+                if deadline is not None:
+                    deadline.check()
+                yield event
+        finally:
+            record_model_call(time.perf_counter() - start_time)
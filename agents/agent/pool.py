@@ -0,0 +1,196 @@
+"""
+AI 代理池
+为每种代理类型维护一组预先构建的代理实例，请求借出后归还，避免每次提问都重新构建模型、工具和检索索引
+"""
+from typing import Callable, Dict, Iterable, Optional
+from contextlib import contextmanager
+from agents.agent.core import EduSysAgent
+from agents.config import POOL_CONFIG
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+class AgentPoolExhausted(Exception):
+    """
+    代理池中没有可用代理且等待超时
+    """
+    pass
+
+class AgentPool:
+    """
+    AI 代理池类
+    每个工作进程持有一个实例，代理按类型分组，借出期间由单个请求独占
+    """
+    
+    def __init__(self,
+                 size: Optional[int] = None,
+                 checkout_timeout: Optional[float] = None,
+                 agent_builder: Optional[Callable[[str], EduSysAgent]] = None):
+        """
+        初始化代理池
+        
+        Args:
+            size (Optional[int]): 每种代理类型的最大实例数
+            checkout_timeout (Optional[float]): 借出代理的最长等待时间（秒）
+            agent_builder (Optional[Callable[[str], EduSysAgent]]): 根据代理类型构建代理的函数
+        """
+        self.size = size or POOL_CONFIG['POOL_SIZE']
+        self.checkout_timeout = checkout_timeout if checkout_timeout is not None else POOL_CONFIG['CHECKOUT_TIMEOUT']
+        self.agent_builder = agent_builder or EduSysAgent
+        
+        self._idle: Dict[str, queue.LifoQueue] = {}
+        self._created: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        
+    def _get_idle_queue(self, agent_type: str) -> queue.LifoQueue:
+        """
+        获取指定代理类型的空闲队列
+        
+        Args:
+            agent_type (str): 代理类型
+            
+        Returns:
+            queue.LifoQueue: 空闲代理队列
+        """
+        with self._lock:
+            if agent_type not in self._idle:
+                self._idle[agent_type] = queue.LifoQueue()
+                self._created[agent_type] = 0
+            return self._idle[agent_type]
+            
+    def _build_agent(self, agent_type: str) -> EduSysAgent:
+        """
+        构建新的代理实例，失败时归还名额
+        
+        Args:
+            agent_type (str): 代理类型
+            
+        Returns:
+            EduSysAgent: 代理实例
+        """
+        try:
+            logger.info(f"代理池为 {agent_type} 构建新代理")
+            return self.agent_builder(agent_type)
+        except Exception:
+            with self._lock:
+                self._created[agent_type] -= 1
+            raise
+            
+    def acquire(self, agent_type: str = 'question_answering') -> EduSysAgent:
+        """
+        借出一个代理
+        优先复用空闲代理；未达到上限时构建新代理；否则等待其他请求归还
+        
+        Args:
+            agent_type (str): 代理类型
+            
+        Returns:
+            EduSysAgent: 代理实例
+        """
+        idle = self._get_idle_queue(agent_type)
+        
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            pass
+            
+        with self._lock:
+            can_build = self._created[agent_type] < self.size
+            if can_build:
+                self._created[agent_type] += 1
+                
+        if can_build:
+            return self._build_agent(agent_type)
+            
+        try:
+            return idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise AgentPoolExhausted(f"{agent_type} 代理池已满，等待 {self.checkout_timeout} 秒后仍无可用代理")
+            
+    def release(self, agent: EduSysAgent):
+        """
+        归还代理，归还前重置代理记忆
+        
+        Args:
+            agent (EduSysAgent): 代理实例
+        """
+        agent_type = agent.agent_type
+        try:
+            agent.reset()
+        except Exception as e:
+            # 无法重置的代理直接丢弃，下次借出时重新构建
+            logger.error(f"重置 {agent_type} 代理时发生错误，已丢弃: {str(e)}")
+            with self._lock:
+                self._created[agent_type] -= 1
+            return
+            
+        self._get_idle_queue(agent_type).put(agent)
+        
+    @contextmanager
+    def checkout(self, agent_type: str = 'question_answering'):
+        """
+        以上下文管理器方式借出代理，退出时自动归还
+        
+        Args:
+            agent_type (str): 代理类型
+            
+        Yields:
+            EduSysAgent: 代理实例
+        """
+        agent = self.acquire(agent_type)
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+            
+    def warm_up(self, agent_types: Optional[Iterable[str]] = None, count: Optional[int] = None):
+        """
+        预先构建代理，使首个请求无需等待构建
+        
+        Args:
+            agent_types (Optional[Iterable[str]]): 代理类型列表，默认使用配置中的类型
+            count (Optional[int]): 每种类型预建数量，默认填满代理池
+        """
+        agent_types = agent_types or POOL_CONFIG['AGENT_TYPES']
+        count = min(count or self.size, self.size)
+        
+        for agent_type in agent_types:
+            idle = self._get_idle_queue(agent_type)
+            while True:
+                with self._lock:
+                    if self._created[agent_type] >= count:
+                        break
+                    self._created[agent_type] += 1
+                idle.put(self._build_agent(agent_type))
+            logger.info(f"代理池预热完成: {agent_type}，共 {self._created[agent_type]} 个代理")
+            
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        获取代理池状态
+        
+        Returns:
+            Dict[str, Dict[str, int]]: 每种代理类型的已创建数和空闲数
+        """
+        with self._lock:
+            return {
+                agent_type: {
+                    'created': self._created[agent_type],
+                    'idle': idle.qsize(),
+                }
+                for agent_type, idle in self._idle.items()
+            }
+
+
+# 全局代理池实例（每个工作进程一个）
+agent_pool = AgentPool()
+
+def get_agent_pool() -> AgentPool:
+    """
+    获取全局代理池实例
+    
+    Returns:
+        AgentPool: 代理池实例
+    """
+    return agent_pool
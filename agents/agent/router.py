@@ -0,0 +1,187 @@
+"""
+模型路由
+用本地规则判断问题的复杂程度，简单的查询类问题交给小模型，需要推理的问题交给大模型。
+各路由使用的模型在数据库代理配置（AgentConfig.config 的 routes）中配置，未配置时使用 ROUTING_CONFIG
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from agents.config import ROUTING_CONFIG
+from agents.utils import estimate_tokens
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 路由名称
+ROUTE_SIMPLE = 'simple'
+ROUTE_COMPLEX = 'complex'
+
+# 代码片段的特征
+_CODE_PATTERN = re.compile(r'```|\bdef\s+\w+\(|\bclass\s+\w+|#include|\w+\([^)]*\)\s*\{|;\s*$', re.M)
+
+@dataclass
+class RouteDecision:
+    """
+    路由结果
+    """
+    route: str
+    reason: str
+    model_id: Optional[str] = None
+    model_kwargs: Dict[str, Any] = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'route': self.route, 'reason': self.reason, 'model_id': self.model_id}
+
+class ModelRouter:
+    """
+    模型路由类
+    """
+    
+    def __init__(self):
+        """
+        初始化模型路由
+        """
+        # 数据库中的路由配置，按代理类型缓存
+        self._routes: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._routes_lock = threading.Lock()
+        
+        # 各路由的模型实例，按模型配置复用
+        self._models: Dict[Tuple, Any] = {}
+        self._models_lock = threading.Lock()
+        
+    def classify(self, question: str, agent_type: str = 'question_answering', with_history: bool = False) -> Tuple[str, str]:
+        """
+        判断问题的复杂程度
+        
+        Args:
+            question (str): 用户提问
+            agent_type (str): 代理类型
+            with_history (bool): 是否附带对话历史
+            
+        Returns:
+            Tuple[str, str]: (路由名称, 判断依据)
+        """
+        if agent_type != 'question_answering':
+            return ROUTE_COMPLEX, 'agent_type'
+        if with_history:
+            # 追问需要结合上下文理解
+            return ROUTE_COMPLEX, 'history'
+        if _CODE_PATTERN.search(question):
+            return ROUTE_COMPLEX, 'code'
+            
+        lowered = question.lower()
+        for keyword in ROUTING_CONFIG['COMPLEX_KEYWORDS']:
+            if keyword in lowered:
+                return ROUTE_COMPLEX, f'keyword:{keyword}'
+                
+        if question.count('？') + question.count('?') > 1:
+            return ROUTE_COMPLEX, 'multi_question'
+        if estimate_tokens(question) > ROUTING_CONFIG['SIMPLE_MAX_TOKENS']:
+            return ROUTE_COMPLEX, 'length'
+        return ROUTE_SIMPLE, 'short_lookup'
+        
+    def get_routes(self, agent_type: str) -> Dict[str, Any]:
+        """
+        获取代理类型的路由配置
+        优先使用数据库中启用的代理配置的 routes，例如
+        {"routes": {"simple": {"model_id": "...", "model_kwargs": {...}}, "complex": {"model_id": "..."}}}；
+        没有配置时使用 ROUTING_CONFIG 中的模型。数据库配置缓存 CONFIG_CACHE_SECONDS 秒
+        
+        Args:
+            agent_type (str): 代理类型
+            
+        Returns:
+            Dict[str, Any]: 路由名称到模型配置的映射
+        """
+        now = time.monotonic()
+        with self._routes_lock:
+            cached = self._routes.get(agent_type)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+                
+        from agents.models import AgentConfig
+        
+        routes = None
+        try:
+            config = (AgentConfig.objects
+                      .filter(agent_type=agent_type, is_active=True)
+                      .order_by('-updated_at')
+                      .values_list('config', flat=True)
+                      .first())
+            routes = (config or {}).get('routes')
+        except Exception as e:
+            logger.warning(f"读取 {agent_type} 代理的路由配置失败: {str(e)}")
+            
+        if not isinstance(routes, dict):
+            routes = {
+                ROUTE_SIMPLE: {'model_id': ROUTING_CONFIG['SIMPLE_MODEL_ID']},
+                ROUTE_COMPLEX: {'model_id': ROUTING_CONFIG['COMPLEX_MODEL_ID']},
+            }
+            
+        with self._routes_lock:
+            self._routes[agent_type] = (now + ROUTING_CONFIG['CONFIG_CACHE_SECONDS'], routes)
+        return routes
+        
+    def clear(self):
+        """
+        清空路由配置缓存，修改数据库配置后立即生效
+        """
+        with self._routes_lock:
+            self._routes.clear()
+            
+    def route(self, question: str, agent_type: str = 'question_answering', context: Optional[Dict[str, Any]] = None) -> RouteDecision:
+        """
+        为问题选择模型
+        
+        Args:
+            question (str): 用户提问
+            agent_type (str): 代理类型
+            context (Optional[Dict[str, Any]]): 上下文信息
+            
+        Returns:
+            RouteDecision: 路由结果，路由没有配置模型时 model_id 为None，使用代理默认的模型
+        """
+        route, reason = self.classify(question or '', agent_type, bool((context or {}).get('with_history')))
+        if not ROUTING_CONFIG['ENABLED']:
+            return RouteDecision(route, reason)
+            
+        model_config = self.get_routes(agent_type).get(route) or {}
+        decision = RouteDecision(
+            route,
+            reason,
+            model_id=model_config.get('model_id') or None,
+            model_kwargs=model_config.get('model_kwargs') or {}
+        )
+        logger.debug(f"问题路由到 {route}（{reason}）: {decision.model_id or '默认模型'}")
+        return decision
+        
+    def get_model(self, decision: RouteDecision):
+        """
+        获取路由对应的模型实例
+        
+        Args:
+            decision (RouteDecision): 路由结果
+            
+        Returns:
+            OpenAIServerModel: 模型实例，路由没有配置模型时为None
+        """
+        if not decision.model_id:
+            return None
+            
+        key = (decision.model_id, tuple(sorted((name, str(value)) for name, value in decision.model_kwargs.items())))
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is None:
+                from agents.agent.factory import agent_factory
+                
+                model = self._models[key] = agent_factory.create_model({
+                    'model_id': decision.model_id,
+                    'model_kwargs': decision.model_kwargs,
+                })
+        return model
+
+# 全局模型路由实例
+model_router = ModelRouter()
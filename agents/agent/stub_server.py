@@ -0,0 +1,337 @@
+"""
+本地模拟模型服务
+实现 OpenAI 兼容的 chat completions 接口（包括流式响应），按固定脚本返回 CodeAgent 可以执行的回复：
+第一步调用 edusys_retriever 检索资料，拿到观察结果后调用 final_answer。
+把 BASE_URL 指向该服务，即可在没有网络的环境中测量 Django、检索和代理本身的开销。
+"""
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from agents.config import STUB_LLM_CONFIG
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 检索查询和回答中引用观察结果的最大长度
+QUERY_MAX_LENGTH = 200
+EXCERPT_MAX_LENGTH = 300
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """
+    获取消息的文本内容，兼容字符串和分段两种格式
+    """
+    content = message.get('content')
+    if isinstance(content, list):
+        return ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content or ''
+
+def _code_block_tags(messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """
+    根据系统提示词判断代理使用的代码块标记
+    """
+    system_text = ''.join(_message_text(message) for message in messages if message.get('role') == 'system')
+    if '<code>' in system_text or not system_text:
+        return '<code>', '</code>'
+    return '```python', '```'
+
+def _extract_task(messages: List[Dict[str, Any]]) -> str:
+    """
+    从消息中提取代理任务
+    """
+    user_texts = [_message_text(message) for message in messages if message.get('role') == 'user']
+    for text in reversed(user_texts):
+        match = re.search(r'New task:\s*(.*)', text, re.S)
+        if match:
+            return match.group(1).strip()
+    return user_texts[-1].strip() if user_texts else ''
+
+def _extract_observation(messages: List[Dict[str, Any]]) -> str:
+    """
+    提取最近一次工具调用的观察结果（去掉 smolagents 添加的前后缀）
+    """
+    for message in reversed(messages):
+        text = _message_text(message)
+        if message.get('role') != 'assistant' and text.startswith('Observation:'):
+            text = text[len('Observation:'):]
+            text = text.replace('Execution logs:', '').split('Last output from code snippet:')[0]
+            return text.strip()
+    return ''
+
+def scripted_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    生成脚本化的代理回复
+    还没有助手消息时调用检索工具，之后（无论检索成功还是出错）都直接给出最终回答，保证代理在两步内结束
+    
+    Args:
+        messages (List[Dict[str, Any]]): 请求中的消息列表
+        
+    Returns:
+        str: 回复内容
+    """
+    open_tag, close_tag = _code_block_tags(messages)
+    task = _extract_task(messages)
+    
+    if not any(message.get('role') == 'assistant' for message in messages):
+        # 任务格式为 "关于课程{id}的问题：{问题}"，后面可能附有上下文，只用第一行的问题部分检索
+        first_line = task.split('\n', 1)[0]
+        query = first_line.split('：', 1)[-1].strip()[:QUERY_MAX_LENGTH] or first_line[:QUERY_MAX_LENGTH]
+        course_match = re.search(r'课程\s*(\d+)', task)
+        course_id = int(course_match.group(1)) if course_match else None
+        return (
+            "Thought: 先检索课程资料。\n"
+            f"{open_tag}\n"
+            f"result = edusys_retriever(query={query!r}, course_id={course_id!r})\n"
+            "print(result)\n"
+            f"{close_tag}"
+        )
+        
+    excerpt = _extract_observation(messages)[:EXCERPT_MAX_LENGTH]
+    answer = f"根据课程资料：{excerpt}" if excerpt else "没有检索到相关的课程资料。"
+    return (
+        "Thought: 根据检索结果回答问题。\n"
+        f"{open_tag}\n"
+        f"final_answer({answer!r})\n"
+        f"{close_tag}"
+    )
+
+def apply_stop_sequences(text: str, stop: Optional[Any]) -> str:
+    """
+    在第一个停止序列处截断文本，与真实模型服务的行为一致
+    
+    Args:
+        text (str): 回复内容
+        stop (Optional[Any]): 停止序列，字符串或字符串列表
+        
+    Returns:
+        str: 截断后的文本
+    """
+    if not stop:
+        return text
+    if isinstance(stop, str):
+        stop = [stop]
+    positions = [text.find(sequence) for sequence in stop if sequence and sequence in text]
+    return text[:min(positions)] if positions else text
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """
+    模拟模型服务请求处理器
+    """
+    protocol_version = 'HTTP/1.1'
+    server: 'StubLLMServer'
+    
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+        
+    def _send_json(self, data: Dict[str, Any], status_code: int = 200):
+        """
+        发送 JSON 响应
+        """
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def do_GET(self):
+        """
+        模型列表
+        """
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json({
+                'object': 'list',
+                'data': [{'id': 'edusys-stub', 'object': 'model', 'owned_by': 'edusys'}],
+            })
+        else:
+            self._send_json({'error': {'message': f'未知路径: {self.path}'}}, 404)
+            
+    def do_POST(self):
+        """
+        chat completions 接口
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json({'error': {'message': '请求体不是有效的 JSON'}}, 400)
+            return
+            
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json({'error': {'message': f'未知路径: {self.path}'}}, 404)
+            return
+            
+        messages = payload.get('messages') or []
+        text = apply_stop_sequences(scripted_reply(messages), payload.get('stop'))
+        prompt_tokens = self.server.count_tokens(''.join(_message_text(message) for message in messages))
+        self.server.record_request()
+        
+        if payload.get('stream'):
+            include_usage = bool((payload.get('stream_options') or {}).get('include_usage'))
+            self._stream_completion(payload.get('model'), text, prompt_tokens, include_usage)
+        else:
+            self._send_completion(payload.get('model'), text, prompt_tokens)
+            
+    def _send_completion(self, model: Optional[str], text: str, prompt_tokens: int):
+        """
+        返回完整的回复，按首令牌延迟和输出速率等待后一次性发送
+        """
+        completion_tokens = self.server.count_tokens(text)
+        time.sleep(self.server.latency + self.server.token_delay * completion_tokens)
+        self._send_json({
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model or 'edusys-stub',
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': text},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+        
+    def _stream_completion(self, model: Optional[str], text: str, prompt_tokens: int, include_usage: bool):
+        """
+        以 SSE 流式返回回复，每个令牌一个事件
+        """
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        created = int(time.time())
+        
+        def chunk(choices, usage=None):
+            data = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model or 'edusys-stub',
+                'choices': choices,
+            }
+            if usage is not None:
+                data['usage'] = usage
+            self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        
+        time.sleep(self.server.latency)
+        
+        size = self.server.chars_per_token
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        try:
+            for index, piece in enumerate(pieces):
+                delta = {'role': 'assistant', 'content': piece} if index == 0 else {'content': piece}
+                chunk([{'index': 0, 'delta': delta, 'finish_reason': None}])
+                if self.server.token_delay:
+                    time.sleep(self.server.token_delay)
+            chunk([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+            if include_usage:
+                chunk([], usage={
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': len(pieces),
+                    'total_tokens': prompt_tokens + len(pieces),
+                })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("客户端在流式响应结束前断开连接")
+
+class StubLLMServer(ThreadingHTTPServer):
+    """
+    模拟模型服务，每个请求一个线程
+    """
+    daemon_threads = True
+    
+    def __init__(self,
+                 host: Optional[str] = None,
+                 port: Optional[int] = None,
+                 latency: Optional[float] = None,
+                 tokens_per_second: Optional[float] = None,
+                 chars_per_token: Optional[int] = None):
+        """
+        初始化模拟模型服务
+        
+        Args:
+            host (Optional[str]): 监听地址
+            port (Optional[int]): 监听端口，0 表示随机端口
+            latency (Optional[float]): 返回第一个令牌前的延迟（秒）
+            tokens_per_second (Optional[float]): 输出速率，0 表示不限速
+            chars_per_token (Optional[int]): 估算令牌数时每个令牌对应的字符数
+        """
+        host = host if host is not None else STUB_LLM_CONFIG['HOST']
+        port = port if port is not None else STUB_LLM_CONFIG['PORT']
+        super().__init__((host, port), StubLLMHandler)
+        
+        self.latency = latency if latency is not None else STUB_LLM_CONFIG['LATENCY']
+        tokens_per_second = tokens_per_second if tokens_per_second is not None else STUB_LLM_CONFIG['TOKENS_PER_SECOND']
+        self.token_delay = 1.0 / tokens_per_second if tokens_per_second else 0.0
+        self.chars_per_token = max(1, chars_per_token or STUB_LLM_CONFIG['CHARS_PER_TOKEN'])
+        
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+        
+    def handle_error(self, request, client_address):
+        """
+        客户端关闭空闲的长连接属于正常情况，不输出异常堆栈
+        """
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            logger.debug(f"客户端 {client_address} 断开连接")
+            return
+        super().handle_error(request, client_address)
+        
+    @property
+    def base_url(self) -> str:
+        """
+        供 BASE_URL 使用的服务地址
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+        
+    def count_tokens(self, text: str) -> int:
+        """
+        按字符数估算令牌数
+        """
+        return -(-len(text) // self.chars_per_token)
+        
+    def record_request(self):
+        """
+        累计请求数
+        """
+        with self._count_lock:
+            self.request_count += 1
+            
+    def start(self) -> 'StubLLMServer':
+        """
+        在后台线程中启动服务
+        
+        Returns:
+            StubLLMServer: 服务实例
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='stub-llm-server', daemon=True)
+        self._thread.start()
+        logger.info(f"模拟模型服务已启动: {self.base_url}")
+        return self
+        
+    def stop(self):
+        """
+        停止服务
+        """
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,149 @@
+"""
+课程批量分析
+对多门课程并发执行课程分析，每门课程完成后立即保存结果，任务中断后只需处理未完成的课程
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+from django.db import connections
+from django.utils import timezone
+from agents.agent.pool import agent_pool
+from agents.config import ANALYSIS_CONFIG
+from agents.jobs import ai_job_queue
+from agents.models import CourseAnalysisRun, CourseAnalysisResult
+from agents import tasks
+from courses.models import Course
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def create_analysis_run(analysis_type: str = 'comprehensive',
+                        course_ids: Optional[Iterable[int]] = None,
+                        concurrency: Optional[int] = None,
+                        user_id: Optional[int] = None) -> CourseAnalysisRun:
+    """
+    创建课程批量分析任务，为每门课程创建待处理的结果记录
+    
+    Args:
+        analysis_type (str): 分析类型
+        course_ids (Optional[Iterable[int]]): 课程ID列表，为None则分析全部课程
+        concurrency (Optional[int]): 同时分析的课程数
+        user_id (Optional[int]): 创建任务的用户ID
+        
+    Returns:
+        CourseAnalysisRun: 分析任务
+    """
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(id__in=list(course_ids))
+        
+    run = CourseAnalysisRun.objects.create(
+        analysis_type=analysis_type,
+        concurrency=concurrency or ANALYSIS_CONFIG['MAX_CONCURRENCY'],
+        created_by_id=user_id
+    )
+    CourseAnalysisResult.objects.bulk_create([
+        CourseAnalysisResult(run=run, course_id=course_id, analysis_type=analysis_type)
+        for course_id in courses.order_by('id').values_list('id', flat=True)
+    ])
+    
+    logger.info(f"课程批量分析任务已创建: {run.id}，共 {run.results.count()} 门课程")
+    return run
+
+def analyze_result(result_id: int) -> str:
+    """
+    分析单门课程并保存结果
+    
+    Args:
+        result_id (int): 课程分析结果ID
+        
+    Returns:
+        str: 处理状态
+    """
+    try:
+        result = CourseAnalysisResult.objects.get(id=result_id)
+        CourseAnalysisResult.objects.filter(id=result_id).update(status='running', started_at=timezone.now())
+        
+        start_time = time.perf_counter()
+        try:
+            report = tasks.async_course_analysis(result.course_id, result.analysis_type)
+        except Exception as e:
+            logger.error(f"课程 {result.course_id} 分析失败: {str(e)}")
+            CourseAnalysisResult.objects.filter(id=result_id).update(
+                status='failed',
+                error_message=str(e),
+                duration=time.perf_counter() - start_time,
+                completed_at=timezone.now()
+            )
+            return 'failed'
+            
+        CourseAnalysisResult.objects.filter(id=result_id).update(
+            status='completed',
+            report=str(report),
+            error_message='',
+            duration=time.perf_counter() - start_time,
+            completed_at=timezone.now()
+        )
+        return 'completed'
+    finally:
+        # 写入最终状态后再关闭工作线程的数据库连接
+        connections.close_all()
+
+def execute_analysis_run(run_id: int, concurrency: Optional[int] = None) -> CourseAnalysisRun:
+    """
+    执行课程批量分析任务
+    只处理尚未完成的课程（包括上次中断时处理中和失败的课程），因此也用于继续中断的任务
+    
+    Args:
+        run_id (int): 分析任务ID
+        concurrency (Optional[int]): 同时分析的课程数，默认使用任务创建时的设置
+        
+    Returns:
+        CourseAnalysisRun: 分析任务
+    """
+    run = CourseAnalysisRun.objects.get(id=run_id)
+    
+    # 并发数不超过代理池大小，否则多出的线程只会等待借出代理
+    concurrency = max(1, min(concurrency or run.concurrency, agent_pool.size))
+    
+    CourseAnalysisRun.objects.filter(id=run_id).update(
+        status='running',
+        started_at=run.started_at or timezone.now(),
+        completed_at=None
+    )
+    
+    result_ids = list(run.results.exclude(status='completed').values_list('id', flat=True))
+    logger.info(f"开始执行课程批量分析任务 {run_id}: 待处理 {len(result_ids)} 门课程，并发数 {concurrency}")
+    
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='course-analysis') as executor:
+        statuses = list(executor.map(analyze_result, result_ids))
+        
+    failed = run.results.exclude(status='completed').count()
+    CourseAnalysisRun.objects.filter(id=run_id).update(
+        status='failed' if failed else 'completed',
+        completed_at=timezone.now()
+    )
+    
+    logger.info(
+        f"课程批量分析任务 {run_id} 执行结束: 本次完成 {statuses.count('completed')} 门，"
+        f"失败 {statuses.count('failed')} 门"
+    )
+    run.refresh_from_db()
+    return run
+
+def submit_analysis_run(run_id: int, concurrency: Optional[int] = None):
+    """
+    将课程批量分析任务提交到后台任务队列
+    
+    Args:
+        run_id (int): 分析任务ID
+        concurrency (Optional[int]): 同时分析的课程数
+        
+    Returns:
+        Future: 任务结果
+        
+    Raises:
+        JobQueueFull: 任务队列已满
+    """
+    return ai_job_queue.submit(execute_analysis_run, run_id, concurrency)
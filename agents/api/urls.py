@@ -10,6 +10,7 @@ app_name = 'agents_api'
 # 创建路由器并注册视图集
 router = DefaultRouter()
 router.register(r'interactions', views.AIInteractionViewSet)
+router.register(r'analysis-runs', views.CourseAnalysisRunViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -2,22 +2,37 @@
 AI 助手 API 视图
 """
 import logging
+from collections import Counter
+from datetime import timedelta
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
 
-from agents.models import AIInteraction, AgentConfig
+from agents.models import AIInteraction, AgentConfig, AgentStep, CourseAnalysisRun
 from agents.serializers import (
     AIInteractionSerializer,
     AIInteractionCreateSerializer,
-    AIInteractionFeedbackSerializer
+    AIInteractionFeedbackSerializer,
+    CourseAnalysisRunSerializer,
+    CourseAnalysisRunDetailSerializer,
+    CourseAnalysisRunCreateSerializer
 )
-from agents.permissions import IsOwnerOrTeacher, check_course_access
+from agents.permissions import IsOwnerOrTeacher, IsTeacher, check_course_access
 from agents.agent.core import get_edusys_agent
+from agents.agent.factory import agent_factory
 from agents import tasks
+from agents.analysis import create_analysis_run, submit_analysis_run
+from agents.conversation import prepare_conversation
+from agents.admission import AdmissionRejected, admission_controller
+from agents.agent.http_client import http_client_stats
+from agents.agent.pool import agent_pool
+from agents.tools.context_packer import context_packer
+from agents.jobs import JobQueueFull, ai_async_queue, ai_job_queue
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -48,6 +63,35 @@ class AIInteractionViewSet(viewsets.ModelViewSet):
             return AIInteractionFeedbackSerializer
         return AIInteractionSerializer
     
+    def create(self, request, *args, **kwargs):
+        """
+        创建交互记录并提交后台 AI 任务，立即返回 202
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            self.perform_create(serializer)
+        except AdmissionRejected as e:
+            return Response({
+                "error": {
+                    "code": "RATE_LIMITED",
+                    "message": str(e)
+                }
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(e.retry_after)})
+        except JobQueueFull as e:
+            return Response({
+                "error": {
+                    "code": "SERVICE_BUSY",
+                    "message": "AI 助手当前繁忙，请稍后重试"
+                }
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(e.retry_after)})
+            
+        data = dict(serializer.data)
+        data["task_id"] = serializer.instance.id
+        data["status"] = serializer.instance.status
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers=self.get_success_headers(serializer.data))
+        
     def perform_create(self, serializer):
         """
         执行创建操作
@@ -59,23 +103,110 @@ class AIInteractionViewSet(viewsets.ModelViewSet):
         if not check_course_access(self.request.user, course):
             raise PermissionError("您没有权限访问此课程")
         
-        # 保存交互记录
-        interaction = serializer.save(user=self.request.user)
+        # 限制提问速率
+        admission_controller.check_rate(self.request.user.id, course.id)
         
-        # 异步执行 AI 处理
-        prompt = f"关于课程{course.id}的问题：{interaction.query}"
-        context = {
+        # 保存交互记录并提交后台 AI 任务，记录提交到数据库后才放入队列
+        query = serializer.validated_data['query']
+        context = dict(serializer.validated_data.get('context') or {})
+        context.update({
             "course_id": course.id,
             "student_id": self.request.user.id
-        }
+        })
+        interaction_id = tasks.create_ai_job(
+            user_id=self.request.user.id,
+            course_id=course.id,
+            query=query,
+            prompt=f"关于课程{course.id}的问题：{query}",
+            interaction_type=serializer.validated_data['interaction_type'],
+            context=context
+        )
+        serializer.instance = AIInteraction.objects.get(id=interaction_id)
         
-        # 执行 AI 处理
-        response = tasks.async_ai_process(prompt, context, 'question_answering')
+    @action(detail=True, methods=['get'], url_path='status')
+    def job_status(self, request, pk=None):
+        """
+        查询后台 AI 任务状态
+        """
+        interaction = self.get_object()
         
-        # 更新交互记录的响应
-        interaction.response = response
-        interaction.save()
+        data = {
+            "task_id": interaction.id,
+            "status": interaction.status,
+            "started_at": interaction.started_at,
+            "completed_at": interaction.completed_at,
+        }
+        if interaction.status == 'completed':
+            data["response"] = interaction.response
+        elif interaction.status == 'failed':
+            data["error_message"] = interaction.error_message
+        
+        return Response(data)
     
+    @action(detail=False, methods=['get'], url_path='step-stats', permission_classes=[IsAuthenticated, IsTeacher])
+    def step_stats(self, request):
+        """
+        按代理类型统计代理步骤：每次回答的步骤数分布、各类耗时和令牌用量
+        """
+        try:
+            days = max(1, int(request.query_params.get('days', 7)))
+        except ValueError:
+            days = 7
+            
+        steps = AgentStep.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        
+        # 每种代理类型的步骤数分布（键为一次回答用了几步）
+        distributions = {}
+        for row in steps.values('agent_type', 'interaction_id').annotate(step_count=Count('id')):
+            distributions.setdefault(row['agent_type'], Counter())[row['step_count']] += 1
+            
+        results = []
+        for row in steps.values('agent_type').annotate(
+            interactions=Count('interaction_id', distinct=True),
+            steps=Count('id'),
+            error_steps=Count('id', filter=~Q(error_message='')),
+            avg_duration=Avg('duration'),
+            avg_llm_duration=Avg('llm_duration'),
+            avg_execution_time=Avg('execution_time'),
+            total_duration=Sum('duration'),
+            total_llm_duration=Sum('llm_duration'),
+            avg_input_tokens=Avg('input_tokens'),
+            avg_output_tokens=Avg('output_tokens'),
+            total_input_tokens=Sum('input_tokens'),
+            total_output_tokens=Sum('output_tokens'),
+        ).order_by('agent_type'):
+            row['avg_steps_per_interaction'] = row['steps'] / row['interactions'] if row['interactions'] else 0
+            row['step_count_distribution'] = dict(sorted(distributions.get(row['agent_type'], {}).items()))
+            results.append(row)
+            
+        return Response({
+            "days": days,
+            "results": results
+        })
+        
+    @action(detail=False, methods=['get'], url_path='runtime-stats', permission_classes=[IsAuthenticated, IsTeacher])
+    def runtime_stats(self, request):
+        """
+        当前工作进程的运行状态：代理池、准入控制、后台任务队列、模型服务连接池、课程检索索引缓存和检索结果打包节省的令牌数
+        """
+        return Response({
+            "agent_pool": agent_pool.stats(),
+            "admission": admission_controller.stats(),
+            "job_queue": {
+                "pending": ai_job_queue.pending,
+                "max_pending": ai_job_queue.max_pending,
+                "max_workers": ai_job_queue.max_workers,
+            },
+            "async_queue": {
+                "pending": ai_async_queue.pending,
+                "max_pending": ai_async_queue.max_pending,
+                "max_workers": ai_async_queue.max_workers,
+            },
+            "llm_http": http_client_stats(),
+            "retriever_index": agent_factory.retriever_index_stats(),
+            "context_packing": context_packer.stats(),
+        })
+        
     @action(detail=True, methods=['post'])
     def feedback(self, request, pk=None):
         """
@@ -139,28 +270,128 @@ class AIInteractionViewSet(viewsets.ModelViewSet):
                 }
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # 异步执行 AI 处理
+        # 提交后台 AI 任务
         prompt = f"关于课程{course_id}的问题：{question}"
         context = {
             "course_id": course_id,
             "student_id": request.user.id
         }
         
-        # 执行 AI 处理
-        response = tasks.async_ai_process(prompt, context, 'question_answering')
-        
-        # 保存交互记录
-        interaction_id = tasks.save_ai_interaction(
-            user_id=request.user.id,
-            course_id=course_id,
-            query=question,
-            response=response,
-            interaction_type='question',
-            context=context
+        # 限制提问速率
+        try:
+            admission_controller.check_rate(request.user.id, course.id)
+        except AdmissionRejected as e:
+            return Response({
+                "error": {
+                    "code": "RATE_LIMITED",
+                    "message": str(e)
+                }
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(e.retry_after)})
+            
+        # 多轮对话：附带同一会话的历史
+        session, prompt = prepare_conversation(
+            request.user.id, course.id, prompt, context, request.data.get('session_id'), question
         )
         
+        try:
+            interaction_id = tasks.create_ai_job(
+                user_id=request.user.id,
+                course_id=course_id,
+                query=question,
+                prompt=prompt,
+                interaction_type='question',
+                context=context,
+                mode=request.data.get('mode')
+            )
+        except JobQueueFull as e:
+            return Response({
+                "error": {
+                    "code": "SERVICE_BUSY",
+                    "message": "AI 助手当前繁忙，请稍后重试"
+                }
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(e.retry_after)})
+        
         return Response({
             "success": True,
+            "task_id": interaction_id,
             "interaction_id": interaction_id,
-            "message": "处理完成"
-        })
+            "session_id": session.id,
+            "status": "pending",
+            "message": "任务已提交"
+        }, status=status.HTTP_202_ACCEPTED)
+
+class CourseAnalysisRunViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    课程批量分析任务视图集（仅教师可用）
+    """
+    permission_classes = [IsAuthenticated, IsTeacher]
+    queryset = CourseAnalysisRun.objects.all()
+    
+    def get_serializer_class(self):
+        """
+        获取序列化器类
+        """
+        if self.action == 'retrieve':
+            return CourseAnalysisRunDetailSerializer
+        return CourseAnalysisRunSerializer
+        
+    def _submit(self, run, concurrency=None):
+        """
+        提交分析任务到后台任务队列，队列已满时返回 503，任务保持排队中状态，可稍后继续
+        """
+        try:
+            submit_analysis_run(run.id, concurrency)
+        except JobQueueFull as e:
+            return Response({
+                "error": {
+                    "code": "SERVICE_BUSY",
+                    "message": "AI 助手当前繁忙，请稍后继续此分析任务",
+                    "run_id": run.id
+                }
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(e.retry_after)})
+            
+        return Response(CourseAnalysisRunSerializer(run).data, status=status.HTTP_202_ACCEPTED)
+        
+    def create(self, request, *args, **kwargs):
+        """
+        创建课程批量分析任务并提交后台执行，立即返回 202
+        """
+        serializer = CourseAnalysisRunCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        run = create_analysis_run(
+            analysis_type=serializer.validated_data['analysis_type'],
+            course_ids=serializer.validated_data.get('course_ids'),
+            concurrency=serializer.validated_data.get('concurrency'),
+            user_id=request.user.id
+        )
+        if not run.results.exists():
+            run.delete()
+            return Response({
+                "error": {
+                    "code": "NO_COURSES",
+                    "message": "没有需要分析的课程"
+                }
+            }, status=status.HTTP_400_BAD_REQUEST)
+            
+        return self._submit(run, serializer.validated_data.get('concurrency'))
+        
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        """
+        继续执行分析任务，只重新分析未完成的课程
+        任务处理中时需要传入 force=true（例如处理进程已退出、任务状态未更新时）
+        """
+        run = self.get_object()
+        
+        if run.status == 'completed':
+            return Response(CourseAnalysisRunSerializer(run).data)
+        if run.status == 'running' and not request.data.get('force'):
+            return Response({
+                "error": {
+                    "code": "RUN_IN_PROGRESS",
+                    "message": "分析任务正在处理中"
+                }
+            }, status=status.HTTP_409_CONFLICT)
+            
+        return self._submit(run, request.data.get('concurrency'))
@@ -16,4 +16,7 @@ class AgentsConfig(AppConfig):
         应用启动时执行的初始化操作
         """
         # 导入信号处理器
-        import agents.signals
\ No newline at end of file
+        import agents.signals
+
+        # 注册系统检查
+        import agents.checks
\ No newline at end of file
@@ -0,0 +1,355 @@
+"""
+AI 助手异步视图函数
+在 ASGI 下运行，数据库访问使用 Django 异步 ORM，等待 AI 回答期间不占用工作线程
+"""
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from django.contrib.auth.decorators import login_required
+
+from agents.models import AIInteraction
+from agents import tasks
+from agents.jobs import JobQueueFull
+from agents.views import check_ai_access, job_queue_full_response, admission_rejected_response
+from agents.admission import AdmissionRejected, admission_controller
+from agents.conversation import prepare_conversation
+from agents.utils import format_error_response, format_success_response
+from courses.models import Course
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def parse_question(request):
+    """
+    解析请求中的问题
+    
+    Args:
+        request: HTTP 请求对象
+        
+    Returns:
+        tuple: (问题, 交互类型, 回答方式, 会话ID, 错误响应)，解析成功时错误响应为None
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return None, None, None, None, JsonResponse(
+            format_error_response(
+                "INVALID_REQUEST",
+                "请求数据格式错误"
+            ),
+            status=400
+        )
+        
+    question = data.get('query')
+    interaction_type = data.get('interaction_type', 'question')
+    
+    if not question:
+        return None, None, None, None, JsonResponse(
+            format_error_response(
+                "MISSING_PARAMETER",
+                "缺少必要参数: query"
+            ),
+            status=400
+        )
+        
+    return question, interaction_type, data.get('mode'), data.get('session_id'), None
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+async def ai_assistant_view(request, course_id):
+    """
+    AI 助手异步视图函数
+    处理用户提问并返回 AI 回答
+    
+    Args:
+        request: HTTP 请求对象
+        course_id (int): 课程ID
+        
+    Returns:
+        JsonResponse: AI 回答结果
+    """
+    try:
+        user = await request.auser()
+        
+        # 获取课程对象
+        course = await Course.objects.filter(id=course_id).afirst()
+        if course is None:
+            return JsonResponse(
+                format_error_response(
+                    "COURSE_NOT_FOUND",
+                    "课程不存在"
+                ),
+                status=404
+            )
+            
+        # 检查权限
+        if not await sync_to_async(check_ai_access)(user, course):
+            return JsonResponse(
+                format_error_response(
+                    "PERMISSION_DENIED",
+                    "您没有权限访问此课程的 AI 助手功能"
+                ),
+                status=403
+            )
+            
+        question, interaction_type, mode, session_id, error_response = parse_question(request)
+        if error_response:
+            return error_response
+            
+        # 构造提示词
+        prompt = f"关于课程{course_id}的问题：{question}"
+        context = {
+            "course_id": course_id,
+            "student_id": user.id
+        }
+        
+        # 限制提问速率
+        admission_controller.check_rate(user.id, course_id)
+        
+        # 多轮对话：附带同一会话的历史
+        session, prompt = await sync_to_async(prepare_conversation)(
+            user.id, course_id, prompt, context, session_id, question
+        )
+        
+        # 执行 AI 处理
+        response = await tasks.aprocess_ai(prompt, context, 'question_answering', question, mode)
+        
+        # 保存交互记录
+        interaction_id = await tasks.asave_ai_interaction(
+            user_id=user.id,
+            course_id=course_id,
+            query=question,
+            response=response,
+            interaction_type=interaction_type,
+            context=context
+        )
+        
+        return JsonResponse(
+            format_success_response({
+                "interaction_id": interaction_id,
+                "session_id": session.id,
+                "query": question,
+                "response": response,
+                "message": "处理完成"
+            })
+        )
+        
+    except JobQueueFull as e:
+        return job_queue_full_response(e)
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"AI 助手异步处理过程中发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "处理请求时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+async def general_ai_assistant_view(request):
+    """
+    通用 AI 助手异步视图函数
+    处理用户提问并返回 AI 回答，不依赖于特定课程
+    
+    Args:
+        request: HTTP 请求对象
+        
+    Returns:
+        JsonResponse: AI 回答结果
+    """
+    try:
+        user = await request.auser()
+        
+        question, interaction_type, mode, session_id, error_response = parse_question(request)
+        if error_response:
+            return error_response
+            
+        # 构造提示词
+        prompt = f"用户问题：{question}"
+        context = {
+            "user_id": user.id,
+            "interaction_type": interaction_type
+        }
+        
+        # 限制提问速率
+        admission_controller.check_rate(user.id, None)
+        
+        # 多轮对话：附带同一会话的历史
+        session, prompt = await sync_to_async(prepare_conversation)(
+            user.id, None, prompt, context, session_id, question
+        )
+        
+        # 执行 AI 处理
+        response = await tasks.aprocess_ai(prompt, context, 'question_answering', question, mode)
+        
+        # 保存交互记录（不关联特定课程）
+        interaction_id = await tasks.asave_ai_interaction(
+            user_id=user.id,
+            course_id=None,
+            query=question,
+            response=response,
+            interaction_type=interaction_type,
+            context=context
+        )
+        
+        return JsonResponse(
+            format_success_response({
+                "interaction_id": interaction_id,
+                "session_id": session.id,
+                "query": question,
+                "response": response,
+                "message": "处理完成"
+            })
+        )
+        
+    except JobQueueFull as e:
+        return job_queue_full_response(e)
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"通用 AI 助手异步处理过程中发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "处理请求时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
+
+@login_required
+@require_http_methods(["GET"])
+async def ai_interactions_history(request):
+    """
+    异步获取 AI 交互历史记录
+    
+    Args:
+        request: HTTP 请求对象
+        
+    Returns:
+        JsonResponse: 交互历史记录
+    """
+    try:
+        user = await request.auser()
+        
+        # 获取查询参数
+        course_id = request.GET.get('course_id')
+        interaction_type = request.GET.get('interaction_type')
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+        page = max(1, int(request.GET.get('page', 1)))
+        
+        # 构建查询
+        interactions = AIInteraction.objects.filter(user=user)
+        
+        if course_id:
+            interactions = interactions.filter(course_id=course_id)
+            
+        if interaction_type:
+            interactions = interactions.filter(interaction_type=interaction_type)
+            
+        # 分页
+        count = await interactions.acount()
+        offset = (page - 1) * limit
+        page_qs = interactions.order_by('timestamp')[offset:offset + limit]
+        
+        # 格式化结果
+        results = [
+            {
+                "id": interaction.id,
+                "query": interaction.query,
+                "response": interaction.response,
+                "interaction_type": interaction.interaction_type,
+                "timestamp": interaction.timestamp.isoformat()
+            }
+            async for interaction in page_qs
+        ]
+        
+        return JsonResponse({
+            "count": count,
+            "next": page + 1 if offset + limit < count else None,
+            "previous": page - 1 if page > 1 else None,
+            "results": results
+        })
+        
+    except Exception as e:
+        logger.error(f"异步获取 AI 交互历史时发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "获取交互历史时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
+
+@login_required
+@require_http_methods(["GET"])
+async def ai_interaction_detail(request, interaction_id):
+    """
+    异步获取 AI 交互详情
+    
+    Args:
+        request: HTTP 请求对象
+        interaction_id (int): 交互记录ID
+        
+    Returns:
+        JsonResponse: 交互详情
+    """
+    try:
+        user = await request.auser()
+        
+        interaction = await AIInteraction.objects.select_related('user', 'course').filter(
+            id=interaction_id, user=user
+        ).afirst()
+        if interaction is None:
+            return JsonResponse(
+                format_error_response(
+                    "NOT_FOUND",
+                    "交互记录不存在"
+                ),
+                status=404
+            )
+            
+        # 格式化结果
+        result = {
+            "id": interaction.id,
+            "user": {
+                "id": interaction.user.id,
+                "username": interaction.user.username
+            },
+            "course": {
+                "id": interaction.course.id,
+                "name": interaction.course.name
+            } if interaction.course else None,
+            "query": interaction.query,
+            "response": interaction.response,
+            "interaction_type": interaction.interaction_type,
+            "context": interaction.context,
+            "status": interaction.status,
+            "timestamp": interaction.timestamp.isoformat(),
+            "feedback_score": interaction.feedback_score,
+            "feedback_comment": interaction.feedback_comment
+        }
+        
+        return JsonResponse(format_success_response(result))
+        
+    except Exception as e:
+        logger.error(f"异步获取 AI 交互详情时发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "获取交互详情时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
@@ -0,0 +1,358 @@
+"""
+AI 回答缓存
+两级缓存：进程内 LRU + Django 共享缓存，键由规范化提问、课程ID、代理类型、回答方式和代理可见的上下文组成
+（不含提问者的身份，代理的提示词中也不含，不同用户的相同问题共享缓存）。
+每个课程维护一个知识库版本号，课程文档更新时版本号递增，旧版本的缓存条目自然失效。
+版本号保存在共享缓存中，各工作进程在本地缓存读到的版本号 VERSION_TTL 秒；
+版本号要在多个工作进程（以及 update_knowledge_base 等管理命令）之间生效，
+Django 缓存必须使用 Redis、Memcached 等跨进程的后端，默认的 LocMemCache 只在单个进程内有效。
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+from django.core.cache import caches
+from agents.config import CACHE_CONFIG
+from agents.utils import context_fingerprint, normalize_query
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 只在单个进程内有效的缓存后端
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+class VersionCounter:
+    """
+    版本号类
+    每个课程和全局各有一个版本号，保存在 Django 共享缓存中。版本号取自同一个递增序号，
+    每次递增还在变更记录中记下序号对应的课程，读取方可以据此找出某个序号之后变化过的课程。
+    读取时先查进程内缓存，超过 ttl 秒才重新读取共享缓存；本进程递增版本号时立即更新进程内缓存，
+    其他工作进程最迟在 ttl 秒后读到新的版本号
+    """
+    
+    # 变更记录的保存时间（秒），记录缺失时读取方按全部课程都已变化处理
+    CHANGE_LOG_TIMEOUT = 7 * 24 * 3600
+    
+    # 一次读取的变更记录数上限，超出时按全部课程都已变化处理
+    MAX_CHANGES = 1000
+    
+    def __init__(self,
+                 name: str,
+                 prefix: Optional[str] = None,
+                 ttl: Optional[float] = None,
+                 cache_alias: str = 'default'):
+        """
+        初始化版本号
+        
+        Args:
+            name (str): 版本号名称，用于区分缓存键
+            prefix (Optional[str]): 缓存键前缀
+            ttl (Optional[float]): 进程内缓存版本号的时间（秒）
+            cache_alias (str): Django 缓存别名
+        """
+        self.name = name
+        self.prefix = prefix or CACHE_CONFIG['CACHE_PREFIX']
+        self.ttl = CACHE_CONFIG['VERSION_TTL'] if ttl is None else ttl
+        self.cache_alias = cache_alias
+        
+        # 课程ID -> ((全局版本号, 课程版本号), 过期时间)
+        self._local: Dict[Optional[int], Tuple[Tuple[int, int], float]] = {}
+        # (最新序号, 过期时间)
+        self._current: Optional[Tuple[int, float]] = None
+        self._lock = threading.Lock()
+        
+    @property
+    def shared(self):
+        """
+        Django 共享缓存
+        """
+        return caches[self.cache_alias]
+        
+    def key(self, course_id: Optional[int]) -> str:
+        """
+        版本号的缓存键
+        
+        Args:
+            course_id (Optional[int]): 课程ID，为None表示全局版本
+            
+        Returns:
+            str: 缓存键
+        """
+        return f"{self.prefix}{self.name}:{course_id if course_id else 'global'}"
+        
+    def _sequence_key(self) -> str:
+        """
+        递增序号的缓存键
+        """
+        return f"{self.prefix}{self.name}:sequence"
+        
+    def _change_key(self, version: int) -> str:
+        """
+        变更记录的缓存键
+        """
+        return f"{self.prefix}{self.name}:change:{version}"
+        
+    def get(self, course_id: Optional[int]) -> Tuple[int, int]:
+        """
+        获取全局和课程的版本号
+        
+        Args:
+            course_id (Optional[int]): 课程ID
+            
+        Returns:
+            Tuple[int, int]: (全局版本号, 课程版本号)，尚未递增过的版本号为 1
+        """
+        course_id = course_id or None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(course_id)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+                
+        global_key, course_key = self.key(None), self.key(course_id)
+        values = self.shared.get_many([global_key, course_key])
+        versions = (values.get(global_key, 1), values.get(course_key, 1))
+        with self._lock:
+            self._local[course_id] = (versions, now + self.ttl)
+        return versions
+        
+    def current(self) -> int:
+        """
+        获取最新的序号，即所有课程中最大的版本号
+        
+        Returns:
+            int: 序号，尚未递增过时为 1
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._current is not None and self._current[1] > now:
+                return self._current[0]
+                
+        version = self.shared.get(self._sequence_key(), 1)
+        with self._lock:
+            self._current = (version, now + self.ttl)
+        return version
+        
+    def changes(self, since: int, until: int) -> Optional[Set[int]]:
+        """
+        获取两个序号之间变化过的课程
+        
+        Args:
+            since (int): 起始序号（不含）
+            until (int): 结束序号（含）
+            
+        Returns:
+            Optional[Set[int]]: 课程ID集合；全局版本变化过、变更记录不完整或序号被重置时为None，表示全部课程都已变化
+        """
+        if until == since:
+            return set()
+        if until < since or until - since > self.MAX_CHANGES:
+            # 共享缓存被清空后序号从头开始
+            return None
+            
+        keys = [self._change_key(version) for version in range(since + 1, until + 1)]
+        values = self.shared.get_many(keys)
+        if len(values) < len(keys) or 0 in values.values():
+            return None
+        return set(values.values())
+        
+    def bump(self, course_id: Optional[int] = None) -> int:
+        """
+        递增课程的版本号，course_id 为None时递增全局版本号
+        
+        Args:
+            course_id (Optional[int]): 课程ID
+            
+        Returns:
+            int: 新的版本号
+        """
+        course_id = course_id or None
+        
+        # 序号从 1 开始，第一次递增后为 2
+        self.shared.add(self._sequence_key(), 1, None)
+        version = self.shared.incr(self._sequence_key())
+        self.shared.set(self._change_key(version), course_id or 0, self.CHANGE_LOG_TIMEOUT)
+        self.shared.set(self.key(course_id), version, None)
+        
+        # 本进程立即读到新的版本号
+        now = time.monotonic()
+        with self._lock:
+            if course_id is None:
+                self._local.clear()
+            else:
+                self._local.pop(course_id, None)
+            self._current = (version, now + self.ttl)
+        return version
+        
+    def clear_local(self):
+        """
+        清空进程内缓存的版本号
+        """
+        with self._lock:
+            self._local.clear()
+            self._current = None
+
+class AnswerCache:
+    """
+    AI 回答缓存类
+    """
+    
+    def __init__(self,
+                 timeout: Optional[int] = None,
+                 local_max_entries: Optional[int] = None,
+                 prefix: Optional[str] = None,
+                 cache_alias: str = 'default'):
+        """
+        初始化回答缓存
+        
+        Args:
+            timeout (Optional[int]): 缓存有效期（秒）
+            local_max_entries (Optional[int]): 进程内 LRU 缓存的最大条目数
+            prefix (Optional[str]): 缓存键前缀
+            cache_alias (str): Django 缓存别名
+        """
+        self.timeout = timeout or CACHE_CONFIG['CACHE_TIMEOUT']
+        self.local_max_entries = local_max_entries or CACHE_CONFIG['LOCAL_MAX_ENTRIES']
+        self.prefix = prefix or CACHE_CONFIG['CACHE_PREFIX']
+        self.cache_alias = cache_alias
+        self.enabled = CACHE_CONFIG['ENABLED']
+        self.versions = VersionCounter('kb_version', self.prefix, cache_alias=cache_alias)
+        
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        
+    @property
+    def shared(self):
+        """
+        Django 共享缓存
+        """
+        return caches[self.cache_alias]
+        
+    def make_key(self,
+                 query: str,
+                 course_id: Optional[int],
+                 agent_type: str,
+                 mode: Optional[str] = None,
+                 context: Optional[Dict[str, Any]] = None) -> str:
+        """
+        构造缓存键
+        键中包含全局和课程的知识库版本号（进程内缓存 VERSION_TTL 秒），知识库更新后旧键不再命中
+        
+        Args:
+            query (str): 用户提问
+            course_id (Optional[int]): 课程ID
+            agent_type (str): 代理类型
+            mode (Optional[str]): 回答方式（agent / rag）
+            context (Optional[Dict[str, Any]]): 上下文信息，只有代理可见的字段计入键
+            
+        Returns:
+            str: 缓存键
+        """
+        global_version, course_version = self.versions.get(course_id)
+        text = f"{normalize_query(query)}\n{mode or ''}\n{context_fingerprint(context)}"
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return f"{self.prefix}answer:{agent_type}:{course_id if course_id else 'global'}:{global_version}.{course_version}:{digest}"
+        
+    def get(self,
+            query: str,
+            course_id: Optional[int],
+            agent_type: str,
+            mode: Optional[str] = None,
+            context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        获取缓存的回答
+        
+        Args:
+            query (str): 用户提问
+            course_id (Optional[int]): 课程ID
+            agent_type (str): 代理类型
+            mode (Optional[str]): 回答方式（agent / rag）
+            context (Optional[Dict[str, Any]]): 上下文信息
+            
+        Returns:
+            Optional[str]: 缓存的回答，未命中时为None
+        """
+        if not self.enabled:
+            return None
+            
+        try:
+            key = self.make_key(query, course_id, agent_type, mode, context)
+            now = time.monotonic()
+            
+            with self._lock:
+                entry = self._local.get(key)
+                if entry is not None:
+                    response, expires_at = entry
+                    if expires_at > now:
+                        self._local.move_to_end(key)
+                        return response
+                    del self._local[key]
+                    
+            response = self.shared.get(key)
+            if response is not None:
+                self._set_local(key, response)
+            return response
+            
+        except Exception as e:
+            # 缓存故障不影响正常回答
+            logger.warning(f"读取回答缓存时发生错误: {str(e)}")
+            return None
+            
+    def set(self,
+            query: str,
+            course_id: Optional[int],
+            agent_type: str,
+            response: str,
+            mode: Optional[str] = None,
+            context: Optional[Dict[str, Any]] = None):
+        """
+        缓存回答
+        
+        Args:
+            query (str): 用户提问
+            course_id (Optional[int]): 课程ID
+            agent_type (str): 代理类型
+            response (str): AI 回答
+            mode (Optional[str]): 回答方式（agent / rag）
+            context (Optional[Dict[str, Any]]): 上下文信息
+        """
+        if not self.enabled:
+            return
+            
+        try:
+            key = self.make_key(query, course_id, agent_type, mode, context)
+            self.shared.set(key, response, self.timeout)
+            self._set_local(key, response)
+        except Exception as e:
+            logger.warning(f"写入回答缓存时发生错误: {str(e)}")
+            
+    def _set_local(self, key: str, response: str):
+        """
+        写入进程内 LRU 缓存，超出容量时淘汰最久未使用的条目
+        """
+        with self._lock:
+            self._local[key] = (response, time.monotonic() + self.timeout)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+                
+    def invalidate(self, course_id: Optional[int] = None):
+        """
+        使课程的缓存失效，course_id 为None时使全部缓存失效
+        
+        Args:
+            course_id (Optional[int]): 课程ID
+        """
+        self.versions.bump(course_id)
+        logger.info(f"回答缓存已失效: {'课程 ' + str(course_id) if course_id else '全部课程'}")
+
+# 全局回答缓存实例
+answer_cache = AnswerCache()
+
+# 全局检索索引版本号：知识库文档或向量变化后递增，各工作进程的检索工具据此重新加载变化的课程
+index_versions = VersionCounter('index_version')
@@ -0,0 +1,30 @@
+"""
+AI 助手系统检查
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+from agents.cache import LOCAL_CACHE_BACKENDS
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    检查 Django 缓存是否在进程之间共享
+    回答缓存的知识库版本号保存在 Django 缓存中，进程内缓存后端无法让其他进程更新的知识库在 Web 工作进程中生效
+    
+    Args:
+        app_configs: 要检查的应用配置
+        **kwargs: 其他参数
+        
+    Returns:
+        list: 检查结果
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            f"AI 助手使用的缓存后端 {backend} 只在单个进程内有效，知识库更新后其他工作进程的回答缓存不会失效",
+            hint="将 CACHE_BACKEND 设置为 Redis 或 Memcached 等跨进程的缓存后端",
+            id='agents.W001',
+        )
+    ]
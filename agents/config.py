@@ -25,6 +25,9 @@ AI_ASSISTANT_CONFIG = {
     'TOOLS_CONFIG': {
         'edusys_retriever': {
             'k': 10,  # 检索文档数量
+            'course_index_max_courses': 64,  # 缓存的课程检索索引数上限
+            'course_index_max_chunks': 50000,  # 缓存的课程检索索引包含的文档分块总数上限（限制内存占用）
+            'mode': 'bm25',  # 检索方式：bm25 或 dense（按知识库文档向量检索，需要向量模型和已生成的文档向量）
         }
     },
     
@@ -33,12 +36,153 @@ AI_ASSISTANT_CONFIG = {
         'chunk_size': 500,
         'chunk_overlap': 50,
         'separators': ["\n\n", "\n", ".", "!", "?", " ", ""],
+        # 代理加载知识库的方式: database 只读加载已构建的知识库; rebuild 每个进程启动后重新构建并写入数据库
+        'load_mode': 'database',
+    },
+    
+    # 检索索引配置
+    'RETRIEVAL_CONFIG': {
+        'BM25_K1': 1.5,  # BM25 词频饱和参数
+        'BM25_B': 0.75,  # BM25 文档长度归一化参数
+        'BM25_EPSILON': 0.25,  # 出现在一半以上文档中的词的 IDF 下限（平均 IDF 的倍数）
+        'COMPACT_RATIO': 0.2,  # 已删除分块占比超过该值时压缩倒排表
+        'SCORER': 'sparse',  # 评分方式：sparse（稀疏矩阵向量化评分）或 postings（遍历倒排表）
+        'SPARSE_MIN_DOCS': 1000,  # 文档数不少于该值时才使用稀疏矩阵评分
+        'TOKENIZER': 'bigram',  # 分词方式：bigram（中文相邻两字）、jieba（词典分词，需安装 jieba）或 whitespace
+    },
+    
+    # 模型服务 HTTP 连接池配置（进程内所有模型实例共享）
+    'LLM_HTTP_CONFIG': {
+        'MAX_CONNECTIONS': 20,  # 最大连接数
+        'MAX_KEEPALIVE_CONNECTIONS': 10,  # 保持空闲的最大连接数
+        'KEEPALIVE_EXPIRY': 60,  # 空闲连接保持时间（秒）
+        'MAX_PER_HOST': 16,  # 每个模型服务地址的最大并发请求数
+        'CONNECT_TIMEOUT': 10,  # 建立连接超时（秒）
+        'READ_TIMEOUT': 120,  # 读取响应超时（秒）
+        'POOL_TIMEOUT': 30,  # 等待可用连接的超时（秒）
+        'MAX_RETRIES': 2,  # 请求失败的重试次数
+    },
+    
+    # 代理池配置
+    'POOL_CONFIG': {
+        'POOL_SIZE': 4,  # 每种代理类型的最大实例数
+        'CHECKOUT_TIMEOUT': 30,  # 借出代理的最长等待时间（秒）
+        'AGENT_TYPES': ['question_answering', 'course_analysis'],
+    },
+    
+    # 后台任务队列配置
+    'JOB_QUEUE_CONFIG': {
+        'MAX_WORKERS': 4,  # 同时执行的 AI 任务数
+        'MAX_PENDING': 100,  # 排队和执行中的任务总数上限
+        'RETRY_AFTER': 30,  # 队列已满时建议客户端重试的间隔（秒）
+        'ASYNC_MAX_WORKERS': 64,  # 异步视图中等待 AI 回答的线程数（同时运行的代理数仍为准入控制的 MAX_ACTIVE，默认即代理池大小 4）
+        'ASYNC_MAX_PENDING': 500,  # 异步视图排队和执行中的请求总数上限
+    },
+    
+    # 请求准入控制配置
+    'ADMISSION_CONFIG': {
+        'ENABLED': True,  # 是否启用速率限制和公平排队
+        'USER_RATE': 0.5,  # 每个用户每秒补充的提问次数
+        'USER_BURST': 10,  # 每个用户允许的突发提问次数
+        'COURSE_RATE': 5,  # 每门课程每秒补充的提问次数
+        'COURSE_BURST': 50,  # 每门课程允许的突发提问次数
+        'MAX_ACTIVE': 0,  # 每个进程同时运行的代理数，0 表示与代理池大小相同（大于代理池大小时多出的请求在借出代理时等待）
+        'MAX_WAITING': 50,  # 排队请求总数上限
+        'MAX_WAITING_PER_USER': 5,  # 每个用户排队请求数上限（不小于批量提问并发数）
+        'QUEUE_TIMEOUT': 60,  # 排队的最长等待时间（秒）
+        'RETRY_AFTER': 5,  # 排队已满时建议客户端重试的间隔（秒）
+        'COURSE_WEIGHTS': {},  # 课程权重 {课程ID: 每轮放行的请求数}，未配置的课程为1
+    },
+    
+    # 模型路由配置（各代理类型的路由也可以在数据库代理配置的 routes 中设置）
+    'ROUTING_CONFIG': {
+        'ENABLED': True,  # 是否按问题复杂程度选择模型
+        'SIMPLE_MODEL_ID': None,  # 简单问题使用的小模型，None 表示使用代理默认的模型
+        'COMPLEX_MODEL_ID': None,  # 复杂问题使用的大模型，None 表示使用代理默认的模型
+        'SIMPLE_MAX_TOKENS': 40,  # 超过该令牌数的提问视为复杂问题
+        'COMPLEX_KEYWORDS': [  # 需要推理的提问中常见的词
+            '为什么', '比较', '区别', '分析', '证明', '推导', '设计', '优化', '评价', '如何实现',
+            'why', 'compare', 'difference', 'analyze', 'prove', 'derive', 'design', 'optimize',
+        ],
+        'CONFIG_CACHE_SECONDS': 60,  # 数据库路由配置的缓存时间（秒）
+    },
+    
+    # 批量提问配置
+    'BATCH_CONFIG': {
+        'MAX_QUESTIONS': 50,  # 单次批量提问的最大问题数
+        'MAX_CONCURRENCY': 4,  # 同时处理的问题数
+    },
+    
+    # 课程批量分析配置
+    'ANALYSIS_CONFIG': {
+        'MAX_CONCURRENCY': 4,  # 同时分析的课程数（不超过代理池大小）
+    },
+    
+    # 多轮对话配置
+    'CONVERSATION_CONFIG': {
+        'MAX_TURNS': 4,  # 提问时原样附带的最近对话轮数，更早的轮次合并到摘要中
+        'TURN_MAX_CHARS': 500,  # 每轮对话中回答保留的最大字符数
+        'SUMMARY_MAX_CHARS': 1000,  # 历史摘要的最大字符数
+    },
+    
+    # 检索结果上下文打包配置
+    'CONTEXT_PACKING_CONFIG': {
+        'ENABLED': True,  # 是否对检索结果去重、合并并限制长度
+        'MAX_TOKENS': 1500,  # 检索结果的令牌预算
+        'MIN_OVERLAP': 20,  # 判定两个分块重叠的最小重叠字符数
+        'MIN_TRIM_TOKENS': 50,  # 剩余预算少于该值时不再截取下一段内容
+    },
+    
+    # 单次检索回答配置
+    'RAG_CONFIG': {
+        'DEFAULT_MODE': 'agent',  # 默认回答方式：agent（多步代理）或 rag（检索后单次调用模型）
+        'TOP_K': 4,  # 放入提示词的文档数
+        'MIN_SCORE': 1.0,  # 最相关文档的 BM25 分数低于该值时改用多步代理
+        'MIN_DENSE_SCORE': 0.5,  # 向量检索时最相关文档的余弦相似度低于该值时改用多步代理
     },
     
     # 缓存配置
     'CACHE_CONFIG': {
         'CACHE_TIMEOUT': 3600,  # 1小时
         'CACHE_PREFIX': 'ai_assistant_',
+        'ENABLED': True,  # 是否启用回答缓存
+        'LOCAL_MAX_ENTRIES': 1024,  # 进程内 LRU 缓存的最大条目数
+        'VERSION_TTL': 5,  # 进程内缓存知识库版本号的时间（秒），其他进程更新知识库后最迟在该时间后生效
+    },
+    
+    # 文本向量化配置
+    'EMBEDDING_CONFIG': {
+        'MODEL_NAME': 'paraphrase-multilingual-MiniLM-L12-v2',  # sentence-transformers 模型
+        'DEVICE': None,  # 运行设备，None 表示自动选择
+        'CACHE_SIZE': 2048,  # 进程内缓存的提问向量数
+        'ENCODE_BATCH_SIZE': 128,  # 模型每次前向计算的文本数（CPU 上较大的批次吞吐量更高）
+        'DOCUMENT_BATCH_SIZE': 1024,  # 生成文档向量时每批读取、编码和写回的分块数
+        'EMBED_ON_UPDATE': True,  # 知识库更新后是否在后台为内容变化的分块生成向量
+    },
+    
+    # 语义缓存配置
+    'SEMANTIC_CACHE_CONFIG': {
+        'ENABLED': True,  # 是否启用语义缓存
+        'SIMILARITY_THRESHOLD': 0.92,  # 余弦相似度阈值，高于该值视为同一问题
+        'MAX_CANDIDATES': 500,  # 每次比对的历史回答数上限
+        'MAX_AGE_DAYS': 30,  # 只复用最近若干天内的回答
+    },
+    
+    # 执行追踪配置（工具使用记录和代理步骤记录）
+    'TRACE_CONFIG': {
+        'ENABLED': True,  # 是否记录工具调用和代理步骤
+        'BATCH_SIZE': 50,  # 攒够多少条记录后批量写入
+        'FLUSH_INTERVAL': 5,  # 最长写入间隔（秒）
+        'OUTPUT_MAX_LENGTH': 2000,  # 工具输出保存的最大长度
+    },
+    
+    # 本地模拟模型服务配置（基准测试和压测用）
+    'STUB_LLM_CONFIG': {
+        'HOST': '127.0.0.1',
+        'PORT': 8899,
+        'LATENCY': 0.0,  # 返回第一个令牌前的延迟（秒）
+        'TOKENS_PER_SECOND': 0,  # 输出速率，0 表示不限速
+        'CHARS_PER_TOKEN': 2,  # 估算令牌数时每个令牌对应的字符数
     },
     
     # 安全配置
@@ -67,6 +211,102 @@ def get_config_from_env():
     if model_id:
         config['DEFAULT_MODEL']['model_id'] = model_id
     
+    # 知识库加载方式
+    kb_load_mode = os.environ.get('AI_KNOWLEDGE_BASE_LOAD_MODE')
+    if kb_load_mode:
+        config['KNOWLEDGE_BASE_CONFIG']['load_mode'] = kb_load_mode
+        
+    # 模型服务最大连接数
+    llm_max_connections = os.environ.get('AI_LLM_MAX_CONNECTIONS')
+    if llm_max_connections:
+        config['LLM_HTTP_CONFIG']['MAX_CONNECTIONS'] = int(llm_max_connections)
+        
+    # 代理池大小
+    pool_size = os.environ.get('AI_AGENT_POOL_SIZE')
+    if pool_size:
+        config['POOL_CONFIG']['POOL_SIZE'] = int(pool_size)
+        
+    # 课程批量分析并发数
+    analysis_concurrency = os.environ.get('AI_ANALYSIS_CONCURRENCY')
+    if analysis_concurrency:
+        config['ANALYSIS_CONFIG']['MAX_CONCURRENCY'] = int(analysis_concurrency)
+        
+    # 后台任务并发数
+    job_workers = os.environ.get('AI_JOB_WORKERS')
+    if job_workers:
+        config['JOB_QUEUE_CONFIG']['MAX_WORKERS'] = int(job_workers)
+        
+    # 异步视图请求并发数
+    async_workers = os.environ.get('AI_ASYNC_WORKERS')
+    if async_workers:
+        config['JOB_QUEUE_CONFIG']['ASYNC_MAX_WORKERS'] = int(async_workers)
+        
+    # 准入控制开关和用户提问速率
+    admission_enabled = os.environ.get('AI_ADMISSION_ENABLED')
+    if admission_enabled:
+        config['ADMISSION_CONFIG']['ENABLED'] = admission_enabled.lower() in ('1', 'true', 'yes')
+    user_rate = os.environ.get('AI_USER_RATE')
+    if user_rate:
+        config['ADMISSION_CONFIG']['USER_RATE'] = float(user_rate)
+        
+    # 同时运行的代理数
+    max_active = os.environ.get('AI_ADMISSION_MAX_ACTIVE')
+    if max_active:
+        config['ADMISSION_CONFIG']['MAX_ACTIVE'] = int(max_active)
+        
+    # 简单问题使用的小模型
+    small_model_id = os.environ.get('AI_SMALL_MODEL_ID')
+    if small_model_id:
+        config['ROUTING_CONFIG']['SIMPLE_MODEL_ID'] = small_model_id
+        
+    # 检索结果令牌预算
+    context_max_tokens = os.environ.get('AI_CONTEXT_MAX_TOKENS')
+    if context_max_tokens:
+        config['CONTEXT_PACKING_CONFIG']['MAX_TOKENS'] = int(context_max_tokens)
+        
+    # 默认回答方式
+    answer_mode = os.environ.get('AI_ANSWER_MODE')
+    if answer_mode:
+        config['RAG_CONFIG']['DEFAULT_MODE'] = answer_mode
+        
+    # 回答缓存开关
+    cache_enabled = os.environ.get('AI_ANSWER_CACHE_ENABLED')
+    if cache_enabled:
+        config['CACHE_CONFIG']['ENABLED'] = cache_enabled.lower() in ('1', 'true', 'yes')
+        
+    # 进程内缓存知识库版本号的时间
+    version_ttl = os.environ.get('AI_CACHE_VERSION_TTL')
+    if version_ttl:
+        config['CACHE_CONFIG']['VERSION_TTL'] = float(version_ttl)
+        
+    # 检索分词方式
+    retrieval_tokenizer = os.environ.get('AI_RETRIEVAL_TOKENIZER')
+    if retrieval_tokenizer:
+        config['RETRIEVAL_CONFIG']['TOKENIZER'] = retrieval_tokenizer
+        
+    # 向量模型
+    embedding_model = os.environ.get('AI_EMBEDDING_MODEL')
+    if embedding_model:
+        config['EMBEDDING_CONFIG']['MODEL_NAME'] = embedding_model
+        
+    # 检索方式
+    retriever_mode = os.environ.get('AI_RETRIEVER_MODE')
+    if retriever_mode:
+        config['TOOLS_CONFIG']['edusys_retriever']['mode'] = retriever_mode
+        
+    # 语义缓存相似度阈值
+    semantic_threshold = os.environ.get('AI_SEMANTIC_CACHE_THRESHOLD')
+    if semantic_threshold:
+        config['SEMANTIC_CACHE_CONFIG']['SIMILARITY_THRESHOLD'] = float(semantic_threshold)
+    
+    # 模拟模型服务延迟和输出速率
+    stub_latency = os.environ.get('AI_STUB_LLM_LATENCY')
+    if stub_latency:
+        config['STUB_LLM_CONFIG']['LATENCY'] = float(stub_latency)
+    stub_tokens_per_second = os.environ.get('AI_STUB_LLM_TOKENS_PER_SECOND')
+    if stub_tokens_per_second:
+        config['STUB_LLM_CONFIG']['TOKENS_PER_SECOND'] = float(stub_tokens_per_second)
+        
     # 日志级别
     log_level = os.environ.get('AI_ASSISTANT_LOG_LEVEL')
     if log_level:
@@ -82,6 +322,21 @@ DEFAULT_MODEL = APP_CONFIG['DEFAULT_MODEL']
 AGENT_CONFIG = APP_CONFIG['AGENT_CONFIG']
 TOOLS_CONFIG = APP_CONFIG['TOOLS_CONFIG']
 KNOWLEDGE_BASE_CONFIG = APP_CONFIG['KNOWLEDGE_BASE_CONFIG']
+RETRIEVAL_CONFIG = APP_CONFIG['RETRIEVAL_CONFIG']
+LLM_HTTP_CONFIG = APP_CONFIG['LLM_HTTP_CONFIG']
+POOL_CONFIG = APP_CONFIG['POOL_CONFIG']
+JOB_QUEUE_CONFIG = APP_CONFIG['JOB_QUEUE_CONFIG']
+ADMISSION_CONFIG = APP_CONFIG['ADMISSION_CONFIG']
+ROUTING_CONFIG = APP_CONFIG['ROUTING_CONFIG']
+BATCH_CONFIG = APP_CONFIG['BATCH_CONFIG']
+ANALYSIS_CONFIG = APP_CONFIG['ANALYSIS_CONFIG']
+RAG_CONFIG = APP_CONFIG['RAG_CONFIG']
+CONVERSATION_CONFIG = APP_CONFIG['CONVERSATION_CONFIG']
+CONTEXT_PACKING_CONFIG = APP_CONFIG['CONTEXT_PACKING_CONFIG']
 CACHE_CONFIG = APP_CONFIG['CACHE_CONFIG']
+EMBEDDING_CONFIG = APP_CONFIG['EMBEDDING_CONFIG']
+SEMANTIC_CACHE_CONFIG = APP_CONFIG['SEMANTIC_CACHE_CONFIG']
+TRACE_CONFIG = APP_CONFIG['TRACE_CONFIG']
+STUB_LLM_CONFIG = APP_CONFIG['STUB_LLM_CONFIG']
 SECURITY_CONFIG = APP_CONFIG['SECURITY_CONFIG']
 LOGGING_CONFIG = APP_CONFIG['LOGGING_CONFIG']
\ No newline at end of file
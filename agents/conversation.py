@@ -0,0 +1,217 @@
+"""
+AI 多轮对话
+同一会话的提问附带历史摘要和最近几轮对话；更早的轮次由后台任务增量合并到会话摘要中并保存，
+对话变长时提示词长度保持不变
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from django.utils import timezone
+from smolagents.models import ChatMessage, MessageRole
+from agents.config import CONVERSATION_CONFIG
+from agents.jobs import JobQueueFull, ai_job_queue
+from agents.models import ConversationSession
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 历史摘要的系统提示词
+SUMMARY_SYSTEM_PROMPT = (
+    "你负责压缩学生与 AI 助手的对话历史。请把已有摘要和新的对话合并为一段简洁的中文摘要，"
+    "保留学生关心的知识点、已经给出的结论和尚未解决的问题，不超过{max_chars}字，只输出摘要本身。"
+)
+
+def _truncate(text: str, max_chars: int) -> str:
+    """
+    截断过长的文本
+    """
+    return text if len(text) <= max_chars else text[:max_chars] + "…"
+
+def get_session(user_id: int,
+                course_id: Optional[int],
+                session_id: Optional[int] = None,
+                title: str = '') -> ConversationSession:
+    """
+    获取用户在课程中的会话，未指定或找不到时创建新会话
+    
+    Args:
+        user_id (int): 用户ID
+        course_id (Optional[int]): 课程ID，通用助手为None
+        session_id (Optional[int]): 会话ID
+        title (str): 新会话的标题
+        
+    Returns:
+        ConversationSession: 会话
+    """
+    if session_id:
+        session = ConversationSession.objects.filter(id=session_id, user_id=user_id, course_id=course_id).first()
+        if session is not None:
+            return session
+        logger.warning(f"会话 {session_id} 不存在或不属于当前用户和课程，创建新会话")
+        
+    return ConversationSession.objects.create(user_id=user_id, course_id=course_id, title=title[:200])
+
+def _pending_turns(session: ConversationSession):
+    """
+    尚未合并到摘要中的已完成对话轮次
+    """
+    return session.interactions.filter(
+        status='completed',
+        id__gt=session.summarized_until
+    ).exclude(response='')
+
+def get_recent_turns(session: ConversationSession, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    获取最近几轮未合并到摘要中的对话
+    
+    Args:
+        session (ConversationSession): 会话
+        limit (Optional[int]): 轮数，为None时使用配置
+        
+    Returns:
+        List[Tuple[str, str]]: (提问, 回答) 列表，按时间顺序排列
+    """
+    limit = limit or CONVERSATION_CONFIG['MAX_TURNS']
+    turns = list(_pending_turns(session).order_by('-id').values_list('query', 'response')[:limit])
+    return list(reversed(turns))
+
+def build_conversation_prompt(session: ConversationSession, prompt: str) -> Tuple[str, bool]:
+    """
+    把历史摘要和最近几轮对话加入提示词
+    
+    Args:
+        session (ConversationSession): 会话
+        prompt (str): 当前问题的提示词
+        
+    Returns:
+        Tuple[str, bool]: (提示词, 是否附带了历史)
+    """
+    turns = get_recent_turns(session)
+    if not turns and not session.summary:
+        return prompt, False
+        
+    lines = ["以下是之前的对话，供理解当前问题参考："]
+    if session.summary:
+        lines.append(f"对话摘要：{session.summary}")
+    for query, response in turns:
+        lines.append(f"学生：{query}")
+        lines.append(f"助手：{_truncate(response, CONVERSATION_CONFIG['TURN_MAX_CHARS'])}")
+    lines.extend(["", "当前问题：", prompt])
+    return "\n".join(lines), True
+
+def prepare_conversation(user_id: int,
+                         course_id: Optional[int],
+                         prompt: str,
+                         context: Dict[str, Any],
+                         session_id: Optional[int] = None,
+                         question: str = '') -> Tuple[ConversationSession, str]:
+    """
+    准备多轮对话提问：获取或创建会话，并在提示词中加入对话历史
+    会话ID写入 context 的 session_id，保存交互记录时据此关联会话；附带历史时在 context 中标记 with_history，
+    此时回答依赖对话历史，不使用按问题匹配的语义缓存和请求合并
+    
+    Args:
+        user_id (int): 用户ID
+        course_id (Optional[int]): 课程ID，通用助手为None
+        prompt (str): 当前问题的提示词
+        context (Dict[str, Any]): 上下文信息
+        session_id (Optional[int]): 会话ID，为None时创建新会话
+        question (str): 用户提问，用作新会话的标题
+        
+    Returns:
+        Tuple[ConversationSession, str]: (会话, 提示词)
+    """
+    session = get_session(user_id, course_id, session_id, title=question)
+    prompt, with_history = build_conversation_prompt(session, prompt)
+    
+    context['session_id'] = session.id
+    if with_history:
+        context['with_history'] = True
+    return session, prompt
+
+def _generate_summary(previous_summary: str, transcript: str) -> str:
+    """
+    调用模型把已有摘要和新的对话合并为新的摘要
+    """
+    from agents.agent.config import AGENT_CONFIGS
+    from agents.agent.factory import agent_factory
+    
+    max_chars = CONVERSATION_CONFIG['SUMMARY_MAX_CHARS']
+    model = agent_factory.create_model(AGENT_CONFIGS['question_answering'].get_model_config())
+    messages = [
+        ChatMessage(role=MessageRole.SYSTEM, content=[{
+            "type": "text",
+            "text": SUMMARY_SYSTEM_PROMPT.format(max_chars=max_chars)
+        }]),
+        ChatMessage(role=MessageRole.USER, content=[{
+            "type": "text",
+            "text": f"已有摘要：{previous_summary or '无'}\n\n新的对话：\n{transcript}"
+        }]),
+    ]
+    return (model.generate(messages).content or "").strip()
+
+def summarize_session(session_id: int) -> bool:
+    """
+    把超出最近几轮的对话增量合并到会话摘要中
+    只处理上次摘要之后的轮次，模型调用失败时退化为保留提问列表的简单摘要
+    
+    Args:
+        session_id (int): 会话ID
+        
+    Returns:
+        bool: 摘要是否有更新
+    """
+    session = ConversationSession.objects.get(id=session_id)
+    pending = list(_pending_turns(session).order_by('id').values_list('id', 'query', 'response'))
+    folded = pending[:-CONVERSATION_CONFIG['MAX_TURNS']]
+    if not folded:
+        return False
+        
+    max_chars = CONVERSATION_CONFIG['SUMMARY_MAX_CHARS']
+    transcript = "\n".join(
+        f"学生：{query}\n助手：{_truncate(response, CONVERSATION_CONFIG['TURN_MAX_CHARS'])}"
+        for _, query, response in folded
+    )
+    try:
+        summary = _generate_summary(session.summary, transcript)
+    except Exception as e:
+        logger.warning(f"会话 {session_id} 生成摘要失败，改用提问列表: {str(e)}")
+        summary = ""
+    if not summary:
+        questions = "；".join(query for _, query, _ in folded)
+        summary = f"{session.summary}\n学生还问过：{questions}".strip()
+        # 超出长度时保留最近的内容
+        summary = summary[-max_chars:]
+        
+    # 只在摘要没有被其他任务更新过时写入
+    updated = ConversationSession.objects.filter(
+        id=session_id,
+        summarized_until=session.summarized_until
+    ).update(
+        summary=summary[:max_chars],
+        summarized_until=folded[-1][0],
+        updated_at=timezone.now()
+    )
+    
+    if updated:
+        logger.info(f"会话 {session_id} 摘要已更新，合并了 {len(folded)} 轮对话")
+    return bool(updated)
+
+def schedule_summary(session_id: Optional[int]):
+    """
+    会话中未摘要的对话超过最近轮数时，提交后台摘要任务
+    队列已满时跳过，下次保存交互记录时会再次尝试
+    
+    Args:
+        session_id (Optional[int]): 会话ID
+    """
+    if not session_id:
+        return
+        
+    session = ConversationSession.objects.filter(id=session_id).first()
+    if session is None or _pending_turns(session).count() <= CONVERSATION_CONFIG['MAX_TURNS']:
+        return
+        
+    try:
+        ai_job_queue.submit(summarize_session, session_id)
+    except JobQueueFull:
+        logger.warning(f"任务队列已满，会话 {session_id} 的摘要稍后再生成")
@@ -0,0 +1,196 @@
+"""
+AI 请求截止时间
+一次请求从进入任务层开始计时，截止时间通过上下文变量传递给模型调用和工具调用：
+模型请求的超时不超过剩余时间，工具调用前检查是否已超时；超时或客户端断开连接时中断代理，
+并用代理目前得到的部分结果作为回答
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+from agents.agent.config import AGENT_CONFIGS, AgentConfig
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 停止原因
+STOP_TIMEOUT = 'timeout'
+STOP_CANCELLED = 'cancelled'
+
+# 代理没有得到任何结果时返回的说明
+STOP_MESSAGES = {
+    STOP_TIMEOUT: "回答超时，未能在限定时间内完成，请稍后重试或简化问题",
+    STOP_CANCELLED: "请求已取消",
+}
+
+class DeadlineExceeded(Exception):
+    """
+    请求超过截止时间或已被取消
+    """
+    def __init__(self, reason: str, partial_answer: str = ''):
+        super().__init__(STOP_MESSAGES.get(reason, reason))
+        self.reason = reason
+        self.partial_answer = partial_answer
+
+class Deadline:
+    """
+    请求截止时间
+    """
+    
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        初始化截止时间
+        
+        Args:
+            timeout (Optional[float]): 时限（秒），为None时不限时，只能被取消
+        """
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        
+    @classmethod
+    def for_agent(cls, agent_type: str) -> 'Deadline':
+        """
+        按代理配置的 timeout 创建截止时间
+        
+        Args:
+            agent_type (str): 代理类型
+            
+        Returns:
+            Deadline: 截止时间
+        """
+        config = AGENT_CONFIGS.get(agent_type) or AgentConfig()
+        return cls(config.get('timeout'))
+        
+    def remaining(self) -> Optional[float]:
+        """
+        剩余时间（秒），不限时时为None
+        """
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+        
+    def stop(self, reason: str):
+        """
+        停止请求并通知正在运行的代理，只有第一次调用生效
+        
+        Args:
+            reason (str): 停止原因
+        """
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks = list(self._callbacks)
+            
+        logger.warning(f"AI 请求停止: {STOP_MESSAGES.get(reason, reason)}")
+        for callback in callbacks:
+            callback()
+            
+    def cancel(self):
+        """
+        取消请求（如客户端断开连接）
+        """
+        self.stop(STOP_CANCELLED)
+        
+    @property
+    def stopped(self) -> bool:
+        """
+        是否已超时或被取消
+        """
+        if self.reason is None and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.stop(STOP_TIMEOUT)
+        return self.reason is not None
+        
+    def check(self):
+        """
+        检查截止时间
+        
+        Raises:
+            DeadlineExceeded: 已超时或被取消
+        """
+        if self.stopped:
+            raise DeadlineExceeded(self.reason)
+            
+    @contextmanager
+    def watch(self, callback: Callable[[], None]) -> Iterator[None]:
+        """
+        在上下文内注册停止时的回调（如中断代理），退出时注销，
+        避免代理归还代理池后被本请求的取消误中断
+        
+        Args:
+            callback (Callable[[], None]): 回调函数
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            stopped = self.reason is not None
+        if stopped:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.remove(callback)
+
+# 当前请求的截止时间
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    'edusys_deadline', default=None
+)
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """
+    在上下文内设置当前请求的截止时间，供模型调用和工具调用读取
+    
+    Args:
+        deadline (Optional[Deadline]): 截止时间
+        
+    Yields:
+        Optional[Deadline]: 截止时间
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def current_deadline() -> Optional[Deadline]:
+    """
+    获取当前请求的截止时间
+    
+    Returns:
+        Optional[Deadline]: 截止时间，不在请求中时为None
+    """
+    return _current_deadline.get()
+
+def check_deadline():
+    """
+    检查当前请求的截止时间
+    
+    Raises:
+        DeadlineExceeded: 已超时或被取消
+    """
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check()
+
+def partial_result(reason: str, partial_answer: str = '') -> str:
+    """
+    构造超时或取消时返回的回答
+    
+    Args:
+        reason (str): 停止原因
+        partial_answer (str): 代理目前得到的部分结果
+        
+    Returns:
+        str: 回答
+    """
+    # 观察结果中 smolagents 添加的前缀对用户没有意义
+    partial_answer = (partial_answer or '').replace('Execution logs:', '').strip()
+    if not partial_answer:
+        return STOP_MESSAGES.get(reason, reason)
+    return f"（{STOP_MESSAGES.get(reason, reason)}，以下为目前得到的部分结果）\n{partial_answer}"
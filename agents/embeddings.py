@@ -0,0 +1,131 @@
+"""
+文本向量化
+使用 sentence-transformers 模型将文本编码为单位向量，模型在首次使用时加载。
+未安装 sentence-transformers 或模型加载失败时，向量化函数返回None，依赖向量的功能自动停用。
+"""
+import importlib.util
+import logging
+import threading
+from functools import lru_cache
+from typing import List, Optional, Sequence
+import numpy as np
+from agents.config import EMBEDDING_CONFIG
+from agents.utils import normalize_query
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+_model = None
+_model_unavailable = False
+_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """
+    获取向量模型，首次调用时加载
+
+    Returns:
+        SentenceTransformer: 向量模型，不可用时为None
+    """
+    global _model, _model_unavailable
+
+    if _model is None and not _model_unavailable:
+        with _model_lock:
+            if _model is None and not _model_unavailable:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    _model = SentenceTransformer(EMBEDDING_CONFIG['MODEL_NAME'], device=EMBEDDING_CONFIG['DEVICE'])
+                    logger.info(f"向量模型加载完成: {EMBEDDING_CONFIG['MODEL_NAME']}")
+                except ImportError:
+                    logger.warning("未安装 sentence-transformers，向量相关功能已停用")
+                    _model_unavailable = True
+                except Exception as e:
+                    logger.error(f"加载向量模型时发生错误: {str(e)}")
+                    _model_unavailable = True
+
+    return _model
+
+def is_embedding_available() -> bool:
+    """
+    判断向量模型是否可能可用，不加载模型
+    
+    Returns:
+        bool: 已安装 sentence-transformers 且模型没有加载失败时为True
+    """
+    if _model is not None:
+        return True
+    return not _model_unavailable and importlib.util.find_spec('sentence_transformers') is not None
+
+def embed_texts(texts: Sequence[str], batch_size: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    批量向量化文本
+
+    Args:
+        texts (Sequence[str]): 文本列表
+        batch_size (Optional[int]): 模型每次前向计算的文本数，为None时使用配置
+
+    Returns:
+        Optional[np.ndarray]: 形状为 (len(texts), dim) 的单位向量矩阵，模型不可用时为None
+    """
+    model = get_embedding_model()
+    if model is None:
+        return None
+
+    vectors = model.encode(
+        list(texts),
+        batch_size=batch_size or EMBEDDING_CONFIG['ENCODE_BATCH_SIZE'],
+        normalize_embeddings=True,
+        convert_to_numpy=True
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+@lru_cache(maxsize=EMBEDDING_CONFIG['CACHE_SIZE'])
+def _embed_normalized_query(text: str) -> Optional[tuple]:
+    """
+    向量化规范化后的提问，结果按文本缓存
+    """
+    vectors = embed_texts([text])
+    if vectors is None:
+        return None
+    return tuple(float(x) for x in vectors[0])
+
+def embed_query(text: str) -> Optional[List[float]]:
+    """
+    向量化用户提问
+    同一进程内相同（规范化后）的提问只计算一次
+
+    Args:
+        text (str): 用户提问
+
+    Returns:
+        Optional[List[float]]: 单位向量，模型不可用时为None
+    """
+    if not text:
+        return None
+
+    try:
+        vector = _embed_normalized_query(normalize_query(text))
+    except Exception as e:
+        logger.error(f"向量化提问时发生错误: {str(e)}")
+        return None
+
+    return list(vector) if vector is not None else None
+
+def cosine_similarities(vector: Sequence[float], matrix: Sequence[Sequence[float]]) -> np.ndarray:
+    """
+    计算向量与矩阵每一行的余弦相似度
+
+    Args:
+        vector (Sequence[float]): 查询向量
+        matrix (Sequence[Sequence[float]]): 候选向量矩阵
+
+    Returns:
+        np.ndarray: 相似度数组
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.size == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+    norms[norms == 0] = 1.0
+    return matrix @ vector / norms
@@ -57,10 +57,10 @@ def example_api_usage():
         content_type='application/json'
     )
     
-    if response.status_code == 200:
+    if response.status_code == 202:
         result = response.json()
         print(f"   提交成功，任务ID: {result['data']['task_id']}")
-        print(f"   响应: {result['data']['response']}")
+        print(f"   任务状态: {result['data']['status_url']}")
     else:
         print(f"   提交失败，状态码: {response.status_code}")
     
@@ -0,0 +1,125 @@
+"""
+AI 后台任务队列
+使用有界线程池在请求线程之外执行 AI 任务，避免 Web 工作进程被长时间的 LLM 调用占用
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from django.db import close_old_connections
+from agents.config import JOB_QUEUE_CONFIG
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    """
+    任务队列已满
+    """
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AIJobQueue:
+    """
+    AI 后台任务队列类
+    排队和执行中的任务总数有上限，超出时拒绝提交而不是无限堆积
+    """
+    
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None,
+                 name: str = 'ai-job'):
+        """
+        初始化任务队列
+        
+        Args:
+            max_workers (Optional[int]): 工作线程数
+            max_pending (Optional[int]): 排队和执行中的任务总数上限
+            name (str): 工作线程名称前缀
+        """
+        self.name = name
+        self.max_workers = max_workers or JOB_QUEUE_CONFIG['MAX_WORKERS']
+        self.max_pending = max_pending or JOB_QUEUE_CONFIG['MAX_PENDING']
+        self.retry_after = JOB_QUEUE_CONFIG['RETRY_AFTER']
+        
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        获取线程池，首次提交任务时创建
+        
+        Returns:
+            ThreadPoolExecutor: 线程池
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+        
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        提交任务
+        
+        Args:
+            fn (Callable): 任务函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+            
+        Returns:
+            Future: 任务结果
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"AI 任务队列已满（{self.max_pending}）", self.retry_after)
+            self._pending += 1
+            executor = self._get_executor()
+            
+        try:
+            return executor.submit(self._run, fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+            
+    def _run(self, fn: Callable, *args, **kwargs):
+        """
+        在工作线程中执行任务，结束后释放名额并关闭数据库连接
+        """
+        try:
+            close_old_connections()
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            close_old_connections()
+            
+    @property
+    def pending(self) -> int:
+        """
+        排队和执行中的任务数
+        """
+        return self._pending
+        
+    def shutdown(self, wait: bool = True):
+        """
+        关闭任务队列
+        
+        Args:
+            wait (bool): 是否等待已提交的任务完成
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+# 全局任务队列实例（每个工作进程一个）：后台任务、会话摘要和批量分析
+ai_job_queue = AIJobQueue()
+
+# 异步视图的 AI 请求使用单独的线程池，不与后台任务争抢工作线程
+ai_async_queue = AIJobQueue(
+    max_workers=JOB_QUEUE_CONFIG['ASYNC_MAX_WORKERS'],
+    max_pending=JOB_QUEUE_CONFIG['ASYNC_MAX_PENDING'],
+    name='ai-async'
+)
@@ -2,7 +2,8 @@
 知识库模块
 """
 from agents.knowledge_base.builder import KnowledgeBaseBuilder, knowledge_base_builder
-from agents.knowledge_base.updater import KnowledgeBaseUpdater, knowledge_base_updater, update_knowledge_base
+from agents.knowledge_base.embedder import KnowledgeBaseEmbedder, EmbeddingStats, knowledge_base_embedder
+from agents.knowledge_base.updater import KnowledgeBaseUpdater, knowledge_base_updater, update_knowledge_base, load_knowledge_base, load_indexed_knowledge_base
 from agents.knowledge_base.documents import (
     create_document_from_course,
     create_document_from_announcement,
@@ -14,9 +15,14 @@ from agents.knowledge_base.documents import (
 __all__ = [
     'KnowledgeBaseBuilder',
     'knowledge_base_builder',
+    'KnowledgeBaseEmbedder',
+    'EmbeddingStats',
+    'knowledge_base_embedder',
     'KnowledgeBaseUpdater',
     'knowledge_base_updater',
     'update_knowledge_base',
+    'load_knowledge_base',
+    'load_indexed_knowledge_base',
     'create_document_from_course',
     'create_document_from_announcement',
     'create_document_from_assignment',
@@ -33,7 +33,9 @@ class KnowledgeBaseBuilder:
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]
+            separators=["\n\n", "\n", ".", "!", "?", " ", ""],
+            # 记录分块在原文中的位置，检索结果打包时据此合并相邻分块
+            add_start_index=True
         )
     
     def build_from_courses(self, course_ids: List[int] = None) -> List[Document]:
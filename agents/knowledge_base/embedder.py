@@ -0,0 +1,245 @@
+"""
+知识库文档向量生成
+按批读取知识库分块，用向量模型批量编码后写回 KnowledgeDocument.embedding。
+每个分块记录生成向量时的内容哈希和模型名称，内容和模型都没有变化的分块直接跳过；
+内容相同的分块（包括其他记录中已编码过的内容）只编码一次。
+生成向量后发送 knowledge_base_embedded 信号，各工作进程的检索工具据此重新加载变化课程的向量
+"""
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Set
+from django.db import close_old_connections
+from agents.config import EMBEDDING_CONFIG
+from agents.embeddings import embed_texts, is_embedding_available
+from agents.models import KnowledgeDocument
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def content_hash(text: str) -> str:
+    """
+    计算分块内容的哈希
+    
+    Args:
+        text (str): 分块内容
+        
+    Returns:
+        str: SHA-256 十六进制摘要
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+@dataclass
+class EmbeddingStats:
+    """
+    一次向量生成的统计
+    """
+    total: int = 0  # 检查的分块数
+    embedded: int = 0  # 由模型编码的分块数
+    reused: int = 0  # 复用相同内容已有向量的分块数
+    skipped: int = 0  # 内容和模型都没有变化而跳过的分块数
+    seconds: float = 0.0  # 总耗时（秒）
+    available: bool = True  # 向量模型是否可用
+    
+    @property
+    def chunks_per_second(self) -> float:
+        """
+        编码吞吐量（分块/秒）
+        """
+        return self.embedded / self.seconds if self.seconds else 0.0
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), chunks_per_second=self.chunks_per_second)
+
+class KnowledgeBaseEmbedder:
+    """
+    知识库文档向量生成器类
+    """
+    
+    def __init__(self, batch_size: Optional[int] = None):
+        """
+        初始化向量生成器
+        
+        Args:
+            batch_size (Optional[int]): 每批读取、编码和写回的分块数
+        """
+        self.batch_size = batch_size or EMBEDDING_CONFIG['DOCUMENT_BATCH_SIZE']
+        
+        # 后台生成：等待处理的课程（None 表示全部课程）
+        self._lock = threading.Lock()
+        self._pending: Set[Optional[int]] = set()
+        self._thread = None
+        
+    def embed_documents(self,
+                        course_id: Optional[int] = None,
+                        force: bool = False,
+                        batch_size: Optional[int] = None,
+                        encode_batch_size: Optional[int] = None) -> EmbeddingStats:
+        """
+        为内容变化（或尚未生成向量）的知识库分块生成向量，有分块写入新向量时发送 knowledge_base_embedded 信号
+        
+        Args:
+            course_id (Optional[int]): 指定课程ID，为None则处理全部分块
+            force (bool): 是否忽略内容哈希，重新编码全部分块
+            batch_size (Optional[int]): 每批读取、编码和写回的分块数
+            encode_batch_size (Optional[int]): 模型每次前向计算的文本数
+            
+        Returns:
+            EmbeddingStats: 统计信息
+        """
+        batch_size = batch_size or self.batch_size
+        model_name = EMBEDDING_CONFIG['MODEL_NAME']
+        stats = EmbeddingStats()
+        start_time = time.perf_counter()
+        
+        queryset = KnowledgeDocument.objects.order_by('id')
+        if course_id:
+            queryset = queryset.filter(metadata__course_id=course_id)
+            
+        # 按主键分批读取，写回向量不影响后续批次
+        last_id = 0
+        while True:
+            rows = list(
+                queryset.filter(id__gt=last_id)
+                .only('id', 'content', 'embedding_hash', 'embedding_model')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            stats.total += len(rows)
+            
+            pending = []
+            for row in rows:
+                digest = content_hash(row.content)
+                if not force and row.embedding_hash == digest and row.embedding_model == model_name:
+                    stats.skipped += 1
+                    continue
+                row.embedding_hash = digest
+                row.embedding_model = model_name
+                pending.append(row)
+            if not pending:
+                continue
+                
+            vectors = self._encode(pending, model_name, force, encode_batch_size, stats)
+            if vectors is None:
+                stats.available = False
+                logger.warning("向量模型不可用，停止生成知识库文档向量")
+                break
+            for row in pending:
+                row.embedding = vectors[row.embedding_hash]
+            KnowledgeDocument.objects.bulk_update(pending, ['embedding', 'embedding_hash', 'embedding_model'])
+            
+        stats.seconds = time.perf_counter() - start_time
+        if stats.embedded or stats.reused:
+            # 信号处理器导入本模块所在的包，在此处导入避免循环导入
+            from agents.signals import knowledge_base_embedded
+            knowledge_base_embedded.send(sender=self.__class__, course_id=course_id)
+        logger.info(
+            f"知识库文档向量生成完成: 检查 {stats.total} 个分块，编码 {stats.embedded} 个，"
+            f"复用 {stats.reused} 个，跳过 {stats.skipped} 个，{stats.chunks_per_second:.1f} 分块/秒"
+        )
+        return stats
+        
+    def _encode(self,
+                rows: List[KnowledgeDocument],
+                model_name: str,
+                force: bool,
+                encode_batch_size: Optional[int],
+                stats: EmbeddingStats) -> Optional[Dict[str, List[float]]]:
+        """
+        编码一批分块，相同内容只编码一次，并复用其他记录中相同内容的已有向量
+        
+        Returns:
+            Optional[Dict[str, List[float]]]: 内容哈希 -> 向量，模型不可用时为None
+        """
+        texts: Dict[str, str] = {}
+        for row in rows:
+            texts.setdefault(row.embedding_hash, row.content)
+            
+        vectors: Dict[str, List[float]] = {}
+        if not force:
+            vectors.update(
+                KnowledgeDocument.objects.filter(
+                    embedding_hash__in=list(texts),
+                    embedding_model=model_name,
+                    embedding__isnull=False
+                ).values_list('embedding_hash', 'embedding')
+            )
+            
+        missing = [digest for digest in texts if digest not in vectors]
+        if missing:
+            encoded = embed_texts([texts[digest] for digest in missing], encode_batch_size)
+            if encoded is None:
+                return None
+            vectors.update(zip(missing, encoded.tolist()))
+            
+        encoded_hashes = set(missing)
+        for row in rows:
+            if row.embedding_hash in encoded_hashes:
+                # 同一批中内容相同的分块只计一次编码
+                encoded_hashes.discard(row.embedding_hash)
+                stats.embedded += 1
+            else:
+                stats.reused += 1
+        return vectors
+        
+    def schedule(self, course_id: Optional[int] = None):
+        """
+        在后台线程中为指定课程生成向量，同一课程的多次请求合并处理
+        向量模型不可用时不启动后台线程
+        
+        Args:
+            course_id (Optional[int]): 课程ID，为None则处理全部分块
+        """
+        if not is_embedding_available():
+            return
+            
+        with self._lock:
+            self._pending.add(course_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='kb-embedder', daemon=True)
+                self._thread.start()
+                
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待后台向量生成完成，供管理命令在进程退出前调用（后台线程是守护线程，进程退出时会被直接终止）
+        
+        Args:
+            timeout (Optional[float]): 最长等待时间（秒），为None时一直等待
+            
+        Returns:
+            bool: 后台向量生成是否已完成
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+        
+    def _run(self):
+        """
+        后台处理等待中的课程
+        """
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                # 有全部课程的请求时只处理一次全部分块
+                course_ids = [None] if None in self._pending else sorted(self._pending)
+                self._pending.clear()
+                
+            for course_id in course_ids:
+                try:
+                    close_old_connections()
+                    self.embed_documents(course_id)
+                except Exception as e:
+                    logger.error(f"生成知识库文档向量时发生错误: {str(e)}")
+                finally:
+                    close_old_connections()
+
+# 全局知识库向量生成器实例
+knowledge_base_embedder = KnowledgeBaseEmbedder()
@@ -2,11 +2,15 @@
 知识库更新器
 """
 import logging
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from django.utils import timezone
 from langchain.docstore.document import Document
 from agents.models import KnowledgeDocument
+from agents.config import EMBEDDING_CONFIG, TOOLS_CONFIG
 from agents.knowledge_base.builder import knowledge_base_builder
+from agents.knowledge_base.embedder import content_hash
+from agents.retrieval import get_tokenizer, get_tokenizer_name
+from agents.signals import knowledge_base_updated
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -48,6 +52,9 @@ class KnowledgeBaseUpdater:
             # 保存新文档到数据库
             saved_docs = self._save_documents(new_docs)
             
+            # 通知缓存等依赖知识库的组件
+            knowledge_base_updated.send(sender=self.__class__, course_id=course_id)
+            
             logger.info(f"知识库更新完成，共处理 {len(saved_docs)} 个文档")
             return saved_docs
             
@@ -66,6 +73,8 @@ class KnowledgeBaseUpdater:
             List[Document]: 保存的文档列表
         """
         saved_docs = []
+        tokenizer = get_tokenizer_name()
+        tokenize = get_tokenizer(tokenizer)
         
         for i, doc in enumerate(docs):
             try:
@@ -82,6 +91,8 @@ class KnowledgeBaseUpdater:
                     defaults={
                         'content': doc.page_content,
                         'metadata': metadata,
+                        'tokens': tokenize(doc.page_content),
+                        'tokenizer': tokenizer,
                     }
                 )
                 
@@ -89,8 +100,15 @@ class KnowledgeBaseUpdater:
                 if not created and knowledge_doc.content != doc.page_content:
                     knowledge_doc.content = doc.page_content
                     knowledge_doc.metadata = metadata
+                    knowledge_doc.tokens = tokenize(doc.page_content)
+                    knowledge_doc.tokenizer = tokenizer
                     knowledge_doc.updated_at = timezone.now()
                     knowledge_doc.save()
+                elif not created and (knowledge_doc.tokens is None or knowledge_doc.tokenizer != tokenizer):
+                    # 内容未变但分词方式已改变（或尚未分词），只更新分词结果
+                    knowledge_doc.tokens = tokenize(doc.page_content)
+                    knowledge_doc.tokenizer = tokenizer
+                    knowledge_doc.save(update_fields=['tokens', 'tokenizer'])
                 
                 saved_docs.append(doc)
                 logger.debug(f"文档已保存: {source_type}-{source_id}-{i}")
@@ -101,6 +119,88 @@ class KnowledgeBaseUpdater:
         
         return saved_docs
     
+    def load_documents(self, course_id: Optional[int] = None) -> List[Document]:
+        """
+        以只读方式加载已构建的知识库
+        如果数据库中还没有知识库文档，则在内存中构建但不写入数据库
+        
+        Args:
+            course_id (Optional[int]): 指定课程ID，为None则加载全部文档
+            
+        Returns:
+            List[Document]: 文档列表
+        """
+        queryset = KnowledgeDocument.objects.order_by('source_type', 'source_id', 'chunk_index')
+        if course_id:
+            queryset = queryset.filter(metadata__course_id=course_id)
+            
+        docs = [
+            Document(page_content=content, metadata=metadata or {})
+            for content, metadata in queryset.values_list('content', 'metadata').iterator()
+        ]
+        return docs or self._build_in_memory(course_id)
+        
+    def load_indexed_documents(self,
+                               course_id: Optional[int] = None,
+                               with_embeddings: Optional[bool] = None) -> Tuple[List[Document], List[Optional[List[str]]], List[Optional[List[float]]]]:
+        """
+        以只读方式加载已构建的知识库及保存的分词结果和向量，用于构建检索索引
+        分词方式与当前配置不同的文档不返回分词结果，由检索索引重新分词；
+        内容或向量模型在生成向量后发生变化的文档不返回向量
+        
+        Args:
+            course_id (Optional[int]): 指定课程ID，为None则加载全部文档
+            with_embeddings (Optional[bool]): 是否加载向量，为None时仅在检索工具配置为向量检索时加载
+            
+        Returns:
+            Tuple[List[Document], List[Optional[List[str]]], List[Optional[List[float]]]]: 文档列表、每个文档的分词结果和向量
+        """
+        if with_embeddings is None:
+            with_embeddings = TOOLS_CONFIG['edusys_retriever']['mode'] == 'dense'
+            
+        queryset = KnowledgeDocument.objects.order_by('source_type', 'source_id', 'chunk_index')
+        if course_id:
+            queryset = queryset.filter(metadata__course_id=course_id)
+            
+        fields = ['content', 'metadata', 'tokens', 'tokenizer']
+        if with_embeddings:
+            fields += ['embedding', 'embedding_hash', 'embedding_model']
+            
+        tokenizer = get_tokenizer_name()
+        model_name = EMBEDDING_CONFIG['MODEL_NAME']
+        docs, tokens, embeddings = [], [], []
+        for row in queryset.values_list(*fields).iterator():
+            content, metadata, doc_tokens, doc_tokenizer = row[:4]
+            docs.append(Document(page_content=content, metadata=metadata or {}))
+            tokens.append(doc_tokens if doc_tokenizer == tokenizer else None)
+            
+            embedding = None
+            if with_embeddings:
+                doc_embedding, embedding_hash, embedding_model = row[4:]
+                if doc_embedding and embedding_model == model_name and embedding_hash == content_hash(content):
+                    embedding = doc_embedding
+            embeddings.append(embedding)
+            
+        if not docs:
+            docs = self._build_in_memory(course_id)
+            tokens = embeddings = [None] * len(docs)
+        return docs, tokens, embeddings
+        
+    def _build_in_memory(self, course_id: Optional[int] = None) -> List[Document]:
+        """
+        数据库中还没有知识库文档时，在内存中构建知识库但不写入数据库
+        
+        Args:
+            course_id (Optional[int]): 指定课程ID，为None则构建全部文档
+            
+        Returns:
+            List[Document]: 文档列表
+        """
+        logger.warning("数据库中没有知识库文档，将在内存中构建知识库（不写入数据库），请运行 update_knowledge_base 命令")
+        if course_id:
+            return self.builder.text_splitter.split_documents(self.builder.build_from_courses([course_id]))
+        return self.builder.build_all()
+        
     def update_course_documents(self, course_id: int) -> List[Document]:
         """
         更新指定课程的文档
@@ -123,6 +223,8 @@ class KnowledgeBaseUpdater:
         new_docs = self.builder.build_from_courses([course_id])
         saved_docs = self._save_documents(new_docs)
         
+        knowledge_base_updated.send(sender=self.__class__, course_id=course_id)
+        
         logger.info(f"课程 {course_id} 的文档更新完成，共处理 {len(saved_docs)} 个文档")
         return saved_docs
     
@@ -148,6 +250,11 @@ class KnowledgeBaseUpdater:
         new_docs = self.builder.build_from_assignments([assignment_id])
         saved_docs = self._save_documents(new_docs)
         
+        # 作业答案属于所在课程，使这些课程的缓存失效
+        course_ids = {doc.metadata.get('course_id') for doc in new_docs if doc.metadata.get('course_id')}
+        for course_id in course_ids:
+            knowledge_base_updated.send(sender=self.__class__, course_id=course_id)
+            
         logger.info(f"作业 {assignment_id} 的文档更新完成，共处理 {len(saved_docs)} 个文档")
         return saved_docs
 
@@ -166,4 +273,30 @@ def update_knowledge_base(force: bool = False, course_id: Optional[int] = None)
     Returns:
         List[Document]: 更新后的文档列表
     """
-    return knowledge_base_updater.update_knowledge_base(force, course_id)
\ No newline at end of file
+    return knowledge_base_updater.update_knowledge_base(force, course_id)
+
+def load_knowledge_base(course_id: Optional[int] = None) -> List[Document]:
+    """
+    只读加载知识库的便捷函数
+    
+    Args:
+        course_id (Optional[int]): 指定课程ID进行加载
+        
+    Returns:
+        List[Document]: 文档列表
+    """
+    return knowledge_base_updater.load_documents(course_id)
+
+def load_indexed_knowledge_base(course_id: Optional[int] = None,
+                                with_embeddings: Optional[bool] = None) -> Tuple[List[Document], List[Optional[List[str]]], List[Optional[List[float]]]]:
+    """
+    只读加载知识库及保存的分词结果和向量的便捷函数
+    
+    Args:
+        course_id (Optional[int]): 指定课程ID进行加载
+        with_embeddings (Optional[bool]): 是否加载向量，为None时仅在检索工具配置为向量检索时加载
+        
+    Returns:
+        Tuple[List[Document], List[Optional[List[str]]], List[Optional[List[float]]]]: 文档列表、每个文档的分词结果和向量
+    """
+    return knowledge_base_updater.load_indexed_documents(course_id, with_embeddings)
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+课程批量分析管理命令
+"""
+from django.core.management.base import BaseCommand, CommandError
+from agents.analysis import create_analysis_run, execute_analysis_run
+from agents.models import ANALYSIS_TYPE_CHOICES, CourseAnalysisRun
+
+class Command(BaseCommand):
+    help = '并发分析全部或指定课程，结果按课程保存，中断后可继续'
+    
+    def add_arguments(self, parser):
+        """
+        添加命令行参数
+        """
+        parser.add_argument(
+            '--course-ids',
+            type=int,
+            nargs='+',
+            help='指定课程ID，默认分析全部课程',
+        )
+        
+        parser.add_argument(
+            '--analysis-type',
+            choices=[choice for choice, _ in ANALYSIS_TYPE_CHOICES],
+            default='comprehensive',
+            help='分析类型',
+        )
+        
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='同时分析的课程数',
+        )
+        
+        parser.add_argument(
+            '--resume',
+            type=int,
+            metavar='RUN_ID',
+            help='继续执行指定的分析任务，只处理未完成的课程',
+        )
+        
+    def handle(self, *args, **options):
+        """
+        处理命令
+        """
+        if options['resume']:
+            try:
+                run = CourseAnalysisRun.objects.get(id=options['resume'])
+            except CourseAnalysisRun.DoesNotExist:
+                raise CommandError(f"分析任务不存在: {options['resume']}")
+            self.stdout.write(f'继续执行课程批量分析任务 {run.id}...')
+        else:
+            run = create_analysis_run(
+                analysis_type=options['analysis_type'],
+                course_ids=options['course_ids'],
+                concurrency=options['concurrency']
+            )
+            self.stdout.write(f'已创建课程批量分析任务 {run.id}，共 {run.results.count()} 门课程')
+            
+        run = execute_analysis_run(run.id, options['concurrency'])
+        
+        completed = run.results.filter(status='completed').count()
+        failed = run.results.filter(status='failed').count()
+        
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'课程批量分析任务 {run.id} 完成 {completed} 门，失败 {failed} 门，'
+                    f'可使用 --resume {run.id} 重新分析失败的课程'
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'课程批量分析任务 {run.id} 完成，共分析 {completed} 门课程!')
+            )
@@ -0,0 +1,170 @@
+"""
+检索评分基准测试管理命令
+"""
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from langchain.docstore.document import Document
+from rank_bm25 import BM25Okapi
+from agents.retrieval import InvertedIndex, SparseBM25Matrix
+
+class Command(BaseCommand):
+    help = '用合成语料比较 rank_bm25、倒排表和稀疏矩阵三种 BM25 评分方式的构建时间和查询延迟'
+    
+    def add_arguments(self, parser):
+        """
+        添加命令行参数
+        """
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000, 1000000],
+            help='语料的文档分块数',
+        )
+        
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=50,
+            help='每种规模执行的查询数',
+        )
+        
+        parser.add_argument(
+            '--query-terms',
+            type=int,
+            default=3,
+            help='每个查询的词数',
+        )
+        
+        parser.add_argument(
+            '--doc-length',
+            type=int,
+            default=40,
+            help='每个分块的平均词数',
+        )
+        
+        parser.add_argument(
+            '--vocab-size',
+            type=int,
+            default=50000,
+            help='词表大小',
+        )
+        
+        parser.add_argument(
+            '--max-python-docs',
+            type=int,
+            default=100000,
+            help='rank_bm25 和倒排表评分只在分块数不超过该值时完整测试（在 Python 中构建，语料较大时很慢）；'
+                 '更大的语料在该数量的样本上测试 rank_bm25，耗时按分块数线性外推',
+        )
+        
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='随机数种子',
+        )
+        
+    def make_corpus(self, rng, size, options):
+        """
+        按 Zipf 分布生成合成语料，返回每个词出现的（词编号, 文档编号）数组和词表
+        """
+        vocab_size = options['vocab_size']
+        lengths = np.maximum(1, rng.poisson(options['doc_length'], size))
+        term_ids = (rng.zipf(1.2, int(lengths.sum())) - 1) % vocab_size
+        doc_ids = np.repeat(np.arange(size), lengths)
+        vocabulary = {f't{i}': i for i in range(vocab_size)}
+        return term_ids, doc_ids, lengths, vocabulary
+        
+    def token_lists(self, term_ids, lengths, terms, count):
+        """
+        把语料的前 count 个分块转换为词列表
+        """
+        offsets = np.concatenate([[0], np.cumsum(lengths[:count])])
+        return [[terms[term_id] for term_id in term_ids[offsets[i]:offsets[i + 1]]] for i in range(count)]
+        
+    def time_rank_bm25(self, token_lists, queries):
+        """
+        测试 rank_bm25 的构建时间和每个查询的耗时（毫秒）
+        """
+        start_time = time.perf_counter()
+        bm25 = BM25Okapi(token_lists)
+        build_seconds = time.perf_counter() - start_time
+        latencies = self.time_queries(lambda query: np.argsort(bm25.get_scores(query))[::-1][:10], queries)
+        return build_seconds, latencies
+        
+    def time_queries(self, search, queries):
+        """
+        依次执行查询，返回每个查询的耗时（毫秒）
+        """
+        latencies = []
+        for query in queries:
+            start_time = time.perf_counter()
+            search(query)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        return np.array(latencies)
+        
+    def report(self, size, engine, build_seconds, latencies, baseline=None):
+        """
+        输出一行测试结果
+        """
+        mean = latencies.mean()
+        speedup = f'{baseline / mean:8.1f}x' if baseline else ' ' * 9
+        self.stdout.write(
+            f'{size:>9} {engine:<10} {build_seconds:>9.2f}s {mean:>10.2f}ms '
+            f'{np.percentile(latencies, 95):>10.2f}ms {speedup}'
+        )
+        return mean
+        
+    def handle(self, *args, **options):
+        """
+        处理命令
+        """
+        rng = np.random.default_rng(options['seed'])
+        self.stdout.write(f"{'分块数':>6} {'评分方式':<6} {'构建耗时':>7} {'平均查询':>8} {'P95 查询':>9} {'加速比':>6}")
+        
+        for size in options['sizes']:
+            term_ids, doc_ids, lengths, vocabulary = self.make_corpus(rng, size, options)
+            terms = list(vocabulary)
+            
+            # 查询词按语料中的词频抽样，常见词会匹配大量文档
+            queries = [
+                [terms[term_id] for term_id in rng.choice(term_ids, options['query_terms'])]
+                for _ in range(options['queries'])
+            ]
+            
+            if size <= options['max_python_docs']:
+                token_lists = self.token_lists(term_ids, lengths, terms, size)
+                build_seconds, latencies = self.time_rank_bm25(token_lists, queries)
+                baseline = self.report(size, 'rank_bm25', build_seconds, latencies)
+                
+                start_time = time.perf_counter()
+                index = InvertedIndex.from_documents(
+                    (Document(page_content=' '.join(tokens)) for tokens in token_lists),
+                    scorer='postings'
+                )
+                build_seconds = time.perf_counter() - start_time
+                latencies = self.time_queries(lambda query: index.search(' '.join(query)), queries)
+                self.report(size, 'postings', build_seconds, latencies, baseline)
+                del index, token_lists
+            else:
+                # rank_bm25 的构建和查询都逐文档处理，耗时与分块数成正比：在前 max_python_docs 个分块
+                # （分块独立同分布生成）上测试，再按分块数外推
+                sample = options['max_python_docs']
+                build_seconds, latencies = self.time_rank_bm25(self.token_lists(term_ids, lengths, terms, sample), queries)
+                scale = size / sample
+                baseline = self.report(size, 'rank_bm25*', build_seconds * scale, latencies * scale)
+                
+            start_time = time.perf_counter()
+            matrix = SparseBM25Matrix.from_term_ids(term_ids, doc_ids, size, vocabulary)
+            build_seconds = time.perf_counter() - start_time
+            latencies = self.time_queries(lambda query: matrix.top_k(query, 10), queries)
+            self.report(size, 'sparse', build_seconds, latencies, baseline)
+            
+        if any(size > options['max_python_docs'] for size in options['sizes']):
+            self.stdout.write(
+                f"* 在 {options['max_python_docs']} 个分块的样本上测试，按分块数线性外推的估计值"
+                "（语料越大缓存命中率越低，实际耗时通常高于估计值，对应的加速比偏保守）"
+            )
+        self.stdout.write(self.style.SUCCESS('基准测试完成（加速比相对于 rank_bm25）'))
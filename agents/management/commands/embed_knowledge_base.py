@@ -0,0 +1,60 @@
+"""
+生成知识库文档向量管理命令
+"""
+from django.core.management.base import BaseCommand
+from agents.knowledge_base import knowledge_base_embedder
+
+class Command(BaseCommand):
+    help = '为内容变化（或尚未生成向量）的知识库文档分块批量生成向量，并报告编码吞吐量'
+    
+    def add_arguments(self, parser):
+        """
+        添加命令行参数
+        """
+        parser.add_argument(
+            '--course-id',
+            type=int,
+            help='指定课程ID进行处理',
+        )
+        
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='忽略内容哈希，重新编码所有分块',
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='每批读取、编码和写回的分块数',
+        )
+        
+        parser.add_argument(
+            '--encode-batch-size',
+            type=int,
+            help='模型每次前向计算的文本数',
+        )
+        
+    def handle(self, *args, **options):
+        """
+        处理命令
+        """
+        self.stdout.write('开始生成知识库文档向量...')
+        
+        stats = knowledge_base_embedder.embed_documents(
+            course_id=options['course_id'],
+            force=options['force'],
+            batch_size=options['batch_size'],
+            encode_batch_size=options['encode_batch_size']
+        )
+        
+        self.stdout.write(
+            f'检查 {stats.total} 个分块: 编码 {stats.embedded} 个，复用相同内容的向量 {stats.reused} 个，'
+            f'内容未变化跳过 {stats.skipped} 个'
+        )
+        self.stdout.write(f'耗时 {stats.seconds:.2f} 秒，吞吐量 {stats.chunks_per_second:.1f} 分块/秒')
+        
+        if not stats.available:
+            self.stdout.write(self.style.ERROR('向量模型不可用，请安装 sentence-transformers 并检查 EMBEDDING_CONFIG'))
+        else:
+            self.stdout.write(self.style.SUCCESS('知识库文档向量生成完成!'))
@@ -59,6 +59,11 @@ class Command(BaseCommand):
                     'model': 'Qwen/Qwen2.5-Coder-32B-Instruct',
                     'temperature': 0.7,
                     'max_tokens': 1000,
+                    # 简单的查询类问题使用小模型，需要推理的问题使用大模型
+                    'routes': {
+                        'simple': {'model_id': 'Qwen/Qwen2.5-7B-Instruct'},
+                        'complex': {'model_id': 'Qwen/Qwen2.5-Coder-32B-Instruct'},
+                    },
                 },
                 'is_active': True,
             }
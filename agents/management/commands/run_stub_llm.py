@@ -0,0 +1,64 @@
+"""
+本地模拟模型服务管理命令
+"""
+from django.core.management.base import BaseCommand
+from agents.agent.stub_server import StubLLMServer
+from agents.config import STUB_LLM_CONFIG
+
+class Command(BaseCommand):
+    help = '启动 OpenAI 兼容的本地模拟模型服务，用于离线基准测试和压测'
+    
+    def add_arguments(self, parser):
+        """
+        添加命令行参数
+        """
+        parser.add_argument(
+            '--host',
+            default=STUB_LLM_CONFIG['HOST'],
+            help='监听地址',
+        )
+        
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=STUB_LLM_CONFIG['PORT'],
+            help='监听端口',
+        )
+        
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=STUB_LLM_CONFIG['LATENCY'],
+            help='返回第一个令牌前的延迟（秒）',
+        )
+        
+        parser.add_argument(
+            '--tokens-per-second',
+            type=float,
+            default=STUB_LLM_CONFIG['TOKENS_PER_SECOND'],
+            help='输出速率，0 表示不限速',
+        )
+        
+    def handle(self, *args, **options):
+        """
+        处理命令
+        """
+        server = StubLLMServer(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            tokens_per_second=options['tokens_per_second']
+        )
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'模拟模型服务已启动，请设置 BASE_URL={server.base_url}')
+        )
+        self.stdout.write('按 Ctrl+C 停止')
+        
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'模拟模型服务已停止，共处理 {server.request_count} 个请求')
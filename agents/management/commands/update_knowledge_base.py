@@ -2,7 +2,8 @@
 更新知识库管理命令
 """
 from django.core.management.base import BaseCommand
-from agents.knowledge_base import update_knowledge_base
+from agents.config import EMBEDDING_CONFIG
+from agents.knowledge_base import knowledge_base_embedder, update_knowledge_base
 
 class Command(BaseCommand):
     help = '更新 AI 助手知识库'
@@ -40,6 +41,12 @@ class Command(BaseCommand):
                 self.style.SUCCESS(f'知识库更新完成，共处理 {len(docs)} 个文档!')
             )
             
+            # 知识库更新后在后台线程中生成向量，命令结束前等待其完成，避免进程退出时中断
+            if EMBEDDING_CONFIG['EMBED_ON_UPDATE'] and not knowledge_base_embedder.wait(0):
+                self.stdout.write('等待知识库文档向量生成完成...')
+                knowledge_base_embedder.wait()
+                self.stdout.write(self.style.SUCCESS('知识库文档向量生成完成!'))
+                
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'知识库更新失败: {str(e)}')
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0003_aiinteraction_course_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, help_text='处理完成时间', null=True),
+        ),
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='error_message',
+            field=models.TextField(blank=True, help_text='处理失败时的错误信息'),
+        ),
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='started_at',
+            field=models.DateTimeField(blank=True, help_text='开始处理时间', null=True),
+        ),
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='status',
+            field=models.CharField(choices=[('pending', '排队中'), ('running', '处理中'), ('completed', '已完成'), ('failed', '失败')], default='completed', help_text='处理状态', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0004_aiinteraction_job_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='cache_hit',
+            field=models.BooleanField(default=False, help_text='回答是否来自缓存'),
+        ),
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='query_embedding',
+            field=models.JSONField(blank=True, help_text='提问的向量表示', null=True),
+        ),
+    ]
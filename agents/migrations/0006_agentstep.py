@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 02:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0005_aiinteraction_semantic_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agent_type', models.CharField(help_text='代理类型', max_length=50)),
+                ('step_number', models.IntegerField(help_text='步骤序号')),
+                ('duration', models.FloatField(blank=True, help_text='步骤总耗时 (秒)', null=True)),
+                ('llm_duration', models.FloatField(blank=True, help_text='模型调用耗时 (秒)', null=True)),
+                ('execution_time', models.FloatField(blank=True, help_text='代码和工具执行耗时 (秒)', null=True)),
+                ('input_tokens', models.IntegerField(blank=True, help_text='输入令牌数', null=True)),
+                ('output_tokens', models.IntegerField(blank=True, help_text='输出令牌数', null=True)),
+                ('tool_calls', models.JSONField(blank=True, default=list, help_text='工具调用')),
+                ('is_final_answer', models.BooleanField(default=False, help_text='是否给出最终回答')),
+                ('error_message', models.TextField(blank=True, help_text='错误信息')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('interaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_steps', to='agents.aiinteraction')),
+            ],
+            options={
+                'verbose_name': '代理步骤记录',
+                'verbose_name_plural': '代理步骤记录',
+                'ordering': ['interaction', 'step_number'],
+                'indexes': [models.Index(fields=['agent_type', 'created_at'], name='agents_agen_agent_t_022349_idx')],
+            },
+        ),
+    ]
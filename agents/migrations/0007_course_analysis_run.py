@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 03:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0006_agentstep'),
+        ('courses', '0002_coursefile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseAnalysisRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('analysis_type', models.CharField(choices=[('comprehensive', '全面分析'), ('questions', '提问分析'), ('improvements', '改进建议')], default='comprehensive', help_text='分析类型', max_length=20)),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '处理中'), ('completed', '已完成'), ('failed', '部分失败')], default='pending', help_text='处理状态', max_length=20)),
+                ('concurrency', models.PositiveIntegerField(default=4, help_text='同时分析的课程数')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, help_text='开始处理时间', null=True)),
+                ('completed_at', models.DateTimeField(blank=True, help_text='处理完成时间', null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='course_analysis_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '课程批量分析任务',
+                'verbose_name_plural': '课程批量分析任务',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseAnalysisResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('analysis_type', models.CharField(choices=[('comprehensive', '全面分析'), ('questions', '提问分析'), ('improvements', '改进建议')], help_text='分析类型', max_length=20)),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '处理中'), ('completed', '已完成'), ('failed', '失败')], default='pending', help_text='处理状态', max_length=20)),
+                ('report', models.TextField(blank=True, help_text='分析报告')),
+                ('error_message', models.TextField(blank=True, help_text='处理失败时的错误信息')),
+                ('duration', models.FloatField(blank=True, help_text='分析耗时 (秒)', null=True)),
+                ('started_at', models.DateTimeField(blank=True, help_text='开始处理时间', null=True)),
+                ('completed_at', models.DateTimeField(blank=True, help_text='处理完成时间', null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_results', to='courses.course')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='agents.courseanalysisrun')),
+            ],
+            options={
+                'verbose_name': '课程分析结果',
+                'verbose_name_plural': '课程分析结果',
+                'ordering': ['run', 'course'],
+                'constraints': [models.UniqueConstraint(fields=('run', 'course'), name='unique_course_analysis_result')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 03:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0007_course_analysis_run'),
+        ('courses', '0002_coursefile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, help_text='会话标题（第一个问题）', max_length=200)),
+                ('summary', models.TextField(blank=True, help_text='较早对话轮次的摘要')),
+                ('summarized_until', models.PositiveIntegerField(default=0, help_text='已合并到摘要的最后一条交互记录ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversation_sessions', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'AI 对话会话',
+                'verbose_name_plural': 'AI 对话会话',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='interactions', to='agents.conversationsession'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0008_conversation_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='latency',
+            field=models.FloatField(blank=True, help_text='代理处理耗时（秒）', null=True),
+        ),
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='model_id',
+            field=models.CharField(blank=True, help_text='回答使用的模型，为空表示代理默认的模型', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='aiinteraction',
+            name='model_route',
+            field=models.CharField(blank=True, choices=[('simple', '简单问题'), ('complex', '复杂问题')], help_text='模型路由', max_length=20),
+        ),
+    ]
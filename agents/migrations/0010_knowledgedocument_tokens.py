@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0009_aiinteraction_model_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgedocument',
+            name='tokenizer',
+            field=models.CharField(blank=True, help_text='生成分词结果的分词方式', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='knowledgedocument',
+            name='tokens',
+            field=models.JSONField(blank=True, help_text='检索分词结果，重建索引时不需要重新分词', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0010_knowledgedocument_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgedocument',
+            name='embedding_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='生成向量时的内容哈希', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='knowledgedocument',
+            name='embedding_model',
+            field=models.CharField(blank=True, help_text='生成向量的模型', max_length=200),
+        ),
+    ]
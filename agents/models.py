@@ -31,9 +31,51 @@ class AIInteraction(models.Model):
     # 上下文信息
     context = models.JSONField(default=dict, blank=True, help_text="交互上下文")
     
+    # 后台任务状态
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', '排队中'),
+            ('running', '处理中'),
+            ('completed', '已完成'),
+            ('failed', '失败')
+        ],
+        default='completed',
+        help_text="处理状态"
+    )
+    error_message = models.TextField(blank=True, help_text="处理失败时的错误信息")
+    started_at = models.DateTimeField(null=True, blank=True, help_text="开始处理时间")
+    completed_at = models.DateTimeField(null=True, blank=True, help_text="处理完成时间")
+    
+    # 语义缓存
+    query_embedding = models.JSONField(null=True, blank=True, help_text="提问的向量表示")
+    cache_hit = models.BooleanField(default=False, help_text="回答是否来自缓存")
+    
+    # 所属会话
+    session = models.ForeignKey(
+        'ConversationSession',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='interactions'
+    )
+    
+    # 模型路由
+    model_route = models.CharField(
+        max_length=20,
+        blank=True,
+        choices=[
+            ('simple', '简单问题'),
+            ('complex', '复杂问题')
+        ],
+        help_text="模型路由"
+    )
+    model_id = models.CharField(max_length=200, blank=True, help_text="回答使用的模型，为空表示代理默认的模型")
+    latency = models.FloatField(null=True, blank=True, help_text="代理处理耗时（秒）")
+    
     # 评估信息
     feedback_score = models.IntegerField(
-        null=True, 
+        null=True,  
         blank=True,
         choices=[(i, i) for i in range(1, 6)],
         help_text="用户反馈评分 (1-5)"
@@ -50,6 +92,34 @@ class AIInteraction(models.Model):
         return f"{self.user.username} - {course_name} - {self.timestamp}"
 
 
+class ConversationSession(models.Model):
+    """
+    AI 对话会话
+    将同一用户的多轮提问关联起来，较早的对话轮次增量合并到摘要中，
+    提问时只附带摘要和最近几轮对话。
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversation_sessions')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='conversation_sessions', null=True, blank=True)
+    title = models.CharField(max_length=200, blank=True, help_text="会话标题（第一个问题）")
+    
+    # 历史摘要
+    summary = models.TextField(blank=True, help_text="较早对话轮次的摘要")
+    summarized_until = models.PositiveIntegerField(default=0, help_text="已合并到摘要的最后一条交互记录ID")
+    
+    # 时间戳
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+        verbose_name = "AI 对话会话"
+        verbose_name_plural = "AI 对话会话"
+        
+    def __str__(self):
+        course_name = self.course.name if self.course else "通用"
+        return f"{self.user.username} - {course_name} - {self.title or self.id}"
+
+
 class KnowledgeDocument(models.Model):
     """
     知识库文档
@@ -76,6 +146,10 @@ class KnowledgeDocument(models.Model):
     # 处理信息
     chunk_index = models.IntegerField(help_text="分块索引")
     embedding = models.JSONField(null=True, blank=True, help_text="向量表示")
+    embedding_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="生成向量时的内容哈希")
+    embedding_model = models.CharField(max_length=200, blank=True, help_text="生成向量的模型")
+    tokens = models.JSONField(null=True, blank=True, help_text="检索分词结果，重建索引时不需要重新分词")
+    tokenizer = models.CharField(max_length=20, blank=True, help_text="生成分词结果的分词方式")
     
     # 时间戳
     created_at = models.DateTimeField(auto_now_add=True)
@@ -157,4 +231,141 @@ class ToolUsage(models.Model):
         verbose_name_plural = "工具使用记录"
 
     def __str__(self):
-        return f"{self.tool_name} - {self.created_at}"
\ No newline at end of file
+        return f"{self.tool_name} - {self.created_at}"
+
+class AgentStep(models.Model):
+    """
+    代理步骤记录
+    记录代理每个步骤的耗时和令牌用量，用于分析回答需要多少步骤以及时间花在哪里。
+    """
+    interaction = models.ForeignKey(
+        AIInteraction,
+        on_delete=models.CASCADE,
+        related_name='agent_steps'
+    )
+    
+    agent_type = models.CharField(max_length=50, help_text="代理类型")
+    step_number = models.IntegerField(help_text="步骤序号")
+    
+    # 耗时
+    duration = models.FloatField(null=True, blank=True, help_text="步骤总耗时 (秒)")
+    llm_duration = models.FloatField(null=True, blank=True, help_text="模型调用耗时 (秒)")
+    execution_time = models.FloatField(null=True, blank=True, help_text="代码和工具执行耗时 (秒)")
+    
+    # 令牌用量
+    input_tokens = models.IntegerField(null=True, blank=True, help_text="输入令牌数")
+    output_tokens = models.IntegerField(null=True, blank=True, help_text="输出令牌数")
+    
+    # 执行内容
+    tool_calls = models.JSONField(default=list, blank=True, help_text="工具调用")
+    is_final_answer = models.BooleanField(default=False, help_text="是否给出最终回答")
+    error_message = models.TextField(blank=True, help_text="错误信息")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['interaction', 'step_number']
+        verbose_name = "代理步骤记录"
+        verbose_name_plural = "代理步骤记录"
+        indexes = [
+            models.Index(fields=['agent_type', 'created_at']),
+        ]
+        
+    def __str__(self):
+        return f"{self.agent_type} - 交互 {self.interaction_id} - 步骤 {self.step_number}"
+
+
+ANALYSIS_TYPE_CHOICES = [
+    ('comprehensive', '全面分析'),
+    ('questions', '提问分析'),
+    ('improvements', '改进建议'),
+]
+
+
+class CourseAnalysisRun(models.Model):
+    """
+    课程批量分析任务
+    一次对多门课程执行同一类型的分析，每门课程的进度和结果保存在 CourseAnalysisResult 中，
+    任务中断后可以从未完成的课程继续。
+    """
+    analysis_type = models.CharField(
+        max_length=20,
+        choices=ANALYSIS_TYPE_CHOICES,
+        default='comprehensive',
+        help_text="分析类型"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', '排队中'),
+            ('running', '处理中'),
+            ('completed', '已完成'),
+            ('failed', '部分失败')
+        ],
+        default='pending',
+        help_text="处理状态"
+    )
+    concurrency = models.PositiveIntegerField(default=4, help_text="同时分析的课程数")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='course_analysis_runs'
+    )
+    
+    # 时间戳
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True, help_text="开始处理时间")
+    completed_at = models.DateTimeField(null=True, blank=True, help_text="处理完成时间")
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "课程批量分析任务"
+        verbose_name_plural = "课程批量分析任务"
+        
+    def __str__(self):
+        return f"{self.get_analysis_type_display()} - {self.created_at}"
+
+
+class CourseAnalysisResult(models.Model):
+    """
+    课程分析结果
+    记录批量分析任务中每门课程的处理状态和分析报告。
+    """
+    run = models.ForeignKey(
+        CourseAnalysisRun,
+        on_delete=models.CASCADE,
+        related_name='results'
+    )
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='analysis_results')
+    analysis_type = models.CharField(max_length=20, choices=ANALYSIS_TYPE_CHOICES, help_text="分析类型")
+    
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', '排队中'),
+            ('running', '处理中'),
+            ('completed', '已完成'),
+            ('failed', '失败')
+        ],
+        default='pending',
+        help_text="处理状态"
+    )
+    report = models.TextField(blank=True, help_text="分析报告")
+    error_message = models.TextField(blank=True, help_text="处理失败时的错误信息")
+    duration = models.FloatField(null=True, blank=True, help_text="分析耗时 (秒)")
+    
+    started_at = models.DateTimeField(null=True, blank=True, help_text="开始处理时间")
+    completed_at = models.DateTimeField(null=True, blank=True, help_text="处理完成时间")
+    
+    class Meta:
+        ordering = ['run', 'course']
+        verbose_name = "课程分析结果"
+        verbose_name_plural = "课程分析结果"
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'course'], name='unique_course_analysis_result'),
+        ]
+        
+    def __str__(self):
+        return f"{self.course.name} - {self.get_analysis_type_display()} - {self.get_status_display()}"
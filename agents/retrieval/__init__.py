@@ -0,0 +1,17 @@
+"""
+知识库检索模块
+"""
+from agents.retrieval.dense_index import DenseIndex
+from agents.retrieval.inverted_index import InvertedIndex
+from agents.retrieval.sparse_bm25 import SparseBM25Matrix, bm25_idf
+from agents.retrieval.tokenizer import bigram_tokenize, get_tokenizer, get_tokenizer_name
+
+__all__ = [
+    'DenseIndex',
+    'InvertedIndex',
+    'SparseBM25Matrix',
+    'bm25_idf',
+    'bigram_tokenize',
+    'get_tokenizer',
+    'get_tokenizer_name',
+]
@@ -0,0 +1,163 @@
+"""
+向量检索索引
+保存知识库分块的单位向量，检索时用一次矩阵乘法计算查询向量与全部分块的余弦相似度。
+分块可以按外部键增删，向量矩阵在索引变化后的首次查询时重新拼接
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain.docstore.document import Document
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class DenseIndex:
+    """
+    向量检索索引类
+    """
+    
+    def __init__(self):
+        """
+        初始化向量检索索引
+        """
+        self._lock = threading.Lock()
+        
+        # 外部键 -> 文档和单位向量，按添加顺序排列
+        self._docs: Dict[Hashable, Document] = {}
+        self._vectors: Dict[Hashable, np.ndarray] = {}
+        
+        # 向量矩阵快照：(文档列表, 矩阵)，索引变化后置为None
+        self._snapshot: Optional[Tuple[List[Document], np.ndarray]] = None
+        
+    @classmethod
+    def from_documents(cls,
+                       docs: Iterable[Document],
+                       vectors: Iterable[Optional[Sequence[float]]],
+                       keys: Optional[Iterable[Hashable]] = None) -> 'DenseIndex':
+        """
+        从文档列表构建向量检索索引，没有向量的文档不加入索引
+        
+        Args:
+            docs (Iterable[Document]): 文档列表
+            vectors (Iterable[Optional[Sequence[float]]]): 每个文档的向量
+            keys (Optional[Iterable[Hashable]]): 每个文档的外部键，为None时使用文档在列表中的序号
+            
+        Returns:
+            DenseIndex: 向量检索索引
+        """
+        index = cls()
+        docs = list(docs)
+        for key, doc, vector in zip(keys if keys is not None else range(len(docs)), docs, vectors):
+            if vector is not None:
+                index.add(key, doc, vector)
+        return index
+        
+    def __len__(self) -> int:
+        return len(self._docs)
+        
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._docs
+        
+    def add(self, key: Hashable, doc: Document, vector: Sequence[float]):
+        """
+        添加文档分块，键已存在时替换原有分块
+        
+        Args:
+            key (Hashable): 外部键
+            doc (Document): 文档分块
+            vector (Sequence[float]): 文档向量，添加时归一化
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+            
+        with self._lock:
+            self._docs.pop(key, None)
+            self._docs[key] = doc
+            self._vectors[key] = vector
+            self._snapshot = None
+            
+    def remove(self, key: Hashable) -> bool:
+        """
+        删除文档分块
+        
+        Args:
+            key (Hashable): 外部键
+            
+        Returns:
+            bool: 键是否存在
+        """
+        with self._lock:
+            if key not in self._docs:
+                return False
+            del self._docs[key]
+            del self._vectors[key]
+            self._snapshot = None
+        return True
+        
+    def _get_snapshot(self) -> Tuple[List[Document], np.ndarray]:
+        """
+        获取文档列表和向量矩阵，索引变化后重新拼接
+        """
+        with self._lock:
+            if self._snapshot is None:
+                docs = list(self._docs.values())
+                matrix = np.vstack(list(self._vectors.values())) if docs else np.zeros((0, 0), dtype=np.float32)
+                self._snapshot = (docs, matrix)
+            return self._snapshot
+            
+    def search(self,
+               query_vector: Sequence[float],
+               k: int = 10,
+               doc_filter: Optional[Callable[[Document], bool]] = None) -> List[Tuple[Document, float]]:
+        """
+        检索与查询向量最相似的文档
+        
+        Args:
+            query_vector (Sequence[float]): 查询向量
+            k (int): 返回的文档数
+            doc_filter (Optional[Callable[[Document], bool]]): 文档过滤条件
+            
+        Returns:
+            List[Tuple[Document, float]]: (文档, 余弦相似度) 列表，按相似度从高到低排列
+        """
+        docs, matrix = self._get_snapshot()
+        if not docs or k <= 0:
+            return []
+            
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if matrix.shape[1] != len(query_vector):
+            logger.warning(f"查询向量维度 {len(query_vector)} 与文档向量维度 {matrix.shape[1]} 不一致")
+            return []
+        norm = np.linalg.norm(query_vector)
+        scores = matrix @ (query_vector / norm if norm else query_vector)
+        
+        if doc_filter is None:
+            candidates = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            order = candidates[np.lexsort((candidates, -scores[candidates]))]
+            return [(docs[i], float(scores[i])) for i in order]
+            
+        # 有过滤条件时按相似度从高到低检查，取满 k 个为止
+        results = []
+        for i in np.lexsort((np.arange(len(scores)), -scores)):
+            if doc_filter(docs[i]):
+                results.append((docs[i], float(scores[i])))
+                if len(results) >= k:
+                    break
+        return results
+        
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取索引统计
+        
+        Returns:
+            Dict[str, Any]: 文档数和向量维度
+        """
+        with self._lock:
+            vector = next(iter(self._vectors.values()), None)
+            return {
+                'docs': len(self._docs),
+                'dim': len(vector) if vector is not None else 0,
+            }
@@ -0,0 +1,467 @@
+"""
+可增量更新的 BM25 倒排索引
+每个词对应一个倒排表（文档槽位, 词频），并维护文档长度和文档频率统计。
+添加分块只追加该分块所含词的倒排表；删除分块只更新统计并把槽位记为墓碑，
+倒排表中的失效项在墓碑占比超过阈值时按受影响的词压缩，不需要重建整个索引。
+文档较多时用稀疏矩阵快照向量化评分，索引变化后在后台重建快照，重建完成前按倒排表评分：
+查询词的倒排表在首次查询时转换为 NumPy 权重数组并缓存到索引下次变化，评分和取前 k 个结果都在 NumPy 中完成。
+评分与 rank_bm25 的 BM25Okapi 一致，检索置信度阈值保持不变
+"""
+import heapq
+import logging
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from langchain.docstore.document import Document
+from agents.config import RETRIEVAL_CONFIG
+from agents.retrieval.sparse_bm25 import SparseBM25Matrix, bm25_idf, select_top_k
+from agents.retrieval.tokenizer import whitespace_tokenize
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class InvertedIndex:
+    """
+    BM25 倒排索引类
+    """
+    
+    def __init__(self,
+                 preprocess_func: Optional[Callable[[str], List[str]]] = None,
+                 k1: Optional[float] = None,
+                 b: Optional[float] = None,
+                 epsilon: Optional[float] = None,
+                 compact_ratio: Optional[float] = None,
+                 scorer: Optional[str] = None):
+        """
+        初始化倒排索引
+        
+        Args:
+            preprocess_func (Optional[Callable[[str], List[str]]]): 分词函数，文档和查询使用同一个
+            k1 (Optional[float]): BM25 词频饱和参数
+            b (Optional[float]): BM25 文档长度归一化参数
+            epsilon (Optional[float]): 负 IDF 的下限（平均 IDF 的倍数）
+            compact_ratio (Optional[float]): 墓碑占比超过该值时自动压缩
+            scorer (Optional[str]): 评分方式：sparse（稀疏矩阵，文档数不少于 SPARSE_MIN_DOCS 时启用）或 postings（遍历倒排表）
+        """
+        self.preprocess_func = preprocess_func or whitespace_tokenize
+        self.k1 = k1 if k1 is not None else RETRIEVAL_CONFIG['BM25_K1']
+        self.b = b if b is not None else RETRIEVAL_CONFIG['BM25_B']
+        self.epsilon = epsilon if epsilon is not None else RETRIEVAL_CONFIG['BM25_EPSILON']
+        self.compact_ratio = compact_ratio if compact_ratio is not None else RETRIEVAL_CONFIG['COMPACT_RATIO']
+        self.scorer = scorer or RETRIEVAL_CONFIG['SCORER']
+        
+        self._lock = threading.Lock()
+        
+        # 词 -> [(槽位, 词频)]，可能包含已删除槽位的失效项
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        # 词 -> 包含该词的有效文档数
+        self._df: Dict[str, int] = {}
+        
+        # 槽位 -> 文档、词频和长度
+        self._docs: Dict[int, Document] = {}
+        self._term_freqs: Dict[int, Counter] = {}
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._next_slot = 0
+        
+        # 外部键（如 KnowledgeDocument 的ID）与槽位的对应关系
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: Dict[int, Hashable] = {}
+        
+        # 已删除但倒排表中仍有失效项的槽位，以及需要压缩的词
+        self._tombstones: Set[int] = set()
+        self._dirty_terms: Set[str] = set()
+        
+        # IDF 缓存，索引变化后在下次查询时重新计算
+        self._idf: Optional[Dict[str, float]] = None
+        
+        # 倒排表评分的缓存：槽位 -> 文档长度的数组，词 -> (槽位数组, BM25 权重数组)，索引变化后清空
+        self._length_array: Optional[np.ndarray] = None
+        self._term_weights: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        
+        # 稀疏矩阵快照及其对应的索引版本
+        self._version = 0
+        self._matrix: Optional[SparseBM25Matrix] = None
+        self._matrix_version = -1
+        self._matrix_building = False
+        
+    @classmethod
+    def from_documents(cls,
+                       docs: Iterable[Document],
+                       keys: Optional[Iterable[Hashable]] = None,
+                       tokens: Optional[Iterable[Optional[Iterable[str]]]] = None,
+                       **kwargs) -> 'InvertedIndex':
+        """
+        从文档列表构建倒排索引
+        
+        Args:
+            docs (Iterable[Document]): 文档列表
+            keys (Optional[Iterable[Hashable]]): 每个文档的外部键，为None时使用文档在列表中的序号
+            tokens (Optional[Iterable[Optional[Iterable[str]]]]): 每个文档已保存的分词结果，为None的文档重新分词
+            **kwargs: 传给构造函数的参数
+            
+        Returns:
+            InvertedIndex: 倒排索引
+        """
+        index = cls(**kwargs)
+        docs = list(docs)
+        keys = keys if keys is not None else range(len(docs))
+        tokens = tokens if tokens is not None else [None] * len(docs)
+        for key, doc, doc_tokens in zip(keys, docs, tokens):
+            index.add(key, doc, doc_tokens)
+        return index
+        
+    def __len__(self) -> int:
+        return len(self._docs)
+        
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+        
+    @property
+    def docs(self) -> List[Document]:
+        """
+        索引中的有效文档，按添加顺序排列
+        """
+        with self._lock:
+            return list(self._docs.values())
+            
+    def keys(self) -> List[Hashable]:
+        """
+        索引中有效文档的外部键，按添加顺序排列
+        """
+        with self._lock:
+            return list(self._slots)
+            
+    def get(self, key: Hashable) -> Optional[Document]:
+        """
+        按外部键获取文档
+        """
+        with self._lock:
+            slot = self._slots.get(key)
+            return self._docs.get(slot) if slot is not None else None
+            
+    def term_freqs(self, key: Hashable) -> Optional[Counter]:
+        """
+        按外部键获取文档分块的词频，可用于构建其他索引而不重新分词
+        """
+        with self._lock:
+            slot = self._slots.get(key)
+            return self._term_freqs.get(slot) if slot is not None else None
+            
+    def add(self, key: Hashable, doc: Document, tokens: Optional[Iterable[str]] = None):
+        """
+        添加文档分块，键已存在时替换原有分块
+        
+        Args:
+            key (Hashable): 外部键
+            doc (Document): 文档分块
+            tokens (Optional[Iterable[str]]): 已保存的分词结果（或词频），为None时用分词函数切分
+        """
+        term_freqs = Counter(tokens if tokens is not None else self.preprocess_func(doc.page_content))
+        with self._lock:
+            if key in self._slots:
+                self._remove(key)
+                
+            slot = self._next_slot
+            self._next_slot += 1
+            for term, freq in term_freqs.items():
+                self._postings.setdefault(term, []).append((slot, freq))
+                self._df[term] = self._df.get(term, 0) + 1
+                
+            length = sum(term_freqs.values())
+            self._docs[slot] = doc
+            self._term_freqs[slot] = term_freqs
+            self._lengths[slot] = length
+            self._total_length += length
+            self._slots[key] = slot
+            self._keys[slot] = key
+            self._changed()
+            
+    def update(self, key: Hashable, doc: Document, tokens: Optional[Iterable[str]] = None):
+        """
+        更新文档分块，只改动新旧内容所含词的倒排表
+        
+        Args:
+            key (Hashable): 外部键
+            doc (Document): 新的文档分块
+            tokens (Optional[Iterable[str]]): 已保存的分词结果，为None时用分词函数切分
+        """
+        self.add(key, doc, tokens)
+        
+    def remove(self, key: Hashable) -> bool:
+        """
+        删除文档分块
+        
+        Args:
+            key (Hashable): 外部键
+            
+        Returns:
+            bool: 键是否存在
+        """
+        with self._lock:
+            if key not in self._slots:
+                return False
+            self._remove(key)
+            if len(self._tombstones) > self.compact_ratio * max(1, len(self._docs)):
+                self._compact()
+        return True
+        
+    def _remove(self, key: Hashable):
+        """
+        删除文档分块并记录墓碑（调用方持有锁）
+        """
+        slot = self._slots.pop(key)
+        del self._keys[slot]
+        del self._docs[slot]
+        term_freqs = self._term_freqs.pop(slot)
+        self._total_length -= self._lengths.pop(slot)
+        
+        for term in term_freqs:
+            self._df[term] -= 1
+            if not self._df[term]:
+                del self._df[term]
+        self._tombstones.add(slot)
+        self._dirty_terms.update(term_freqs)
+        self._changed()
+        
+    def compact(self) -> int:
+        """
+        从倒排表中清除已删除槽位的失效项
+        
+        Returns:
+            int: 清除的失效项数
+        """
+        with self._lock:
+            return self._compact()
+            
+    def _compact(self) -> int:
+        """
+        按受影响的词压缩倒排表（调用方持有锁）
+        """
+        removed = 0
+        for term in self._dirty_terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            live = [posting for posting in postings if posting[0] not in self._tombstones]
+            removed += len(postings) - len(live)
+            if live:
+                self._postings[term] = live
+            else:
+                del self._postings[term]
+                
+        logger.debug(f"倒排索引压缩完成: 清除 {removed} 个失效项，涉及 {len(self._dirty_terms)} 个词")
+        self._tombstones.clear()
+        self._dirty_terms.clear()
+        return removed
+        
+    def _changed(self):
+        """
+        索引内容变化后使 IDF 缓存、权重缓存和稀疏矩阵快照失效（调用方持有锁）
+        """
+        self._idf = None
+        self._length_array = None
+        self._term_weights = {}
+        self._version += 1
+        
+    def _get_idf(self) -> Dict[str, float]:
+        """
+        计算各词的 IDF（调用方持有锁）
+        """
+        if self._idf is None:
+            self._idf = bm25_idf(self._df, len(self._docs), self.epsilon)
+        return self._idf
+        
+    def _get_term_weights(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取词的有效倒排项及其 BM25 权重（调用方持有锁）
+        
+        Args:
+            term (str): 索引中的词
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (槽位数组, 权重数组)，不含已删除的槽位
+        """
+        cached = self._term_weights.get(term)
+        if cached is not None:
+            return cached
+            
+        if self._length_array is None:
+            self._length_array = np.zeros(self._next_slot, dtype=np.float64)
+            self._length_array[np.fromiter(self._lengths.keys(), dtype=np.int64, count=len(self._lengths))] = \
+                np.fromiter(self._lengths.values(), dtype=np.float64, count=len(self._lengths))
+                
+        pairs = np.array(self._postings[term], dtype=np.int64).reshape(-1, 2)
+        if self._tombstones:
+            tombstones = np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+            pairs = pairs[~np.isin(pairs[:, 0], tombstones)]
+        slots, tfs = pairs[:, 0], pairs[:, 1].astype(np.float64)
+        
+        avgdl = self._total_length / len(self._docs) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * self._length_array[slots] / avgdl)
+        weights = self._get_idf()[term] * tfs * (self.k1 + 1) / (tfs + norm)
+        self._term_weights[term] = (slots, weights)
+        return slots, weights
+        
+    def _score_arrays(self, query_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按倒排表计算包含查询词的文档的 BM25 分数（调用方持有锁）
+        
+        Args:
+            query_tokens (List[str]): 查询词，重复出现的词按次数计分
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (槽位数组, 分数数组)，只包含与查询有共同词的文档
+        """
+        counts = Counter(token for token in query_tokens if token in self._df)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+            
+        terms = [self._get_term_weights(term) for term in counts]
+        if len(terms) == 1:
+            slots, weights = terms[0]
+            return slots, weights * counts[next(iter(counts))]
+            
+        # 各词的倒排项中槽位不重复，按槽位累加到稠密数组
+        scores = np.zeros(self._next_slot, dtype=np.float64)
+        matched = np.zeros(self._next_slot, dtype=bool)
+        for (slots, weights), count in zip(terms, counts.values()):
+            scores[slots] += weights * count
+            matched[slots] = True
+        slots = np.flatnonzero(matched)
+        return slots, scores[slots]
+        
+    def build_matrix(self) -> SparseBM25Matrix:
+        """
+        按当前索引内容构建稀疏矩阵快照
+        
+        Returns:
+            SparseBM25Matrix: 稀疏矩阵
+        """
+        # 在锁内复制倒排表，在锁外构建矩阵，构建期间不阻塞查询和更新
+        with self._lock:
+            version = self._version
+            postings = {term: list(term_postings) for term, term_postings in self._postings.items()}
+            idf = self._get_idf()
+            lengths = dict(self._lengths)
+            tombstones = list(self._tombstones)
+            
+        matrix = SparseBM25Matrix.from_postings(postings, idf, lengths, self.k1, self.b, tombstones)
+        with self._lock:
+            # 并发构建时保留版本较新的快照（版本与索引当前版本一致时才会用于查询）
+            if version >= self._matrix_version:
+                self._matrix, self._matrix_version = matrix, version
+        logger.debug(f"稀疏矩阵快照构建完成: {matrix.shape[0]} 个词 × {matrix.shape[1]} 个文档")
+        return matrix
+        
+    def _rebuild_matrix(self):
+        """
+        后台重建稀疏矩阵快照
+        """
+        try:
+            self.build_matrix()
+        except Exception as e:
+            logger.error(f"构建稀疏矩阵快照时发生错误: {str(e)}")
+        finally:
+            with self._lock:
+                self._matrix_building = False
+                
+    def _current_matrix(self) -> Optional[SparseBM25Matrix]:
+        """
+        获取与当前索引内容一致的稀疏矩阵快照
+        首次使用时同步构建；索引变化后在后台重建，重建完成前返回None，由调用方按倒排表评分
+        
+        Returns:
+            Optional[SparseBM25Matrix]: 稀疏矩阵，未启用或快照已过期时为None
+        """
+        if self.scorer != 'sparse' or len(self._docs) < RETRIEVAL_CONFIG['SPARSE_MIN_DOCS']:
+            return None
+            
+        with self._lock:
+            if self._matrix is not None and self._matrix_version == self._version:
+                return self._matrix
+            if self._matrix is not None:
+                if not self._matrix_building:
+                    self._matrix_building = True
+                    threading.Thread(target=self._rebuild_matrix, name='bm25-matrix', daemon=True).start()
+                return None
+                
+        return self.build_matrix()
+        
+    def get_scores(self, query_tokens: List[str]) -> Dict[int, float]:
+        """
+        计算包含查询词的文档的 BM25 分数
+        
+        Args:
+            query_tokens (List[str]): 查询词
+            
+        Returns:
+            Dict[int, float]: 槽位到分数的映射，不包含查询词的文档分数为0，不在结果中
+        """
+        with self._lock:
+            slots, scores = self._score_arrays(query_tokens)
+        return dict(zip(slots.tolist(), scores.tolist()))
+        
+    def search(self,
+               query: str,
+               k: int = 10,
+               doc_filter: Optional[Callable[[Document], bool]] = None,
+               fill: bool = False) -> List[Tuple[Document, float]]:
+        """
+        检索文档
+        
+        Args:
+            query (str): 查询内容
+            k (int): 返回的文档数
+            doc_filter (Optional[Callable[[Document], bool]]): 文档过滤条件
+            fill (bool): 与查询有共同词的文档不足 k 个时，是否按添加顺序用分数为0的文档补足（与 BM25Retriever 一致）
+            
+        Returns:
+            List[Tuple[Document, float]]: (文档, 分数) 列表，按分数从高到低排列
+        """
+        query_tokens = self.preprocess_func(query)
+        # 有过滤条件时先取全部匹配文档再过滤
+        limit = k if doc_filter is None else None
+        matrix = self._current_matrix()
+        if matrix is not None:
+            scored = [(score, slot) for slot, score in matrix.top_k(query_tokens, limit)]
+        else:
+            with self._lock:
+                slots, scores = select_top_k(*self._score_arrays(query_tokens), limit)
+            scored = list(zip(scores.tolist(), slots.tolist()))
+            
+        with self._lock:
+            candidates = (
+                (score, slot) for score, slot in scored
+                if slot in self._docs and (doc_filter is None or doc_filter(self._docs[slot]))
+            )
+            # 分数相同时先添加的文档在前
+            top = heapq.nsmallest(k, candidates, key=lambda item: (-item[0], item[1]))
+            
+            if fill and len(top) < k:
+                matched = {slot for _, slot in top}
+                for slot, doc in self._docs.items():
+                    if len(top) >= k:
+                        break
+                    if slot not in matched and (doc_filter is None or doc_filter(doc)):
+                        top.append((0.0, slot))
+            return [(self._docs[slot], score) for score, slot in top]
+            
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取索引统计
+        
+        Returns:
+            Dict[str, Any]: 文档数、词数、平均文档长度、墓碑数、评分方式、稀疏矩阵快照是否最新和倒排表总长度
+        """
+        with self._lock:
+            return {
+                'docs': len(self._docs),
+                'terms': len(self._df),
+                'avg_length': self._total_length / len(self._docs) if self._docs else 0.0,
+                'tombstones': len(self._tombstones),
+                'scorer': self.scorer,
+                'matrix_current': self._matrix is not None and self._matrix_version == self._version,
+                'postings': sum(len(postings) for postings in self._postings.values()),
+            }
@@ -0,0 +1,255 @@
+"""
+基于稀疏矩阵的 BM25 向量化评分
+把语料存为 CSR 格式的词-文档矩阵，矩阵元素预先乘好 IDF 并完成文档长度归一化，
+查询时只需一次稀疏矩阵乘法，再用 argpartition 取前 k 个结果，避免在 Python 中逐文档循环
+"""
+import logging
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from scipy import sparse
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def bm25_idf(df: Dict[str, int], corpus_size: int, epsilon: float) -> Dict[str, float]:
+    """
+    计算 BM25Okapi 的 IDF，出现在一半以上文档中的词取平均 IDF 的 epsilon 倍
+    
+    Args:
+        df (Dict[str, int]): 词 -> 包含该词的文档数
+        corpus_size (int): 文档总数
+        epsilon (float): 负 IDF 的下限（平均 IDF 的倍数）
+        
+    Returns:
+        Dict[str, float]: 词 -> IDF
+    """
+    idf = {
+        term: math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+        for term, freq in df.items()
+    }
+    if idf:
+        eps = epsilon * sum(idf.values()) / len(idf)
+        for term, value in idf.items():
+            if value < 0:
+                idf[term] = eps
+    return idf
+
+def select_top_k(ids: np.ndarray, scores: np.ndarray, k: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    选出分数最高的 k 个结果，按分数从高到低排列，分数相同时编号小的在前
+    
+    Args:
+        ids (np.ndarray): 文档编号（矩阵列号或槽位）
+        scores (np.ndarray): 对应的分数
+        k (Optional[int]): 返回的结果数，为None时返回全部结果
+        
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (文档编号, 分数)
+    """
+    if k is not None and len(scores) > k:
+        # 保留与第 k 名同分的全部文档，排序后再截取，分数相同时结果稳定
+        kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        selected = scores >= kth_score
+        ids, scores = ids[selected], scores[selected]
+    order = np.lexsort((ids, -scores))[:k]
+    return ids[order], scores[order]
+
+class SparseBM25Matrix:
+    """
+    BM25 词-文档稀疏矩阵
+    矩阵为只读快照，语料变化后需要重新构建
+    """
+    
+    def __init__(self, matrix: sparse.csr_matrix, vocabulary: Dict[str, int], slots: np.ndarray):
+        """
+        初始化稀疏矩阵
+        
+        Args:
+            matrix (sparse.csr_matrix): 形状为 (词数, 文档数) 的 BM25 权重矩阵
+            vocabulary (Dict[str, int]): 词 -> 矩阵行号
+            slots (np.ndarray): 矩阵列号 -> 文档槽位
+        """
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.slots = slots
+        
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+        
+    @staticmethod
+    def _weights(rows: np.ndarray,
+                 cols: np.ndarray,
+                 tfs: np.ndarray,
+                 lengths: np.ndarray,
+                 idf: np.ndarray,
+                 k1: float,
+                 b: float) -> np.ndarray:
+        """
+        计算矩阵元素：IDF × 归一化后的词频
+        """
+        avgdl = lengths.sum() / len(lengths) if len(lengths) else 1.0
+        norm = k1 * (1 - b + b * lengths / (avgdl or 1.0))
+        tfs = tfs.astype(np.float64)
+        return (idf[rows] * tfs * (k1 + 1) / (tfs + norm[cols])).astype(np.float32)
+        
+    @classmethod
+    def from_postings(cls,
+                      postings: Dict[str, List[Tuple[int, int]]],
+                      idf: Dict[str, float],
+                      lengths: Dict[int, int],
+                      k1: float,
+                      b: float,
+                      tombstones: Optional[Iterable[int]] = None) -> 'SparseBM25Matrix':
+        """
+        从倒排表构建稀疏矩阵
+        
+        Args:
+            postings (Dict[str, List[Tuple[int, int]]]): 词 -> [(槽位, 词频)]
+            idf (Dict[str, float]): 词 -> IDF，只包含有效文档中出现的词
+            lengths (Dict[int, int]): 有效文档的槽位 -> 文档长度，按槽位递增排列
+            k1 (float): BM25 词频饱和参数
+            b (float): BM25 文档长度归一化参数
+            tombstones (Optional[Iterable[int]]): 已删除的槽位，对应的倒排项被忽略
+            
+        Returns:
+            SparseBM25Matrix: 稀疏矩阵
+        """
+        slots = np.fromiter(lengths.keys(), dtype=np.int64, count=len(lengths))
+        doc_lengths = np.fromiter(lengths.values(), dtype=np.float64, count=len(lengths))
+        tombstones = np.fromiter(tombstones or (), dtype=np.int64)
+        
+        vocabulary: Dict[str, int] = {}
+        row_parts, slot_parts, tf_parts = [], [], []
+        for term, term_postings in postings.items():
+            if term not in idf:
+                continue
+            pairs = np.array(term_postings, dtype=np.int64).reshape(-1, 2)
+            if len(tombstones):
+                pairs = pairs[~np.isin(pairs[:, 0], tombstones)]
+            row = vocabulary[term] = len(vocabulary)
+            row_parts.append(np.full(len(pairs), row, dtype=np.int64))
+            slot_parts.append(pairs[:, 0])
+            tf_parts.append(pairs[:, 1])
+            
+        if row_parts:
+            rows = np.concatenate(row_parts)
+            cols = np.searchsorted(slots, np.concatenate(slot_parts))
+            tfs = np.concatenate(tf_parts)
+        else:
+            rows = cols = tfs = np.zeros(0, dtype=np.int64)
+            
+        idf_array = np.fromiter((idf[term] for term in vocabulary), dtype=np.float64, count=len(vocabulary))
+        data = cls._weights(rows, cols, tfs, doc_lengths, idf_array, k1, b)
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(vocabulary), len(slots)), dtype=np.float32)
+        return cls(matrix, vocabulary, slots)
+        
+    @classmethod
+    def from_term_ids(cls,
+                      term_ids: np.ndarray,
+                      doc_ids: np.ndarray,
+                      num_docs: int,
+                      vocabulary: Dict[str, int],
+                      k1: float = 1.5,
+                      b: float = 0.75,
+                      epsilon: float = 0.25) -> 'SparseBM25Matrix':
+        """
+        从语料中每个词出现的（词编号, 文档编号）数组构建稀疏矩阵，词频统计全部在 NumPy 中完成
+        
+        Args:
+            term_ids (np.ndarray): 每个词出现的词编号
+            doc_ids (np.ndarray): 每个词出现所在的文档编号
+            num_docs (int): 文档总数
+            vocabulary (Dict[str, int]): 词 -> 词编号
+            k1 (float): BM25 词频饱和参数
+            b (float): BM25 文档长度归一化参数
+            epsilon (float): 负 IDF 的下限（平均 IDF 的倍数）
+            
+        Returns:
+            SparseBM25Matrix: 稀疏矩阵，文档槽位即文档编号
+        """
+        vocab_size = max(len(vocabulary), 1)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        
+        # 按（文档, 词）合并得到词频
+        keys, tfs = np.unique(doc_ids * vocab_size + term_ids, return_counts=True)
+        cols, rows = np.divmod(keys, vocab_size)
+        lengths = np.bincount(doc_ids, minlength=num_docs).astype(np.float64)
+        
+        df = np.bincount(rows, minlength=len(vocabulary))
+        terms = list(vocabulary)
+        idf = bm25_idf({terms[row]: int(df[row]) for row in np.flatnonzero(df)}, num_docs, epsilon)
+        idf_array = np.fromiter((idf.get(term, 0.0) for term in terms), dtype=np.float64, count=len(terms))
+        
+        data = cls._weights(rows, cols, tfs, lengths, idf_array, k1, b)
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(vocabulary), num_docs), dtype=np.float32)
+        return cls(matrix, vocabulary, np.arange(num_docs, dtype=np.int64))
+        
+    @classmethod
+    def from_token_lists(cls,
+                         token_lists: Sequence[Sequence[str]],
+                         k1: float = 1.5,
+                         b: float = 0.75,
+                         epsilon: float = 0.25) -> 'SparseBM25Matrix':
+        """
+        从分词后的语料直接构建稀疏矩阵（不经过倒排索引，用于大语料的批量构建）
+        
+        Args:
+            token_lists (Sequence[Sequence[str]]): 每个文档的词列表
+            k1 (float): BM25 词频饱和参数
+            b (float): BM25 文档长度归一化参数
+            epsilon (float): 负 IDF 的下限（平均 IDF 的倍数）
+            
+        Returns:
+            SparseBM25Matrix: 稀疏矩阵，文档槽位即文档在语料中的序号
+        """
+        vocabulary: Dict[str, int] = {}
+        term_ids = np.fromiter(
+            (vocabulary.setdefault(token, len(vocabulary)) for tokens in token_lists for token in tokens),
+            dtype=np.int64
+        )
+        doc_ids = np.repeat(
+            np.arange(len(token_lists), dtype=np.int64),
+            [len(tokens) for tokens in token_lists]
+        )
+        return cls.from_term_ids(term_ids, doc_ids, len(token_lists), vocabulary, k1, b, epsilon)
+        
+    def get_scores(self, query_tokens: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算包含查询词的文档的 BM25 分数
+        
+        Args:
+            query_tokens (Sequence[str]): 查询词，重复出现的词按次数计分
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (矩阵列号, 分数)，只包含与查询有共同词的文档
+        """
+        counts = Counter(token for token in query_tokens if token in self.vocabulary)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            
+        rows = np.fromiter((self.vocabulary[token] for token in counts), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        query = sparse.csr_matrix(
+            (weights, (np.zeros(len(rows), dtype=np.int64), rows)),
+            shape=(1, self.matrix.shape[0])
+        )
+        result = (query @ self.matrix).tocsr()
+        return result.indices.astype(np.int64), result.data
+        
+    def top_k(self, query_tokens: Sequence[str], k: Optional[int] = 10) -> List[Tuple[int, float]]:
+        """
+        检索分数最高的 k 个文档
+        
+        Args:
+            query_tokens (Sequence[str]): 查询词
+            k (Optional[int]): 返回的文档数，为None时返回全部匹配文档
+            
+        Returns:
+            List[Tuple[int, float]]: (文档槽位, 分数) 列表，按分数从高到低排列，分数相同时槽位小的在前
+        """
+        cols, scores = select_top_k(*self.get_scores(query_tokens), k)
+        return [(int(self.slots[col]), float(score)) for col, score in zip(cols, scores)]
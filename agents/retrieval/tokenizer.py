@@ -0,0 +1,125 @@
+"""
+检索分词
+课程内容以中文为主，按空白字符切分会把整句当作一个词。这里提供可替换的分词方式，
+文档和查询使用同一个分词函数：
+- whitespace: 按空白字符切分（BM25Retriever 的默认处理）
+- bigram: 中文按相邻两字切分，英文和数字按单词切分，统一转为小写
+- jieba: 使用 jieba 词典分词（搜索引擎模式），未安装 jieba 时改用 bigram
+"""
+import logging
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+from agents.config import RETRIEVAL_CONFIG
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 中文字符段或英文数字单词
+_TOKEN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9_]+')
+_CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+_jieba = None
+_jieba_unavailable = False
+_jieba_lock = threading.Lock()
+
+def whitespace_tokenize(text: str) -> List[str]:
+    """
+    按空白字符切分，与 BM25Retriever 的默认处理一致
+    """
+    return text.split()
+
+def bigram_tokenize(text: str) -> List[str]:
+    """
+    中文按相邻两字切分（单个汉字保留为一个词），英文和数字按单词切分，忽略标点
+    
+    Args:
+        text (str): 文本
+        
+    Returns:
+        List[str]: 词列表
+    """
+    tokens = []
+    for segment in _TOKEN_PATTERN.findall(text.lower()):
+        if not _CJK_PATTERN.match(segment) or len(segment) == 1:
+            tokens.append(segment)
+        else:
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+def _get_jieba():
+    """
+    获取 jieba 模块，首次调用时加载词典
+    
+    Returns:
+        module: jieba 模块，未安装时为None
+    """
+    global _jieba, _jieba_unavailable
+    
+    if _jieba is None and not _jieba_unavailable:
+        with _jieba_lock:
+            if _jieba is None and not _jieba_unavailable:
+                try:
+                    import jieba
+                    jieba.initialize()
+                    _jieba = jieba
+                except ImportError:
+                    logger.warning("未安装 jieba，检索分词改用 bigram")
+                    _jieba_unavailable = True
+    return _jieba
+
+def jieba_tokenize(text: str) -> List[str]:
+    """
+    使用 jieba 搜索引擎模式分词，英文和数字转为小写，忽略标点和空白
+    
+    Args:
+        text (str): 文本
+        
+    Returns:
+        List[str]: 词列表
+    """
+    jieba = _get_jieba()
+    if jieba is None:
+        return bigram_tokenize(text)
+    return [
+        token for token in (word.strip().lower() for word in jieba.lcut_for_search(text))
+        if token and _TOKEN_PATTERN.fullmatch(token)
+    ]
+
+# 可用的分词方式
+TOKENIZERS: Dict[str, Callable[[str], List[str]]] = {
+    'whitespace': whitespace_tokenize,
+    'bigram': bigram_tokenize,
+    'jieba': jieba_tokenize,
+}
+
+def get_tokenizer_name(name: Optional[str] = None) -> str:
+    """
+    获取实际使用的分词方式名称，jieba 不可用时为 bigram
+    保存的词序列按该名称区分，分词方式改变后重新分词
+    
+    Args:
+        name (Optional[str]): 分词方式，为None时使用配置
+        
+    Returns:
+        str: 分词方式名称
+    """
+    name = name or RETRIEVAL_CONFIG['TOKENIZER']
+    if name not in TOKENIZERS:
+        logger.warning(f"未知的检索分词方式 {name}，改用 bigram")
+        return 'bigram'
+    if name == 'jieba' and _get_jieba() is None:
+        return 'bigram'
+    return name
+
+def get_tokenizer(name: Optional[str] = None) -> Callable[[str], List[str]]:
+    """
+    获取分词函数
+    
+    Args:
+        name (Optional[str]): 分词方式，为None时使用配置
+        
+    Returns:
+        Callable[[str], List[str]]: 分词函数
+    """
+    return TOKENIZERS[get_tokenizer_name(name)]
@@ -0,0 +1,141 @@
+"""
+AI 语义回答缓存
+将提问向量化后与同一课程的历史提问比对，相似度超过阈值时直接复用历史回答，
+使同一问题的不同问法不必重复运行代理。
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Any, List, Optional
+from django.core.cache import caches
+from django.utils import timezone
+from agents.config import CACHE_CONFIG, SEMANTIC_CACHE_CONFIG
+from agents.embeddings import embed_query, cosine_similarities
+from agents.models import AIInteraction
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """
+    AI 语义回答缓存类
+    历史回答和提问向量保存在 AIInteraction 中，不另建存储
+    """
+
+    def __init__(self,
+                 threshold: Optional[float] = None,
+                 max_candidates: Optional[int] = None,
+                 max_age_days: Optional[int] = None,
+                 cache_alias: str = 'default'):
+        """
+        初始化语义缓存
+
+        Args:
+            threshold (Optional[float]): 余弦相似度阈值
+            max_candidates (Optional[int]): 每次比对的历史回答数上限
+            max_age_days (Optional[int]): 只复用最近若干天内的回答
+            cache_alias (str): 保存失效时间的 Django 缓存别名
+        """
+        self.threshold = threshold or SEMANTIC_CACHE_CONFIG['SIMILARITY_THRESHOLD']
+        self.max_candidates = max_candidates or SEMANTIC_CACHE_CONFIG['MAX_CANDIDATES']
+        self.max_age_days = max_age_days or SEMANTIC_CACHE_CONFIG['MAX_AGE_DAYS']
+        self.cache_alias = cache_alias
+        self.enabled = SEMANTIC_CACHE_CONFIG['ENABLED']
+        self.prefix = CACHE_CONFIG['CACHE_PREFIX']
+
+    def _since_key(self, course_id: Optional[int]) -> str:
+        """
+        失效时间的缓存键
+
+        Args:
+            course_id (Optional[int]): 课程ID，为None表示全局
+
+        Returns:
+            str: 缓存键
+        """
+        return f"{self.prefix}semantic_since:{course_id if course_id else 'global'}"
+
+    def _valid_since(self, course_id: Optional[int]):
+        """
+        可复用回答的最早时间，取最长缓存时间和最近一次知识库更新时间中较晚的一个
+
+        Args:
+            course_id (Optional[int]): 课程ID
+
+        Returns:
+            datetime: 最早时间
+        """
+        since = timezone.now() - timedelta(days=self.max_age_days)
+        invalidated = caches[self.cache_alias].get_many([self._since_key(None), self._since_key(course_id)])
+        for value in invalidated.values():
+            since = max(since, value)
+        return since
+
+    def lookup(self, query: str, course_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """
+        查找语义相近的历史回答
+
+        Args:
+            query (str): 用户提问
+            course_id (Optional[int]): 课程ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 命中时返回 interaction_id、response、similarity，否则为None
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            vector = embed_query(query)
+            if vector is None:
+                return None
+
+            candidates = AIInteraction.objects.filter(
+                status='completed',
+                cache_hit=False,
+                query_embedding__isnull=False,
+                timestamp__gte=self._valid_since(course_id),
+            ).exclude(response='').exclude(feedback_score__lte=2).exclude(context__has_key='stop_reason')
+
+            if course_id:
+                candidates = candidates.filter(course_id=course_id)
+            else:
+                candidates = candidates.filter(course__isnull=True)
+
+            rows: List[tuple] = list(
+                candidates.order_by('-timestamp').values_list('id', 'response', 'query_embedding')[:self.max_candidates]
+            )
+            rows = [row for row in rows if len(row[2]) == len(vector)]
+            if not rows:
+                return None
+
+            similarities = cosine_similarities(vector, [row[2] for row in rows])
+            best = int(similarities.argmax())
+            similarity = float(similarities[best])
+
+            if similarity < self.threshold:
+                return None
+
+            logger.info(f"语义缓存命中: 交互记录 {rows[best][0]}，相似度 {similarity:.3f}")
+            return {
+                "interaction_id": rows[best][0],
+                "response": rows[best][1],
+                "similarity": similarity,
+            }
+
+        except Exception as e:
+            # 缓存故障不影响正常回答
+            logger.warning(f"查询语义缓存时发生错误: {str(e)}")
+            return None
+
+    def invalidate(self, course_id: Optional[int] = None):
+        """
+        使课程在此之前的历史回答不再被复用，course_id 为None时作用于全部课程
+
+        Args:
+            course_id (Optional[int]): 课程ID
+        """
+        caches[self.cache_alias].set(self._since_key(course_id), timezone.now(), None)
+        logger.info(f"语义缓存已失效: {'课程 ' + str(course_id) if course_id else '全部课程'}")
+
+# 全局语义缓存实例
+semantic_answer_cache = SemanticAnswerCache()
@@ -2,7 +2,10 @@
 AI 助手数据序列化器
 """
 from rest_framework import serializers
-from agents.models import AIInteraction, KnowledgeDocument, AgentConfig, ToolUsage
+from agents.models import (
+    AIInteraction, KnowledgeDocument, AgentConfig, ToolUsage,
+    ANALYSIS_TYPE_CHOICES, CourseAnalysisRun, CourseAnalysisResult
+)
 from users.models import User
 from courses.models import Course
 
@@ -31,7 +34,7 @@ class AIInteractionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = AIInteraction
-        fields = '__all__'
+        exclude = ('query_embedding',)
         read_only_fields = ('timestamp',)
 
 class AIInteractionCreateSerializer(serializers.ModelSerializer):
@@ -91,4 +94,61 @@ class ToolUsageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ToolUsage
         fields = '__all__'
-        read_only_fields = ('created_at',)
\ No newline at end of file
+        read_only_fields = ('created_at',)
+
+class CourseAnalysisResultSerializer(serializers.ModelSerializer):
+    """
+    课程分析结果序列化器
+    """
+    course_name = serializers.CharField(source='course.name', read_only=True)
+    
+    class Meta:
+        model = CourseAnalysisResult
+        fields = ('id', 'course', 'course_name', 'analysis_type', 'status', 'report',
+                  'error_message', 'duration', 'started_at', 'completed_at')
+        read_only_fields = fields
+
+class CourseAnalysisRunSerializer(serializers.ModelSerializer):
+    """
+    课程批量分析任务序列化器
+    """
+    progress = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = CourseAnalysisRun
+        fields = ('id', 'analysis_type', 'status', 'concurrency', 'created_by',
+                  'progress', 'created_at', 'started_at', 'completed_at')
+        read_only_fields = fields
+        
+    def get_progress(self, obj):
+        """
+        统计各状态的课程数
+        """
+        progress = {'total': 0, 'pending': 0, 'running': 0, 'completed': 0, 'failed': 0}
+        for result_status in obj.results.values_list('status', flat=True):
+            progress['total'] += 1
+            progress[result_status] += 1
+        return progress
+
+class CourseAnalysisRunDetailSerializer(CourseAnalysisRunSerializer):
+    """
+    课程批量分析任务详情序列化器，包含每门课程的分析结果
+    """
+    results = CourseAnalysisResultSerializer(many=True, read_only=True)
+    
+    class Meta(CourseAnalysisRunSerializer.Meta):
+        fields = CourseAnalysisRunSerializer.Meta.fields + ('results',)
+        read_only_fields = fields
+
+class CourseAnalysisRunCreateSerializer(serializers.Serializer):
+    """
+    创建课程批量分析任务的请求序列化器
+    """
+    analysis_type = serializers.ChoiceField(choices=ANALYSIS_TYPE_CHOICES, default='comprehensive')
+    course_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        help_text="课程ID列表，不提供则分析全部课程"
+    )
+    concurrency = serializers.IntegerField(min_value=1, required=False)
@@ -3,12 +3,111 @@ AI 助手信号处理器
 """
 import logging
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from agents.models import AIInteraction, ToolUsage
+from django.dispatch import receiver, Signal
+from agents.models import AIInteraction, AgentConfig, ToolUsage
+from agents.agent.router import model_router
+from agents.config import EMBEDDING_CONFIG, TOOLS_CONFIG
+from agents.cache import answer_cache
+from agents.semantic_cache import semantic_answer_cache
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 知识库更新信号，course_id 为None表示更新了全部课程
+knowledge_base_updated = Signal()
+
+# 知识库文档向量生成完成信号，course_id 为None表示处理了全部课程
+knowledge_base_embedded = Signal()
+
+@receiver(knowledge_base_updated)
+def invalidate_answer_cache(sender, course_id=None, **kwargs):
+    """
+    知识库更新后使相关课程的回答缓存失效
+    
+    Args:
+        sender: 发送信号的对象
+        course_id (Optional[int]): 课程ID
+        **kwargs: 其他参数
+    """
+    try:
+        answer_cache.invalidate(course_id)
+        semantic_answer_cache.invalidate(course_id)
+    except Exception as e:
+        logger.error(f"使回答缓存失效时发生错误: {str(e)}")
+
+@receiver(knowledge_base_updated)
+def refresh_retriever_index(sender, course_id=None, **kwargs):
+    """
+    知识库更新后递增检索索引版本号：本进程立即重新加载相关课程的检索文档，
+    其他工作进程在下次检索时比对版本号后重新加载，只使该课程的检索索引失效
+    
+    Args:
+        sender: 发送信号的对象
+        course_id (Optional[int]): 课程ID
+        **kwargs: 其他参数
+    """
+    # 代理工厂依赖知识库模块，在此处导入避免循环导入
+    from agents.agent.factory import agent_factory
+    
+    try:
+        agent_factory.refresh_knowledge(course_id)
+    except Exception as e:
+        logger.error(f"刷新检索索引时发生错误: {str(e)}")
+
+@receiver(knowledge_base_updated)
+def embed_updated_documents(sender, course_id=None, **kwargs):
+    """
+    知识库更新后在后台为内容变化的分块生成向量
+    
+    Args:
+        sender: 发送信号的对象
+        course_id (Optional[int]): 课程ID
+        **kwargs: 其他参数
+    """
+    if not EMBEDDING_CONFIG['EMBED_ON_UPDATE']:
+        return
+        
+    # 知识库模块导入本模块，在此处导入避免循环导入
+    from agents.knowledge_base.embedder import knowledge_base_embedder
+    
+    try:
+        knowledge_base_embedder.schedule(course_id)
+    except Exception as e:
+        logger.error(f"启动知识库文档向量生成时发生错误: {str(e)}")
+
+@receiver(knowledge_base_embedded)
+def refresh_dense_index(sender, course_id=None, **kwargs):
+    """
+    文档向量生成后重新加载相关课程的检索文档，使向量检索使用新的向量
+    
+    Args:
+        sender: 发送信号的对象
+        course_id (Optional[int]): 课程ID
+        **kwargs: 其他参数
+    """
+    if TOOLS_CONFIG['edusys_retriever']['mode'] != 'dense':
+        return
+        
+    from agents.agent.factory import agent_factory
+    
+    try:
+        agent_factory.refresh_knowledge(course_id)
+    except Exception as e:
+        logger.error(f"刷新向量检索索引时发生错误: {str(e)}")
+
+@receiver(post_save, sender=AgentConfig)
+@receiver(post_delete, sender=AgentConfig)
+def agent_config_changed(sender, instance, **kwargs):
+    """
+    代理配置修改后清空模型路由配置缓存，新的路由立即生效
+    
+    Args:
+        sender: 发送信号的模型类
+        instance: 修改的实例
+        **kwargs: 其他参数
+    """
+    model_router.clear()
+
 @receiver(post_save, sender=AIInteraction)
 def ai_interaction_saved(sender, instance, created, **kwargs):
     """
@@ -0,0 +1,86 @@
+"""
+AI 请求合并
+同一时刻对同一课程提出的相同问题只运行一次代理，其余请求等待并共享其结果
+"""
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """
+    正在执行的调用
+    """
+    def __init__(self):
+        self.future = Future()
+        self.dups = 0
+
+class SingleFlight:
+    """
+    请求合并类
+    以键区分调用，键相同的并发调用只执行第一次，其余调用等待并返回相同的结果或异常
+    """
+
+    def __init__(self):
+        """
+        初始化请求合并
+        """
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Tuple[Any, bool]:
+        """
+        执行调用，键相同的调用正在执行时等待其结果
+
+        Args:
+            key (Hashable): 调用键
+            fn (Callable): 调用函数
+            *args: 位置参数
+            timeout (Optional[float]): 等待其他调用结果的最长时间（秒）
+            **kwargs: 关键字参数
+
+        Returns:
+            Tuple[Any, bool]: (调用结果, 结果是否来自其他请求的调用)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.dups += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            logger.info(f"合并相同的 AI 请求: {key}")
+            return call.future.result(timeout=timeout), True
+
+        # 先移除键再通知等待的调用，收到异常后重新调用的请求不会再次加入已结束的调用
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._release(key)
+            call.future.set_exception(e)
+            raise
+        self._release(key)
+        call.future.set_result(result)
+        return result, False
+
+    def _release(self, key: Hashable):
+        """
+        移除已结束的调用
+        """
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        """
+        正在执行的调用数
+        """
+        return len(self._calls)
+
+# 全局 AI 请求合并实例（每个工作进程一个）
+ai_singleflight = SingleFlight()
@@ -1,15 +1,68 @@
 """
 AI 助手任务处理
 """
+import asyncio
 import logging
-from agents.agent.core import get_edusys_agent
+import time
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from django.db import connections, transaction
+from django.utils import timezone
+from agents.admission import admission_controller
+from agents.agent.pool import agent_pool
+from agents.agent.router import model_router
+from agents.cache import answer_cache
+from agents.conversation import schedule_summary
+from agents.deadline import Deadline, DeadlineExceeded, deadline_scope, partial_result
+from agents.config import BATCH_CONFIG
+from agents.embeddings import embed_query
+from agents.semantic_cache import semantic_answer_cache
+from agents.singleflight import ai_singleflight
+from agents.tracing import collect_trace, trace_recorder
+from agents.utils import context_fingerprint, normalize_query
+from agents.jobs import ai_async_queue, ai_job_queue
 from agents.models import AIInteraction
 from agents.knowledge_base import update_knowledge_base
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-def async_ai_process(prompt, context=None, agent_type='question_answering'):
+def get_cached_answer(prompt, context=None, agent_type='question_answering', query=None, mode=None):
+    """
+    查找缓存的回答
+    先按提示词精确匹配，再按用户提问的语义相似度匹配同一课程的历史回答；
+    命中时在 context 中标记 cache_hit，保存交互记录时据此记录
+    
+    Args:
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，为None时使用提示词
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Returns:
+        str: 缓存的回答，未命中时为None
+    """
+    course_id = (context or {}).get('course_id')
+    
+    # 相同课程的相同问题直接返回缓存的回答
+    cached = answer_cache.get(prompt, course_id, agent_type, mode, context)
+    
+    # 同一问题的不同问法复用历史回答（附带对话历史时回答依赖上下文，不按问题匹配）
+    if cached is None and agent_type == 'question_answering' and not (context or {}).get('with_history'):
+        hit = semantic_answer_cache.lookup(query or prompt, course_id)
+        if hit is not None:
+            cached = hit['response']
+            answer_cache.set(prompt, course_id, agent_type, cached, mode, context)
+            
+    if cached is not None:
+        logger.info(f"AI 回答缓存命中: {prompt[:50]}...")
+        if context is not None:
+            context['cache_hit'] = True
+            
+    return cached
+
+def async_ai_process(prompt, context=None, agent_type='question_answering', query=None, mode=None, deadline=None):
     """
     处理 AI 请求
     
@@ -17,17 +70,51 @@ def async_ai_process(prompt, context=None, agent_type='question_answering'):
         prompt (str): 提示词
         context (dict): 上下文信息
         agent_type (str): 代理类型
+        query (str): 用户原始提问，用于语义缓存和检索
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        deadline (Deadline): 截止时间，为None时从现在起按代理配置的 timeout 计时
         
     Returns:
         str: AI 处理结果
+        
+    Raises:
+        AdmissionRejected: 准入控制排队已满或等待超时
     """
     try:
-        # 创建 AI 代理
-        agent = get_edusys_agent(agent_type)
+        course_id = (context or {}).get('course_id')
         
-        # 执行处理
-        result = agent.run(prompt, context=context)
+        cached = get_cached_answer(prompt, context, agent_type, query, mode)
+        if cached is not None:
+            return cached
+            
+        # 截止时间覆盖排队、借出代理和代理运行的全过程
+        deadline = deadline or Deadline.for_agent(agent_type)
         
+        # 附带对话历史的提问各不相同，不合并请求
+        if (context or {}).get('with_history'):
+            return run_agent(prompt, context, agent_type, query, mode, deadline)
+            
+        # 同一课程的相同问题（回答方式和代理可见的上下文也相同）正在处理时等待其结果，不重复运行代理，
+        # 等待时间不超过本请求的截止时间；代理被停止时不共享部分结果，本请求未到截止时间时重新运行
+        key = (agent_type, course_id, mode, normalize_query(query or prompt), context_fingerprint(context))
+        while True:
+            try:
+                result, shared = ai_singleflight.do(
+                    key, _run_agent, prompt, context, agent_type, query, mode, deadline,
+                    timeout=deadline.remaining()
+                )
+                break
+            except FuturesTimeoutError as e:
+                if not deadline.stopped:
+                    raise
+                return _stopped_result(e, deadline, context)
+            except DeadlineExceeded as e:
+                if deadline.stopped:
+                    return _stopped_result(e, deadline, context)
+                logger.info(f"合并的 AI 请求已停止，重新运行: {key}")
+        if shared and context is not None:
+            context['cache_hit'] = True
+            
         logger.info(f"AI 处理完成: {prompt[:50]}...")
         return result
         
@@ -35,6 +122,263 @@ def async_ai_process(prompt, context=None, agent_type='question_answering'):
         logger.error(f"AI 处理过程中发生错误: {str(e)}")
         raise
 
+def _request_user(context=None):
+    """
+    提问的用户ID，用于准入控制排队
+    """
+    context = context or {}
+    return context.get('student_id') or context.get('user_id')
+
+def _history_prompt(prompt, context=None):
+    """
+    附带对话历史时返回完整提示词，供单次检索回答放入问题中；否则为None
+    """
+    return prompt if (context or {}).get('with_history') else None
+
+def _stopped_result(error, deadline, context=None):
+    """
+    代理运行超时或被取消时，用目前得到的部分结果作为回答，停止原因记录在 context 的 stop_reason 中
+    
+    Args:
+        error (Exception): 代理运行抛出的异常
+        deadline (Deadline): 截止时间
+        context (dict): 上下文信息
+        
+    Returns:
+        str: 回答
+    """
+    partial_answer = error.partial_answer if isinstance(error, DeadlineExceeded) else ''
+    logger.warning(f"AI 请求未能完成（{deadline.reason}），返回部分结果: {len(partial_answer)} 字")
+    if context is not None:
+        context['stop_reason'] = deadline.reason
+    return partial_result(deadline.reason, partial_answer)
+
+def _routed_model(agent, prompt, context=None, agent_type='question_answering', query=None):
+    """
+    按问题复杂程度选择模型，路由结果记录在 context 的 model_route 中
+    
+    Args:
+        agent (EduSysAgent): 借出的代理
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，用于判断复杂程度
+        
+    Returns:
+        ContextManager: 在上下文内使用所选模型
+    """
+    decision = model_router.route(query or prompt, agent_type, context)
+    if context is not None:
+        context['model_route'] = decision.to_dict()
+    return agent.use_model(model_router.get_model(decision))
+
+def _record_latency(context, start_time):
+    """
+    在 context 的 model_route 中记录代理处理耗时
+    """
+    if context is not None and 'model_route' in context:
+        context['model_route']['latency'] = time.perf_counter() - start_time
+
+def _query_embedding(query, context=None):
+    """
+    计算交互记录的提问向量，供语义缓存查找；超时或被取消的部分结果不作为语义缓存的候选，不计算向量
+    
+    Args:
+        query (str): 用户提问
+        context (dict): 上下文信息
+        
+    Returns:
+        Optional[List[float]]: 提问向量，不作为候选或向量模型不可用时为None
+    """
+    if not query or (context or {}).get('stop_reason'):
+        return None
+    return embed_query(query)
+
+def _route_fields(context):
+    """
+    取出 context 中的路由结果，转换为交互记录的字段；判断依据保留在 context 的 route_reason 中
+    
+    Args:
+        context (dict): 上下文信息（会被修改）
+        
+    Returns:
+        dict: model_route、model_id、latency 字段
+    """
+    model_route = context.pop('model_route', None)
+    if not model_route:
+        return {}
+    context['route_reason'] = model_route.get('reason', '')
+    return {
+        'model_route': model_route.get('route', ''),
+        'model_id': model_route.get('model_id') or '',
+        'latency': model_route.get('latency'),
+    }
+
+def run_agent(prompt, context=None, agent_type='question_answering', query=None, mode=None, deadline=None):
+    """
+    借出代理执行 AI 请求，并缓存回答
+    本次运行的追踪记录放入 context 的 run_trace，模型路由结果和耗时放入 context 的 model_route，
+    保存交互记录时一并写入；超时或被取消时返回部分结果，部分结果不缓存
+    
+    Args:
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，单次检索回答时用于检索
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        deadline (Deadline): 截止时间，为None时从现在起按代理配置的 timeout 计时
+        
+    Returns:
+        str: AI 处理结果
+    """
+    deadline = deadline or Deadline.for_agent(agent_type)
+    try:
+        return _run_agent(prompt, context, agent_type, query, mode, deadline)
+    except DeadlineExceeded as e:
+        return _stopped_result(e, deadline, context)
+
+def _run_agent(prompt, context=None, agent_type='question_answering', query=None, mode=None, deadline=None):
+    """
+    借出代理执行 AI 请求，并缓存回答；超时或被取消时抛出 DeadlineExceeded，
+    由调用方决定如何使用部分结果（合并的请求之间不共享部分结果）
+    
+    Args:
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，单次检索回答时用于检索
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        deadline (Deadline): 截止时间，为None时从现在起按代理配置的 timeout 计时
+        
+    Returns:
+        str: AI 处理结果
+        
+    Raises:
+        DeadlineExceeded: 代理运行超时或被取消，带有目前得到的部分结果
+    """
+    deadline = deadline or Deadline.for_agent(agent_type)
+    run_trace = None
+    
+    try:
+        # 在准入控制的运行名额内从代理池借出 AI 代理，执行完成后自动归还
+        with admission_controller.slot(_request_user(context), (context or {}).get('course_id'), deadline.remaining()), \
+             collect_trace(agent_type) as run_trace, deadline_scope(deadline):
+            with agent_pool.checkout(agent_type) as agent, \
+                 _routed_model(agent, prompt, context, agent_type, query):
+                start_time = time.perf_counter()
+                try:
+                    # 单次检索回答在检索置信度低时返回None，改用多步代理
+                    result = None
+                    if agent.get_answer_mode(mode) == 'rag':
+                        result = agent.answer_with_retrieval(query or prompt, (context or {}).get('course_id'), _history_prompt(prompt, context))
+                    if result is None:
+                        result = str(agent.run(prompt, context=context))
+                except Exception as e:
+                    if not deadline.stopped:
+                        raise
+                    partial_answer = e.partial_answer if isinstance(e, DeadlineExceeded) else ''
+                    raise DeadlineExceeded(deadline.reason, partial_answer) from e
+                finally:
+                    _record_latency(context, start_time)
+    finally:
+        if context is not None and run_trace is not None:
+            context['run_trace'] = run_trace
+            
+    answer_cache.set(prompt, (context or {}).get('course_id'), agent_type, result, mode, context)
+    return result
+
+async def aprocess_ai(prompt, context=None, agent_type='question_answering', query=None, mode=None):
+    """
+    异步处理 AI 请求
+    smolagents 的 CodeAgent 只提供同步接口，代理在异步请求专用的线程池中执行，
+    调用方的事件循环在等待期间不被阻塞；后台任务队列的工作线程留给后台任务、会话摘要和批量分析
+    
+    Args:
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，用于语义缓存和检索
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Returns:
+        str: AI 处理结果
+        
+    Raises:
+        JobQueueFull: 异步请求线程池排队已满
+        AdmissionRejected: 准入控制排队已满或等待超时
+    """
+    deadline = Deadline.for_agent(agent_type)
+    future = ai_async_queue.submit(async_ai_process, prompt, context, agent_type, query, mode, deadline)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # 客户端断开连接时视图被取消，同时中断后台线程中的代理，尽快释放代理和运行名额
+        deadline.cancel()
+        raise
+
+def stream_ai_process(prompt, context=None, agent_type='question_answering', query=None, mode=None):
+    """
+    流式处理 AI 请求
+    代理在生成器结束或被关闭（如客户端断开连接）时停止运行并归还代理池；
+    超时时以部分结果作为最终回答
+    
+    Args:
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，用于语义缓存和检索
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Yields:
+        dict: 代理执行事件
+    """
+    try:
+        course_id = (context or {}).get('course_id')
+        
+        # 缓存命中时直接产出最终回答
+        cached = get_cached_answer(prompt, context, agent_type, query, mode)
+        if cached is not None:
+            yield {"event": "final_answer", "data": {"response": cached, "cached": True}}
+            return
+            
+        deadline = Deadline.for_agent(agent_type)
+        with admission_controller.slot(_request_user(context), course_id, deadline.remaining()), \
+             collect_trace(agent_type) as run_trace:
+            with agent_pool.checkout(agent_type) as agent, \
+                 _routed_model(agent, prompt, context, agent_type, query):
+                start_time = time.perf_counter()
+                try:
+                    answer = None
+                    if agent.get_answer_mode(mode) == 'rag':
+                        with deadline_scope(deadline):
+                            answer = agent.answer_with_retrieval(query or prompt, course_id, _history_prompt(prompt, context))
+                            
+                    if answer is not None:
+                        answer_cache.set(prompt, course_id, agent_type, answer, mode, context)
+                        yield {"event": "final_answer", "data": {"response": answer}}
+                    else:
+                        for event in agent.run_stream(prompt, context=context, deadline=deadline):
+                            if event["event"] == "final_answer":
+                                answer_cache.set(prompt, course_id, agent_type, event["data"]["response"], mode, context)
+                            yield event
+                except Exception as e:
+                    if not deadline.stopped:
+                        raise
+                    yield {
+                        "event": "final_answer",
+                        "data": {"response": _stopped_result(e, deadline, context), "stop_reason": deadline.reason}
+                    }
+                _record_latency(context, start_time)
+                
+        if context is not None:
+            context['run_trace'] = run_trace
+            
+        logger.info(f"AI 流式处理完成: {prompt[:50]}...")
+        
+    except Exception as e:
+        logger.error(f"AI 流式处理过程中发生错误: {str(e)}")
+        raise
+
 def async_course_analysis(course_id, analysis_type="comprehensive"):
     """
     处理课程分析请求
@@ -47,11 +391,9 @@ def async_course_analysis(course_id, analysis_type="comprehensive"):
         str: 分析结果
     """
     try:
-        # 创建课程分析代理
-        agent = get_edusys_agent('course_analysis')
-        
-        # 执行分析
-        result = agent.analyze_course(course_id, analysis_type)
+        # 从代理池借出课程分析代理
+        with agent_pool.checkout('course_analysis') as agent:
+            result = agent.analyze_course(course_id, analysis_type)
         
         logger.info(f"课程分析完成: 课程 {course_id}")
         return result
@@ -77,6 +419,13 @@ def save_ai_interaction(user_id, course_id, query, response, interaction_type, c
         int: 交互记录ID
     """
     try:
+        context = dict(context or {})
+        cache_hit = context.pop('cache_hit', False)
+        run_trace = context.pop('run_trace', None)
+        session_id = context.pop('session_id', None)
+        context.pop('with_history', None)
+        route_fields = _route_fields(context)
+        
         # 创建交互记录
         interaction = AIInteraction.objects.create(
             user_id=user_id,
@@ -84,9 +433,291 @@ def save_ai_interaction(user_id, course_id, query, response, interaction_type, c
             query=query,
             response=response,
             interaction_type=interaction_type,
-            context=context or {}
+            context=context,
+            query_embedding=_query_embedding(query, context),
+            cache_hit=cache_hit,
+            session_id=session_id,
+            **route_fields
         )
         
+        # 代理步骤和工具使用记录由后台线程批量写入
+        trace_recorder.record(interaction.id, run_trace)
+        
+        # 会话中较早的对话由后台任务合并到摘要
+        schedule_summary(session_id)
+        
+        logger.info(f"保存 AI 交互记录完成: {interaction.id}")
+        return interaction.id
+        
+    except Exception as e:
+        logger.error(f"保存 AI 交互记录时发生错误: {str(e)}")
+        raise
+
+def run_ai_batch(user_id, course_id, questions, interaction_type='question', agent_type='question_answering', max_concurrency=None, mode=None):
+    """
+    批量处理同一课程的多个问题
+    问题在有界线程池中并发执行，共享代理池和检索索引，全部完成后批量保存交互记录
+    
+    Args:
+        user_id (int): 用户ID
+        course_id (int): 课程ID
+        questions (list): 问题列表
+        interaction_type (str): 交互类型
+        agent_type (str): 代理类型
+        max_concurrency (int): 同时处理的问题数
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Returns:
+        list: 每个问题的处理结果，顺序与问题列表一致
+    """
+    max_concurrency = max(1, min(max_concurrency or BATCH_CONFIG['MAX_CONCURRENCY'], len(questions)))
+    
+    # 预先构建代理和共享检索索引，避免并发请求同时构建
+    agent_pool.warm_up([agent_type], count=max_concurrency)
+    
+    def run_one(index, question):
+        context = {
+            "course_id": course_id,
+            "student_id": user_id
+        }
+        item = {
+            "index": index,
+            "query": question,
+            "context": context,
+            "status": "completed",
+            "response": "",
+            "error": None,
+        }
+        start_time = time.perf_counter()
+        try:
+            item["response"] = async_ai_process(f"关于课程{course_id}的问题：{question}", context, agent_type, question, mode)
+        except Exception as e:
+            logger.error(f"批量提问第 {index + 1} 个问题处理失败: {str(e)}")
+            item["status"] = "failed"
+            item["error"] = str(e)
+        finally:
+            item["duration"] = time.perf_counter() - start_time
+            # 关闭工作线程的数据库连接
+            connections.close_all()
+        return item
+        
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ai-batch') as executor:
+        items = list(executor.map(run_one, range(len(questions)), questions))
+        
+    interaction_ids = save_ai_interactions(user_id, course_id, items, interaction_type)
+    for item, interaction_id in zip(items, interaction_ids):
+        item["interaction_id"] = interaction_id
+        item["cache_hit"] = bool(item["context"].get('cache_hit'))
+        
+    logger.info(f"批量提问完成: 课程 {course_id}，共 {len(items)} 个问题")
+    return items
+
+def save_ai_interactions(user_id, course_id, items, interaction_type):
+    """
+    批量保存 AI 交互记录
+    
+    Args:
+        user_id (int): 用户ID
+        course_id (int): 课程ID
+        items (list): 处理结果列表，包含 query、response、context、status、error
+        interaction_type (str): 交互类型
+        
+    Returns:
+        list: 交互记录ID列表，顺序与处理结果一致
+    """
+    now = timezone.now()
+    interactions = []
+    run_traces = []
+    
+    for item in items:
+        context = dict(item["context"])
+        cache_hit = context.pop('cache_hit', False)
+        run_traces.append(context.pop('run_trace', None))
+        route_fields = _route_fields(context)
+        
+        interactions.append(AIInteraction(
+            user_id=user_id,
+            course_id=course_id,
+            query=item["query"],
+            response=item["response"],
+            interaction_type=interaction_type,
+            context=context,
+            status=item["status"],
+            error_message=item["error"] or '',
+            completed_at=now,
+            query_embedding=_query_embedding(item["query"], context) if item["status"] == 'completed' else None,
+            cache_hit=cache_hit,
+            **route_fields
+        ))
+        
+    interactions = AIInteraction.objects.bulk_create(interactions)
+    
+    for interaction, run_trace in zip(interactions, run_traces):
+        trace_recorder.record(interaction.id, run_trace)
+        
+    logger.info(f"批量保存 AI 交互记录完成: {len(interactions)} 条")
+    return [interaction.id for interaction in interactions]
+
+def run_ai_job(interaction_id, prompt, context=None, agent_type='question_answering', query=None, mode=None):
+    """
+    执行后台 AI 任务，并将状态和结果写回交互记录
+    
+    Args:
+        interaction_id (int): 交互记录ID
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，用于语义缓存和检索
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Returns:
+        str: AI 处理结果，失败时为None
+    """
+    AIInteraction.objects.filter(id=interaction_id).update(status='running', started_at=timezone.now())
+    context = dict(context or {})
+    
+    try:
+        response = async_ai_process(prompt, context, agent_type, query, mode)
+    except Exception as e:
+        logger.error(f"后台 AI 任务 {interaction_id} 执行失败: {str(e)}")
+        AIInteraction.objects.filter(id=interaction_id).update(
+            status='failed',
+            error_message=str(e),
+            completed_at=timezone.now()
+        )
+        return None
+        
+    AIInteraction.objects.filter(id=interaction_id).update(
+        status='completed',
+        response=response,
+        query_embedding=_query_embedding(query, context),
+        cache_hit=context.get('cache_hit', False),
+        completed_at=timezone.now(),
+        **_route_fields(context)
+    )
+    trace_recorder.record(interaction_id, context.get('run_trace'))
+    schedule_summary(context.get('session_id'))
+    logger.info(f"后台 AI 任务 {interaction_id} 执行完成")
+    return response
+
+def submit_ai_job(interaction_id, prompt, context=None, agent_type='question_answering', query=None, mode=None):
+    """
+    将已创建的交互记录提交到后台任务队列
+    
+    Args:
+        interaction_id (int): 交互记录ID
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        query (str): 用户原始提问，用于语义缓存和检索
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Returns:
+        Future: 任务结果
+        
+    Raises:
+        JobQueueFull: 任务队列已满
+    """
+    AIInteraction.objects.filter(id=interaction_id).update(status='pending')
+    return ai_job_queue.submit(run_ai_job, interaction_id, prompt, context, agent_type, query, mode)
+
+def create_ai_job(user_id, course_id, query, prompt, interaction_type, context=None, agent_type='question_answering', mode=None):
+    """
+    创建交互记录并提交后台 AI 任务
+    提问速率在提交时由调用方检查（admission_controller.check_rate，超出时返回 429），
+    任务运行时不再计入速率，运行并发仍由运行代理时的准入控制排队限制
+    
+    Args:
+        user_id (int): 用户ID
+        course_id (int): 课程ID
+        query (str): 用户提问
+        prompt (str): 提示词
+        interaction_type (str): 交互类型
+        context (dict): 上下文信息
+        agent_type (str): 代理类型
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Returns:
+        int: 交互记录ID（即任务ID）
+        
+    Raises:
+        JobQueueFull: 任务队列已满（在事务中调用时，提交事务时才提交任务，队列已满的异常在提交事务时抛出）
+    """
+    saved_context = dict(context or {})
+    session_id = saved_context.pop('session_id', None)
+    saved_context.pop('with_history', None)
+    
+    interaction = AIInteraction.objects.create(
+        user_id=user_id,
+        course_id=course_id,
+        query=query,
+        response='',
+        interaction_type=interaction_type,
+        context=saved_context,
+        status='pending',
+        session_id=session_id
+    )
+    
+    def submit():
+        try:
+            ai_job_queue.submit(run_ai_job, interaction.id, prompt, context, agent_type, query, mode)
+        except Exception:
+            # 未能进入队列的任务不保留记录
+            interaction.delete()
+            raise
+            
+    # 交互记录提交到数据库后再提交任务，避免后台线程查不到尚未提交的记录；
+    # 不在事务中时立即提交
+    transaction.on_commit(submit)
+    
+    logger.info(f"后台 AI 任务已提交: {interaction.id}")
+    return interaction.id
+
+async def asave_ai_interaction(user_id, course_id, query, response, interaction_type, context=None):
+    """
+    异步保存 AI 交互记录
+    
+    Args:
+        user_id (int): 用户ID
+        course_id (int): 课程ID
+        query (str): 用户提问
+        response (str): AI 回答
+        interaction_type (str): 交互类型
+        context (dict): 上下文信息
+        
+    Returns:
+        int: 交互记录ID
+    """
+    try:
+        context = dict(context or {})
+        cache_hit = context.pop('cache_hit', False)
+        run_trace = context.pop('run_trace', None)
+        session_id = context.pop('session_id', None)
+        context.pop('with_history', None)
+        route_fields = _route_fields(context)
+        
+        # 向量模型推理是同步调用，在线程池中执行，不阻塞事件循环
+        query_embedding = await sync_to_async(_query_embedding, thread_sensitive=False)(query, context)
+        
+        interaction = await AIInteraction.objects.acreate(
+            user_id=user_id,
+            course_id=course_id,
+            query=query,
+            response=response,
+            interaction_type=interaction_type,
+            context=context,
+            query_embedding=query_embedding,
+            cache_hit=cache_hit,
+            session_id=session_id,
+            **route_fields
+        )
+        
+        # 代理步骤和工具使用记录由后台线程批量写入
+        trace_recorder.record(interaction.id, run_trace)
+        
+        # 会话中较早的对话由后台任务合并到摘要
+        await sync_to_async(schedule_summary)(session_id)
+        
         logger.info(f"保存 AI 交互记录完成: {interaction.id}")
         return interaction.id
         
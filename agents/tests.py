@@ -2,7 +2,9 @@
 AI 助手应用测试
 """
 import json
-from django.test import TestCase
+from unittest import mock
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -213,4 +215,2258 @@ class AgentsTestCase(TestCase):
         # 检查反馈是否保存
         interaction.refresh_from_db()
         self.assertEqual(interaction.feedback_score, 5)
-        self.assertEqual(interaction.feedback_comment, '很满意')
\ No newline at end of file
+        self.assertEqual(interaction.feedback_comment, '很满意')
+
+class AgentPoolTestCase(TestCase):
+    """
+    AI 代理池测试用例
+    """
+    
+    class FakeAgent:
+        """
+        测试用代理，只记录构建和重置次数
+        """
+        def __init__(self, agent_type):
+            self.agent_type = agent_type
+            self.reset_count = 0
+            
+        def reset(self):
+            self.reset_count += 1
+            
+    def test_checkout_reuses_agent(self):
+        """
+        测试归还后的代理被复用并在归还时重置
+        """
+        from agents.agent.pool import AgentPool
+        
+        built = []
+        pool = AgentPool(size=2, agent_builder=lambda t: built.append(t) or self.FakeAgent(t))
+        
+        with pool.checkout('question_answering') as first:
+            pass
+        with pool.checkout('question_answering') as second:
+            pass
+            
+        self.assertIs(first, second)
+        self.assertEqual(len(built), 1)
+        self.assertEqual(first.reset_count, 2)
+        
+    def test_pool_exhausted(self):
+        """
+        测试代理池已满时等待超时
+        """
+        from agents.agent.pool import AgentPool, AgentPoolExhausted
+        
+        pool = AgentPool(size=1, checkout_timeout=0.01, agent_builder=self.FakeAgent)
+        
+        with pool.checkout('course_analysis'):
+            with self.assertRaises(AgentPoolExhausted):
+                pool.acquire('course_analysis')
+                
+        self.assertEqual(pool.stats()['course_analysis'], {'created': 1, 'idle': 1})
+
+
+class KnowledgeBaseLoadTestCase(TestCase):
+    """
+    知识库只读加载测试用例
+    """
+    
+    def test_factory_init_has_no_queries(self):
+        """
+        测试创建代理工厂时不访问数据库
+        """
+        from agents.agent.factory import AgentFactory
+        
+        with self.assertNumQueries(0):
+            AgentFactory()
+    
+    def test_load_existing_documents_read_only(self):
+        """
+        测试从数据库只读加载已构建的知识库
+        """
+        from agents.models import KnowledgeDocument
+        from agents.knowledge_base import load_knowledge_base
+        
+        KnowledgeDocument.objects.create(
+            source_type='announcement',
+            source_id=1,
+            chunk_index=0,
+            content='期末考试在第十八周',
+            metadata={'source_type': 'announcement', 'course_id': 1}
+        )
+        
+        with self.assertNumQueries(1):
+            docs = load_knowledge_base()
+        
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].page_content, '期末考试在第十八周')
+        self.assertEqual(docs[0].metadata['course_id'], 1)
+
+
+
+class AIAssistantStreamTestCase(TestCase):
+    """
+    AI 助手流式接口测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        self.user = get_user_model().objects.create_user(
+            username='streamuser',
+            password='testpass123',
+            user_id='S001'
+        )
+        self.client.force_login(self.user)
+        
+    def test_general_stream_saves_interaction(self):
+        """
+        测试通用 AI 助手流式接口产出事件并保存交互记录
+        """
+        events = [
+            {"event": "step", "data": {"step_number": 1}},
+            {"event": "final_answer", "data": {"response": "第十八周考试"}},
+        ]
+        
+        with mock.patch('agents.tasks.stream_ai_process', return_value=iter(events)):
+            response = self.client.post(
+                reverse('agents:general_ai_assistant_stream'),
+                data=json.dumps({'query': '什么时候考试'}),
+                content_type='application/json'
+            )
+            body = b''.join(response.streaming_content).decode('utf-8')
+            
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: step', body)
+        self.assertIn('event: done', body)
+        
+        interaction = AIInteraction.objects.get(user=self.user)
+        self.assertEqual(interaction.response, '第十八周考试')
+        self.assertIsNone(interaction.course)
+        
+    def test_model_deltas_not_streamed_as_answer(self):
+        """
+        测试模型的中间输出（思考过程和代码）作为 thinking 事件产出，回答只来自最终答案
+        """
+        from smolagents.memory import FinalAnswerStep
+        from smolagents.models import ChatMessageStreamDelta
+        from agents.agent.core import EduSysAgent
+        from agents.deadline import Deadline
+        
+        agent = EduSysAgent.__new__(EduSysAgent)
+        agent.agent = mock.Mock()
+        agent.agent.run.return_value = (step for step in [
+            ChatMessageStreamDelta(content="Thought: 检索课程资料\nCode:\n```py\nedusys_retriever(query='考试')\n```"),
+            FinalAnswerStep(output='第十八周考试'),
+        ])
+        
+        events = list(agent._stream_events('什么时候考试', Deadline(10)))
+        
+        self.assertEqual([event['event'] for event in events], ['thinking', 'final_answer'])
+        self.assertEqual(events[-1]['data']['response'], '第十八周考试')
+        
+    def test_bookkeeping_fields_not_in_prompt(self):
+        """
+        测试模型路由、会话等请求处理过程中写入上下文的字段和提问者的身份不放入代理的提示词
+        """
+        from agents import tasks
+        from agents.agent.core import EduSysAgent
+        
+        agent = EduSysAgent.__new__(EduSysAgent)
+        agent.agent_type = 'question_answering'
+        agent.agent = mock.Mock()
+        agent.agent.run.return_value = '第十八周考试'
+        agent.use_model = mock.MagicMock()
+        agent.get_answer_mode = mock.Mock(return_value='agent')
+        context = {'course_id': 1, 'student_id': 'S001', 'session_id': 3, 'with_history': True}
+        
+        with mock.patch('agents.tasks.agent_pool') as pool:
+            pool.checkout.return_value.__enter__.return_value = agent
+            tasks.run_agent('关于课程1的问题：什么时候考试', context, query='什么时候考试')
+            
+        prompt = agent.agent.run.call_args[0][0]
+        self.assertIn("'course_id': 1", prompt)
+        for key in ('model_route', 'session_id', 'with_history', 'student_id'):
+            self.assertNotIn(key, prompt)
+        self.assertIn('model_route', context)
+
+
+
+class AIJobQueueTestCase(TestCase):
+    """
+    AI 后台任务测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        self.user = get_user_model().objects.create_user(
+            username='jobuser',
+            password='testpass123',
+            user_id='J001'
+        )
+        self.client.force_login(self.user)
+        
+    def test_async_ask_returns_accepted_and_completes(self):
+        """
+        测试默认提交后台任务并返回 202，任务完成后可查询到回答
+        """
+        run_inline = lambda fn, *args, **kwargs: fn(*args, **kwargs)
+        
+        with mock.patch('agents.tasks.ai_job_queue.submit', side_effect=run_inline), \
+                mock.patch('agents.tasks.async_ai_process', return_value='第十八周考试'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('agents:general_ai_assistant'),
+                data=json.dumps({'query': '什么时候考试'}),
+                content_type='application/json'
+            )
+            
+        self.assertEqual(response.status_code, 202)
+        task_id = response.json()['data']['task_id']
+        
+        response = self.client.get(reverse('agents:ai_interaction_status', kwargs={'interaction_id': task_id}))
+        data = response.json()['data']
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual(data['response'], '第十八周考试')
+        
+    def test_job_submitted_after_commit(self):
+        """
+        测试在事务中创建任务时，提交事务后才把任务放入队列
+        """
+        from agents import tasks
+        
+        with mock.patch('agents.tasks.ai_job_queue.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                interaction_id = tasks.create_ai_job(self.user.id, None, '什么时候考试', '用户问题：什么时候考试', 'question')
+                submit.assert_not_called()
+                
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(submit.call_args[0][1], interaction_id)
+        
+    def test_api_create_submitted_after_commit(self):
+        """
+        测试通过 API 创建交互记录时，提交事务后才把任务放入队列
+        """
+        course = Course.objects.create(name='任务测试课程', teacher='张老师')
+        self.user.is_superuser = True
+        self.user.save()
+        
+        with mock.patch('agents.tasks.ai_job_queue.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = self.client.post(
+                    reverse('agents:agents_api:aiinteraction-list'),
+                    data=json.dumps({'course': course.id, 'query': '什么时候考试', 'interaction_type': 'question'}),
+                    content_type='application/json'
+                )
+                submit.assert_not_called()
+                
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(submit.call_args[0][1], response.json()['task_id'])
+        self.assertEqual(submit.call_args[0][3]['course_id'], course.id)
+        
+    def test_queue_full(self):
+        """
+        测试任务队列已满时拒绝提交
+        """
+        from agents.jobs import AIJobQueue, JobQueueFull
+        import threading
+        
+        release = threading.Event()
+        queue = AIJobQueue(max_workers=1, max_pending=1)
+        future = queue.submit(release.wait)
+        
+        with self.assertRaises(JobQueueFull):
+            queue.submit(release.wait)
+            
+        release.set()
+        future.result(timeout=5)
+        queue.shutdown()
+        self.assertEqual(queue.pending, 0)
+        
+    def test_async_requests_not_blocked_by_background_jobs(self):
+        """
+        测试异步视图的 AI 请求使用单独的线程池，后台任务占满工作线程时仍能执行
+        """
+        from agents import tasks
+        from agents.jobs import AIJobQueue
+        import asyncio
+        import threading
+        
+        release = threading.Event()
+        background = AIJobQueue(max_workers=1, max_pending=1)
+        background.submit(release.wait)
+        async_queue = AIJobQueue(max_workers=2, max_pending=10, name='ai-async')
+        
+        try:
+            with mock.patch('agents.tasks.ai_job_queue', background), \
+                    mock.patch('agents.tasks.ai_async_queue', async_queue), \
+                    mock.patch('agents.tasks.async_ai_process', side_effect=lambda *args: threading.current_thread().name):
+                thread_name = asyncio.run(asyncio.wait_for(tasks.aprocess_ai('什么时候考试'), timeout=5))
+        finally:
+            release.set()
+            background.shutdown()
+            async_queue.shutdown()
+            
+        self.assertTrue(thread_name.startswith('ai-async'))
+
+
+
+class AsyncViewsTestCase(TestCase):
+    """
+    AI 助手异步视图测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        self.user = get_user_model().objects.create_user(
+            username='asyncuser',
+            password='testpass123',
+            user_id='A001'
+        )
+        
+    async def test_async_general_ask_and_history(self):
+        """
+        测试异步提问后可在异步历史接口中查询到记录
+        """
+        await self.async_client.aforce_login(self.user)
+        
+        with mock.patch('agents.tasks.aprocess_ai', new=mock.AsyncMock(return_value='异步回答')):
+            response = await self.async_client.post(
+                reverse('agents:async_general_ai_assistant'),
+                data=json.dumps({'query': '异步问题'}),
+                content_type='application/json'
+            )
+            
+        self.assertEqual(response.status_code, 200)
+        interaction_id = response.json()['data']['interaction_id']
+        
+        response = await self.async_client.get(reverse('agents:async_ai_interactions_history'))
+        self.assertEqual(response.json()['count'], 1)
+        
+        response = await self.async_client.get(
+            reverse('agents:async_ai_interaction_detail', kwargs={'interaction_id': interaction_id})
+        )
+        self.assertEqual(response.json()['data']['response'], '异步回答')
+        
+    async def test_save_embeds_query_off_event_loop(self):
+        """
+        测试异步保存交互记录时提问向量在线程池中计算，不占用事件循环线程
+        """
+        from agents import tasks
+        import threading
+        
+        embed_threads = []
+        
+        def embed(text):
+            embed_threads.append(threading.current_thread())
+            return [1.0, 0.0]
+            
+        with mock.patch('agents.tasks.embed_query', side_effect=embed):
+            interaction_id = await tasks.asave_ai_interaction(self.user.id, None, '异步问题', '异步回答', 'question')
+            
+        self.assertEqual(len(embed_threads), 1)
+        self.assertIsNot(embed_threads[0], threading.current_thread())
+        interaction = await AIInteraction.objects.aget(id=interaction_id)
+        self.assertEqual(interaction.query_embedding, [1.0, 0.0])
+
+class AnswerCacheTestCase(TestCase):
+    """
+    AI 回答缓存测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        from agents.cache import AnswerCache
+        from django.core.cache import cache
+        cache.clear()
+        self.answer_cache = AnswerCache(timeout=60, local_max_entries=8, prefix='test_answer_')
+        
+    def test_normalized_query_hits_cache(self):
+        """
+        测试大小写、标点和空白不同的同一问题命中缓存
+        """
+        self.answer_cache.set('What is Django?', 1, 'question_answering', '一个 Web 框架')
+        
+        self.assertEqual(self.answer_cache.get('  what is django ', 1, 'question_answering'), '一个 Web 框架')
+        self.assertIsNone(self.answer_cache.get('What is Django?', 2, 'question_answering'))
+        
+    def test_knowledge_base_update_invalidates_course(self):
+        """
+        测试知识库更新信号使对应课程的缓存失效
+        """
+        from agents.signals import knowledge_base_updated
+        
+        self.answer_cache.set('作业什么时候截止', 1, 'question_answering', '下周五')
+        self.answer_cache.set('作业什么时候截止', 2, 'question_answering', '下周一')
+        
+        with mock.patch('agents.signals.answer_cache', self.answer_cache):
+            knowledge_base_updated.send(sender=self.__class__, course_id=1)
+            
+        self.assertIsNone(self.answer_cache.get('作业什么时候截止', 1, 'question_answering'))
+        self.assertEqual(self.answer_cache.get('作业什么时候截止', 2, 'question_answering'), '下周一')
+        
+    def test_cache_shared_across_users_not_modes(self):
+        """
+        测试不同学生的相同问题共享缓存，回答方式或代理可见的上下文不同时不共享
+        """
+        self.answer_cache.set('作业什么时候截止', 1, 'question_answering', '下周五', 'agent',
+                              {'course_id': 1, 'student_id': 'S001'})
+                              
+        self.assertEqual(self.answer_cache.get('作业什么时候截止', 1, 'question_answering', 'agent',
+                                               {'course_id': 1, 'student_id': 'S002'}), '下周五')
+        self.assertIsNone(self.answer_cache.get('作业什么时候截止', 1, 'question_answering', 'rag',
+                                                {'course_id': 1, 'student_id': 'S002'}))
+        self.assertIsNone(self.answer_cache.get('作业什么时候截止', 1, 'question_answering', 'agent',
+                                                {'course_id': 1, 'interaction_type': 'assignment'}))
+                                                
+    def test_local_hit_skips_shared_cache(self):
+        """
+        测试进程内缓存命中时不访问共享缓存
+        """
+        self.answer_cache.set('作业什么时候截止', 1, 'question_answering', '下周五')
+        
+        with mock.patch('agents.cache.caches') as caches:
+            self.assertEqual(self.answer_cache.get('作业什么时候截止', 1, 'question_answering'), '下周五')
+            
+        caches.__getitem__.assert_not_called()
+        
+    def test_invalidation_from_other_process(self):
+        """
+        测试其他进程递增知识库版本号后，本进程在版本号的进程内缓存过期后不再命中旧回答
+        """
+        from agents.cache import AnswerCache
+        import time
+        
+        other_process = AnswerCache(timeout=60, prefix='test_answer_')
+        self.answer_cache.set('作业什么时候截止', 1, 'question_answering', '下周五')
+        other_process.invalidate(1)
+        
+        self.assertEqual(self.answer_cache.get('作业什么时候截止', 1, 'question_answering'), '下周五')
+        with mock.patch('agents.cache.time.monotonic', return_value=time.monotonic() + self.answer_cache.versions.ttl + 1):
+            self.assertIsNone(self.answer_cache.get('作业什么时候截止', 1, 'question_answering'))
+
+class SemanticAnswerCacheTestCase(TestCase):
+    """
+    AI 语义回答缓存测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        from django.core.cache import cache
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='semanticuser',
+            password='testpass123',
+            user_id='S001'
+        )
+        self.vectors = {
+            '怎么提交作业': [1.0, 0.0, 0.0],
+            '作业如何提交': [0.99, 0.1, 0.0],
+            '考试时间是什么时候': [0.0, 1.0, 0.0],
+        }
+        
+    def embed(self, text):
+        """
+        测试用的向量化函数
+        """
+        return self.vectors.get(text)
+        
+    def test_paraphrase_reuses_answer(self):
+        """
+        测试语义相近的问题复用历史回答并记录缓存命中
+        """
+        from agents import tasks
+        
+        with mock.patch('agents.semantic_cache.embed_query', side_effect=self.embed), \
+             mock.patch('agents.tasks.embed_query', side_effect=self.embed), \
+             mock.patch('agents.tasks.agent_pool') as pool:
+            pool.checkout.return_value.__enter__.return_value.run.return_value = '在作业页面上传文件'
+            
+            context = {}
+            response = tasks.async_ai_process('用户问题：怎么提交作业', context, query='怎么提交作业')
+            tasks.save_ai_interaction(self.user.id, None, '怎么提交作业', response, 'question', context)
+            
+            context = {}
+            response = tasks.async_ai_process('用户问题：作业如何提交', context, query='作业如何提交')
+            tasks.save_ai_interaction(self.user.id, None, '作业如何提交', response, 'question', context)
+            
+            context = {}
+            tasks.async_ai_process('用户问题：考试时间是什么时候', context, query='考试时间是什么时候')
+            
+        self.assertEqual(pool.checkout.call_count, 2)
+        self.assertEqual(response, '在作业页面上传文件')
+        hit = AIInteraction.objects.get(query='作业如何提交')
+        self.assertTrue(hit.cache_hit)
+        self.assertNotIn('cache_hit', hit.context)
+        
+    def test_knowledge_base_update_invalidates_semantic_cache(self):
+        """
+        测试知识库更新后不再复用更新前的回答
+        """
+        from agents.semantic_cache import semantic_answer_cache
+        from agents.signals import knowledge_base_updated
+        
+        AIInteraction.objects.create(
+            user=self.user,
+            query='怎么提交作业',
+            response='旧回答',
+            interaction_type='question',
+            query_embedding=[1.0, 0.0, 0.0]
+        )
+        
+        with mock.patch('agents.semantic_cache.embed_query', side_effect=self.embed):
+            self.assertEqual(semantic_answer_cache.lookup('作业如何提交', None)['response'], '旧回答')
+            knowledge_base_updated.send(sender=self.__class__, course_id=None)
+            self.assertIsNone(semantic_answer_cache.lookup('作业如何提交', None))
+
+class SingleFlightTestCase(TestCase):
+    """
+    AI 请求合并测试用例
+    """
+    
+    def test_concurrent_duplicates_share_result(self):
+        """
+        测试键相同的并发调用只执行一次
+        """
+        import threading
+        import time
+        from agents.singleflight import SingleFlight
+        
+        single_flight = SingleFlight()
+        key = ('question_answering', 1, None, '怎么提交作业', '{"course_id": 1}')
+        follower_results = []
+        duplicate = mock.Mock(return_value='重复执行')
+        
+        def follower():
+            follower_results.append(single_flight.do(key, duplicate))
+            
+        def leader():
+            thread = threading.Thread(target=follower)
+            thread.start()
+            # 等待跟随者进入等待状态后再返回结果
+            deadline = time.monotonic() + 5
+            while single_flight._calls[key].dups == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            leader.thread = thread
+            return '在作业页面上传文件'
+            
+        result, shared = single_flight.do(key, leader)
+        leader.thread.join(timeout=5)
+        
+        self.assertEqual((result, shared), ('在作业页面上传文件', False))
+        self.assertEqual(follower_results, [('在作业页面上传文件', True)])
+        duplicate.assert_not_called()
+        self.assertEqual(single_flight.in_flight(), 0)
+        
+    def test_leader_error_propagates(self):
+        """
+        测试执行失败时异常传递给调用方且键被释放
+        """
+        from agents.singleflight import SingleFlight
+        
+        single_flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            single_flight.do('key', mock.Mock(side_effect=ValueError('失败')))
+            
+        self.assertEqual(single_flight.do('key', lambda: '成功'), ('成功', False))
+        
+    def test_follower_wait_bounded_by_deadline(self):
+        """
+        测试等待相同请求结果的时间不超过本请求的截止时间，超时后返回本请求的超时结果
+        """
+        from agents import tasks
+        from agents.deadline import Deadline, STOP_TIMEOUT, partial_result
+        from agents.singleflight import SingleFlight, _Call
+        
+        single_flight = SingleFlight()
+        # 相同问题正在处理且一直没有结果
+        single_flight._calls[('question_answering', 1, None, '怎么提交作业', '{"course_id": 1}')] = _Call()
+        context = {'course_id': 1}
+        
+        with mock.patch('agents.tasks.ai_singleflight', single_flight), \
+                mock.patch('agents.tasks.get_cached_answer', return_value=None), \
+                mock.patch('agents.tasks._run_agent') as run_agent:
+            result = tasks.async_ai_process('怎么提交作业', context, query='怎么提交作业', deadline=Deadline(0.1))
+            
+        self.assertEqual(result, partial_result(STOP_TIMEOUT))
+        self.assertEqual(context['stop_reason'], STOP_TIMEOUT)
+        run_agent.assert_not_called()
+        
+    def test_stopped_result_not_shared(self):
+        """
+        测试合并请求中先运行的代理被取消时，部分结果不共享给等待的请求，等待的请求重新运行
+        """
+        import threading
+        import time
+        from agents import tasks
+        from agents.deadline import Deadline, DeadlineExceeded, STOP_CANCELLED, partial_result
+        from agents.singleflight import SingleFlight
+        
+        single_flight = SingleFlight()
+        key = ('question_answering', 1, None, '怎么提交作业', '{"course_id": 1}')
+        leader_deadline = Deadline(10)
+        
+        def run(prompt, context, agent_type, query, mode, deadline):
+            if deadline is not leader_deadline:
+                return '在作业页面上传文件'
+            # 等待另一个请求进入等待状态后取消
+            wait_until = time.monotonic() + 5
+            while single_flight._calls[key].dups == 0 and time.monotonic() < wait_until:
+                time.sleep(0.01)
+            leader_deadline.cancel()
+            raise DeadlineExceeded(STOP_CANCELLED, '在作业')
+            
+        leader_context = {'course_id': 1}
+        follower_context = {'course_id': 1}
+        leader_results = []
+        
+        with mock.patch('agents.tasks.ai_singleflight', single_flight), \
+                mock.patch('agents.tasks.get_cached_answer', return_value=None), \
+                mock.patch('agents.tasks._run_agent', side_effect=run) as run_agent:
+            leader = threading.Thread(target=lambda: leader_results.append(
+                tasks.async_ai_process('怎么提交作业', leader_context, query='怎么提交作业', deadline=leader_deadline)
+            ))
+            leader.start()
+            wait_until = time.monotonic() + 5
+            while key not in single_flight._calls and time.monotonic() < wait_until:
+                time.sleep(0.01)
+            result = tasks.async_ai_process('怎么提交作业', follower_context, query='怎么提交作业', deadline=Deadline(10))
+            leader.join(timeout=5)
+            
+        self.assertEqual(leader_results, [partial_result(STOP_CANCELLED, '在作业')])
+        self.assertEqual(leader_context['stop_reason'], STOP_CANCELLED)
+        self.assertEqual(result, '在作业页面上传文件')
+        self.assertNotIn('stop_reason', follower_context)
+        self.assertNotIn('cache_hit', follower_context)
+        self.assertEqual(run_agent.call_count, 2)
+        
+    def test_key_ignores_user_and_includes_mode(self):
+        """
+        测试不同学生的相同问题合并运行，回答方式不同的请求不合并
+        """
+        from agents import tasks
+        
+        keys = []
+        
+        def do(key, fn, *args, timeout=None):
+            keys.append(key)
+            return '在作业页面上传文件', False
+            
+        with mock.patch('agents.tasks.ai_singleflight') as single_flight, \
+                mock.patch('agents.tasks.get_cached_answer', return_value=None):
+            single_flight.do.side_effect = do
+            tasks.async_ai_process('怎么提交作业', {'course_id': 1, 'student_id': 'S001'}, query='怎么提交作业')
+            tasks.async_ai_process('怎么提交作业', {'course_id': 1, 'student_id': 'S002'}, query='怎么提交作业')
+            tasks.async_ai_process('怎么提交作业', {'course_id': 1, 'student_id': 'S001'}, query='怎么提交作业', mode='rag')
+            
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[0], keys[2])
+
+class ToolUsageRecordingTestCase(TestCase):
+    """
+    工具使用记录测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        from django.core.cache import cache
+        from langchain.docstore.document import Document
+        from agents.tools import EduSysRetrieverTool
+        from agents.tracing import TraceRecorder
+        
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='tooluser',
+            password='testpass123',
+            user_id='T001'
+        )
+        self.tool = EduSysRetrieverTool([
+            Document(page_content='作业 在 作业页面 提交', metadata={'course_id': 1, 'source_type': 'course_outline'})
+        ])
+        self.recorder = TraceRecorder(batch_size=10, flush_interval=3600)
+        self.recorder._ensure_thread = lambda: None
+        
+    def test_tool_calls_recorded_after_save(self):
+        """
+        测试代理运行中的工具调用在保存交互记录后批量写入
+        """
+        from agents import tasks
+        from agents.models import ToolUsage
+        
+        def run(prompt, context=None):
+            self.tool(query='作业', course_id=1)
+            self.tool(query=None)
+            return '在作业页面提交'
+            
+        with mock.patch('agents.tasks.agent_pool') as pool, \
+             mock.patch('agents.tasks.trace_recorder', self.recorder):
+            pool.checkout.return_value.__enter__.return_value.run.side_effect = run
+            
+            context = {}
+            response = tasks.async_ai_process('用户问题：作业怎么提交', context, query='作业怎么提交')
+            interaction_id = tasks.save_ai_interaction(self.user.id, None, '作业怎么提交', response, 'question', context)
+            
+        # 写入发生在后台线程，保存交互记录时尚未写入
+        self.assertEqual(ToolUsage.objects.count(), 0)
+        self.assertEqual(self.recorder.flush(), 2)
+        
+        usages = ToolUsage.objects.filter(interaction_id=interaction_id).order_by('id')
+        self.assertEqual([usage.success for usage in usages], [True, False])
+        self.assertEqual(usages[0].tool_name, 'edusys_retriever')
+        self.assertEqual(usages[0].tool_input, {'query': '作业', 'course_id': 1})
+        self.assertIn('查询内容必须是字符串', usages[1].error_message)
+        self.assertNotIn('run_trace', AIInteraction.objects.get(id=interaction_id).context)
+
+class AgentStepTraceTestCase(TestCase):
+    """
+    代理步骤记录测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        from django.core.cache import cache
+        from agents.tracing import TraceRecorder
+        
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='stepuser',
+            password='testpass123',
+            user_id='P001'
+        )
+        self.teacher = get_user_model().objects.create_user(
+            username='stepteacher',
+            password='testpass123',
+            user_id='P002',
+            is_superuser=True
+        )
+        self.recorder = TraceRecorder(batch_size=10, flush_interval=3600)
+        self.recorder._ensure_thread = lambda: None
+        
+    def test_steps_recorded_and_aggregated(self):
+        """
+        测试代理步骤的耗时和令牌用量被记录，并可按代理类型统计
+        """
+        from smolagents.memory import ActionStep, ToolCall
+        from smolagents.monitoring import Timing, TokenUsage
+        from agents import tasks
+        from agents.models import AgentStep
+        from agents.tracing import record_action_step, record_model_call
+        
+        def run(prompt, context=None):
+            for step_number in (1, 2):
+                record_model_call(1.5)
+                record_action_step(ActionStep(
+                    step_number=step_number,
+                    timing=Timing(start_time=0.0, end_time=2.0),
+                    token_usage=TokenUsage(input_tokens=100, output_tokens=20),
+                    tool_calls=[ToolCall(name='python_interpreter', arguments='final_answer(1)', id='call_1')],
+                    is_final_answer=step_number == 2
+                ))
+            return '回答'
+            
+        with mock.patch('agents.tasks.agent_pool') as pool, \
+             mock.patch('agents.tasks.trace_recorder', self.recorder):
+            pool.checkout.return_value.__enter__.return_value.run.side_effect = run
+            
+            context = {}
+            response = tasks.async_ai_process('用户问题：多步问题', context, query='多步问题')
+            interaction_id = tasks.save_ai_interaction(self.user.id, None, '多步问题', response, 'question', context)
+            
+        self.assertEqual(self.recorder.flush(), 2)
+        steps = AgentStep.objects.filter(interaction_id=interaction_id).order_by('step_number')
+        self.assertEqual([step.step_number for step in steps], [1, 2])
+        self.assertEqual(steps[0].agent_type, 'question_answering')
+        self.assertAlmostEqual(steps[0].llm_duration, 1.5)
+        self.assertAlmostEqual(steps[0].execution_time, 0.5)
+        self.assertEqual(steps[0].input_tokens, 100)
+        self.assertEqual(steps[0].tool_calls[0]['name'], 'python_interpreter')
+        self.assertTrue(steps[1].is_final_answer)
+        
+        # 只有教师可以查看统计
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('agents:agents_api:aiinteraction-step-stats'))
+        self.assertEqual(response.status_code, 403)
+        
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('agents:agents_api:aiinteraction-step-stats'))
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['results'][0]
+        self.assertEqual(stats['agent_type'], 'question_answering')
+        self.assertEqual(stats['steps'], 2)
+        self.assertEqual(stats['avg_steps_per_interaction'], 2)
+        self.assertEqual(stats['total_input_tokens'], 200)
+        self.assertEqual(stats['step_count_distribution'], {'2': 1})
+
+class LLMHttpClientTestCase(TestCase):
+    """
+    模型服务 HTTP 连接池测试用例
+    """
+    
+    def setUp(self):
+        """
+        启动本地 HTTP 服务
+        """
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                body = b'ok'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                
+            def log_message(self, *args):
+                pass
+                
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        
+    def tearDown(self):
+        """
+        关闭本地 HTTP 服务
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        
+    def test_connections_reused_and_slots_released(self):
+        """
+        测试连续请求复用同一连接，响应关闭后归还并发名额
+        """
+        import httpx
+        from agents.agent.http_client import PooledTransport
+        
+        transport = PooledTransport(max_per_host=1, pool_timeout=0.2, limits=httpx.Limits(max_connections=4))
+        with httpx.Client(transport=transport) as client:
+            for _ in range(3):
+                self.assertEqual(client.get(self.url).text, 'ok')
+                
+            stats = transport.stats()
+            self.assertEqual(stats['total_requests'], 3)
+            self.assertEqual(stats['in_flight'], 0)
+            self.assertEqual(stats['connections'], 1)
+            
+            # 流式响应未关闭时占用名额，新请求等待超时
+            with client.stream('GET', self.url):
+                self.assertEqual(transport.stats()['in_flight'], 1)
+                with self.assertRaises(httpx.PoolTimeout):
+                    client.get(self.url)
+                    
+            self.assertEqual(transport.stats()['pool_timeouts'], 1)
+            self.assertEqual(client.get(self.url).text, 'ok')
+
+class AIAssistantBatchTestCase(TestCase):
+    """
+    AI 助手批量提问测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        self.teacher = get_user_model().objects.create_user(
+            username='batchteacher',
+            password='testpass123',
+            user_id='B001',
+            is_superuser=True
+        )
+        self.student = get_user_model().objects.create_user(
+            username='batchstudent',
+            password='testpass123',
+            user_id='B002'
+        )
+        self.course = Course.objects.create(name='批量测试课程', teacher='张老师')
+        self.url = reverse('agents:ai_assistant_batch', kwargs={'course_id': self.course.id})
+        
+    def test_batch_runs_all_questions_and_bulk_saves(self):
+        """
+        测试批量提问返回每个问题的结果，失败的问题不影响其他问题
+        """
+        def process(prompt, context=None, agent_type='question_answering', query=None, mode=None):
+            if query == '坏问题':
+                raise RuntimeError('模型服务不可用')
+            return f'回答：{query}'
+            
+        self.client.force_login(self.teacher)
+        with mock.patch('agents.tasks.async_ai_process', side_effect=process), \
+             mock.patch('agents.tasks.agent_pool') as pool:
+            response = self.client.post(
+                self.url,
+                data=json.dumps({'queries': ['问题一', '坏问题', '问题三']}),
+                content_type='application/json'
+            )
+            
+        self.assertEqual(response.status_code, 200)
+        pool.warm_up.assert_called_once_with(['question_answering'], count=3)
+        data = response.json()['data']
+        self.assertEqual((data['count'], data['completed'], data['failed']), (3, 2, 1))
+        self.assertEqual([item['query'] for item in data['results']], ['问题一', '坏问题', '问题三'])
+        self.assertEqual(data['results'][0]['response'], '回答：问题一')
+        self.assertEqual(data['results'][1]['error'], '模型服务不可用')
+        
+        interactions = AIInteraction.objects.filter(course=self.course)
+        self.assertEqual(interactions.count(), 3)
+        self.assertEqual(interactions.get(query='坏问题').status, 'failed')
+        
+    def test_batch_requires_teacher(self):
+        """
+        测试学生不能批量提问
+        """
+        self.client.force_login(self.student)
+        response = self.client.post(
+            self.url,
+            data=json.dumps({'queries': ['问题一']}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+class CourseAnalysisRunTestCase(TransactionTestCase):
+    """
+    课程批量分析测试用例
+    分析结果由工作线程写入，使用 TransactionTestCase 以便工作线程能看到测试数据
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        self.teacher = get_user_model().objects.create_user(
+            username='analysisteacher',
+            password='testpass123',
+            user_id='C001',
+            is_superuser=True
+        )
+        self.courses = [
+            Course.objects.create(name=f'分析测试课程{index}', teacher='张老师')
+            for index in range(3)
+        ]
+        self.failing_course_id = self.courses[1].id
+        
+    def _analyze(self, course_id, analysis_type='comprehensive'):
+        if course_id == self.failing_course_id:
+            raise RuntimeError('模型服务不可用')
+        return f'课程 {course_id} 分析报告'
+        
+    def test_command_persists_results_and_resume_retries_failed(self):
+        """
+        测试管理命令按课程保存结果，继续执行时只重新分析失败的课程
+        """
+        from io import StringIO
+        from django.core.management import call_command
+        from agents.models import CourseAnalysisRun
+        
+        with mock.patch('agents.tasks.async_course_analysis', side_effect=self._analyze) as analyze:
+            call_command('analyze_courses', '--concurrency', '2', stdout=StringIO())
+            
+        run = CourseAnalysisRun.objects.get()
+        self.assertEqual(run.status, 'failed')
+        self.assertEqual(analyze.call_count, 3)
+        results = {result.course_id: result for result in run.results.all()}
+        self.assertEqual(results[self.courses[0].id].status, 'completed')
+        self.assertEqual(results[self.courses[0].id].report, f'课程 {self.courses[0].id} 分析报告')
+        self.assertEqual(results[self.failing_course_id].status, 'failed')
+        self.assertEqual(results[self.failing_course_id].error_message, '模型服务不可用')
+        
+        self.failing_course_id = None
+        with mock.patch('agents.tasks.async_course_analysis', side_effect=self._analyze) as analyze:
+            call_command('analyze_courses', '--resume', str(run.id), stdout=StringIO())
+            
+        analyze.assert_called_once_with(self.courses[1].id, 'comprehensive')
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'completed')
+        self.assertFalse(run.results.exclude(status='completed').exists())
+        
+    def test_connections_closed_after_final_status(self):
+        """
+        测试分析成功和失败时都在写入最终状态后才关闭工作线程的数据库连接
+        """
+        from agents.analysis import analyze_result, create_analysis_run
+        
+        run = create_analysis_run('comprehensive', user_id=self.teacher.id)
+        statuses_at_close = []
+        
+        def close_all():
+            statuses_at_close.append(list(run.results.order_by('course_id').values_list('status', flat=True)))
+            
+        with mock.patch('agents.tasks.async_course_analysis', side_effect=self._analyze), \
+                mock.patch('agents.analysis.connections') as connections:
+            connections.close_all.side_effect = close_all
+            for result_id in run.results.order_by('course_id').values_list('id', flat=True)[:2]:
+                analyze_result(result_id)
+                
+        self.assertEqual(statuses_at_close, [
+            ['completed', 'pending', 'pending'],
+            ['completed', 'failed', 'pending'],
+        ])
+        
+    def test_api_creates_run_and_submits_job(self):
+        """
+        测试通过 API 创建分析任务后提交后台执行并返回 202
+        """
+        self.client.force_login(self.teacher)
+        url = reverse('agents:agents_api:courseanalysisrun-list')
+        with mock.patch('agents.api.views.submit_analysis_run') as submit:
+            response = self.client.post(
+                url,
+                data=json.dumps({
+                    'analysis_type': 'questions',
+                    'course_ids': [self.courses[0].id, self.courses[2].id]
+                }),
+                content_type='application/json'
+            )
+            
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        submit.assert_called_once_with(data['id'], None)
+        self.assertEqual(data['analysis_type'], 'questions')
+        self.assertEqual(data['progress']['total'], 2)
+        self.assertEqual(data['progress']['pending'], 2)
+
+class StubLLMServerTestCase(TestCase):
+    """
+    本地模拟模型服务测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        from agents.agent.stub_server import StubLLMServer
+        
+        self.server = StubLLMServer(port=0).start()
+        self.addCleanup(self.server.stop)
+        
+    def test_agent_runs_retriever_then_final_answer(self):
+        """
+        测试代理通过模拟模型服务先调用检索工具再给出最终回答（流式响应）
+        """
+        from langchain.docstore.document import Document
+        from agents.agent.config import AgentConfig
+        from agents.agent.factory import agent_factory
+        from agents.tools.retriever_tool import EduSysRetrieverTool
+        from agents.tracing import collect_trace
+        
+        retriever_tool = EduSysRetrieverTool([
+            Document(page_content='二叉树的遍历分为前序、中序和后序。', metadata={'course_id': 1}),
+            Document(page_content='栈是后进先出的数据结构。', metadata={'course_id': 2}),
+        ])
+        config = AgentConfig({'model_id': 'edusys-stub', 'stream_outputs': True, 'verbosity_level': 0})
+        
+        with mock.patch.dict('os.environ', {'BASE_URL': self.server.base_url, 'API_KEY': 'stub'}):
+            agent = agent_factory.create_agent('question_answering', config, custom_tools=[retriever_tool])
+            with collect_trace() as trace:
+                answer = agent.run('关于课程1的问题：二叉树如何遍历？')
+                
+        self.assertIn('二叉树的遍历分为前序、中序和后序', answer)
+        self.assertNotIn('栈是后进先出', answer)
+        self.assertEqual(self.server.request_count, 2)
+        self.assertEqual([usage['tool_name'] for usage in trace.tool_usages], ['edusys_retriever'])
+        self.assertEqual(trace.tool_usages[0]['tool_input']['course_id'], 1)
+        self.assertTrue(all(step['output_tokens'] for step in trace.agent_steps))
+        
+    def test_latency_and_stop_sequences(self):
+        """
+        测试首令牌延迟注入和停止序列截断
+        """
+        import time
+        import openai
+        
+        self.server.latency = 0.2
+        client = openai.OpenAI(base_url=self.server.base_url, api_key='stub')
+        
+        start_time = time.perf_counter()
+        completion = client.chat.completions.create(
+            model='edusys-stub',
+            messages=[{'role': 'user', 'content': 'New task:\n关于课程3的问题：什么是栈？'}],
+            stop=['</code>'],
+        )
+        
+        self.assertGreaterEqual(time.perf_counter() - start_time, 0.2)
+        content = completion.choices[0].message.content
+        self.assertIn("edusys_retriever(query='什么是栈？', course_id=3)", content)
+        self.assertFalse(content.endswith('</code>'))
+        self.assertGreater(completion.usage.completion_tokens, 0)
+
+class RetrievalAnswerModeTestCase(TestCase):
+    """
+    单次检索回答测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        from langchain.docstore.document import Document
+        from agents.agent.factory import agent_factory
+        from agents.agent.stub_server import StubLLMServer
+        from agents.tools.retriever_tool import EduSysRetrieverTool
+        
+        self.server = StubLLMServer(port=0).start()
+        self.addCleanup(self.server.stop)
+        
+        retriever_tool = EduSysRetrieverTool([
+            Document(page_content='binary tree traversal: preorder inorder postorder', metadata={'course_id': 1}),
+            Document(page_content='stack is last in first out', metadata={'course_id': 1}),
+            Document(page_content='queue is first in first out', metadata={'course_id': 1}),
+            Document(page_content='hash table lookup is constant time', metadata={'course_id': 1}),
+        ])
+        
+        patches = [
+            mock.patch.dict('os.environ', {'BASE_URL': self.server.base_url, 'API_KEY': 'stub'}),
+            mock.patch.object(agent_factory, 'get_retriever_tool', return_value=retriever_tool),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+            
+    def ask(self, answer_mode, question, mode=None):
+        """
+        用指定回答方式配置的代理回答问题
+        """
+        from agents import tasks
+        from agents.agent.config import AgentConfig
+        from agents.agent.core import EduSysAgent
+        
+        agent = EduSysAgent('question_answering', AgentConfig({
+            'model_id': 'edusys-stub',
+            'verbosity_level': 0,
+            'answer_mode': answer_mode,
+        }))
+        context = {'course_id': 1}
+        with mock.patch('agents.tasks.agent_pool') as pool:
+            pool.checkout.return_value.__enter__.return_value = agent
+            answer = tasks.run_agent(f'关于课程1的问题：{question}', context, 'question_answering', question, mode)
+        return answer, context['run_trace']
+        
+    def test_rag_mode_makes_single_model_call(self):
+        """
+        测试检索置信度足够时只调用一次模型，并记录检索和回答步骤
+        """
+        answer, trace = self.ask('rag', 'binary tree traversal')
+        
+        self.assertTrue(answer)
+        self.assertEqual(self.server.request_count, 1)
+        self.assertEqual([usage['tool_name'] for usage in trace.tool_usages], ['edusys_retriever'])
+        self.assertIn('preorder inorder postorder', trace.tool_usages[0]['tool_output'])
+        self.assertEqual(len(trace.agent_steps), 1)
+        self.assertTrue(trace.agent_steps[0]['is_final_answer'])
+        
+    def test_low_confidence_falls_back_to_agent(self):
+        """
+        测试检索置信度低时改用多步代理
+        """
+        answer, _ = self.ask('rag', 'graph coloring')
+        
+        self.assertIn('根据课程资料', answer)
+        self.assertEqual(self.server.request_count, 2)
+        
+    def test_request_mode_overrides_config(self):
+        """
+        测试请求指定的回答方式优先于代理配置
+        """
+        self.ask('rag', 'binary tree traversal', mode='agent')
+        self.assertEqual(self.server.request_count, 2)
+        
+        self.ask('agent', 'binary tree traversal', mode='rag')
+        self.assertEqual(self.server.request_count, 3)
+
+class ContextPackerTestCase(TestCase):
+    """
+    检索结果上下文打包测试用例
+    """
+    
+    def make_doc(self, content, source_id, **metadata):
+        from langchain.docstore.document import Document
+        
+        return Document(page_content=content, metadata=dict(metadata, source_type='course_file', source_id=source_id))
+        
+    def test_dedupes_and_merges_overlapping_chunks(self):
+        """
+        测试同一来源的重复分块被去掉，重叠分块合并为一段
+        """
+        from agents.tools.context_packer import ContextPacker
+        
+        text = '栈是一种后进先出的线性数据结构，只允许在表的一端进行插入和删除操作，这一端称为栈顶。'
+        first, second = text[:30], text[20:]
+        
+        packed = ContextPacker(max_tokens=1000, min_overlap=5).pack([
+            (self.make_doc(first, 1), 3.0),
+            (self.make_doc(first, 1), 3.0),
+            (self.make_doc(second, 1), 2.0),
+            (self.make_doc('队列是先进先出的数据结构。', 2), 1.0),
+        ])
+        
+        self.assertEqual([doc.page_content for doc in packed.docs], [text, '队列是先进先出的数据结构。'])
+        self.assertEqual(packed.docs[0].metadata['merged_chunks'], 2)
+        self.assertEqual((packed.duplicate_chunks, packed.merged_chunks), (1, 1))
+        self.assertGreater(packed.saved_tokens, 0)
+        
+    def test_merges_adjacent_chunks_by_start_index(self):
+        """
+        测试带有原文偏移量的相邻分块按偏移量合并
+        """
+        from agents.tools.context_packer import ContextPacker
+        
+        packed = ContextPacker(max_tokens=1000).pack([
+            (self.make_doc('第二部分内容。', 1, start_index=7), 2.0),
+            (self.make_doc('第一部分内容。', 1, start_index=0), 1.0),
+        ])
+        
+        self.assertEqual(len(packed.docs), 1)
+        self.assertEqual(packed.docs[0].page_content, '第一部分内容。第二部分内容。')
+        self.assertEqual(packed.docs[0].metadata['score'], 2.0)
+        self.assertNotIn('start_index', packed.docs[0].metadata)
+        
+    def test_trims_to_token_budget_by_score(self):
+        """
+        测试按分数从高到低放入，超出令牌预算的内容被截断或丢弃
+        """
+        from agents.tools.context_packer import ContextPacker
+        from agents.utils import estimate_tokens
+        
+        packed = ContextPacker(max_tokens=60, min_trim_tokens=10).pack([
+            (self.make_doc('低' * 100, 1), 1.0),
+            (self.make_doc('高' * 50, 2), 5.0),
+            (self.make_doc('中' * 40, 3), 3.0),
+        ])
+        
+        self.assertEqual([doc.page_content for doc in packed.docs], ['高' * 50, '中' * 10])
+        self.assertEqual(packed.dropped_chunks, 1)
+        self.assertEqual(packed.packed_tokens, 60)
+        self.assertEqual(packed.original_tokens, 190)
+        self.assertEqual(packed.saved_tokens, 130)
+        self.assertLessEqual(sum(estimate_tokens(doc.page_content) for doc in packed.docs), 60)
+
+class ConversationSessionTestCase(TestCase):
+    """
+    多轮对话会话测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        self.user = get_user_model().objects.create_user(
+            username='sessionuser',
+            password='testpass123',
+            user_id='C001'
+        )
+        self.client.force_login(self.user)
+        
+        # 连续提问多轮，使用独立的准入控制，不受其他测试消耗的提问速率影响
+        from agents.admission import AdmissionController
+        patcher = mock.patch('agents.views.admission_controller', AdmissionController())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+    def ask(self, question, session_id=None, response='回答'):
+        """
+        通过通用助手提问，返回 (会话ID, 传给代理的提示词, 传给代理的上下文)
+        """
+        data = {'query': question, 'async': False}
+        if session_id:
+            data['session_id'] = session_id
+        with mock.patch('agents.tasks.async_ai_process', return_value=response) as process, \
+             mock.patch('agents.conversation.ai_job_queue') as queue:
+            result = self.client.post(
+                reverse('agents:general_ai_assistant'),
+                data=json.dumps(data),
+                content_type='application/json'
+            )
+        self.queue = queue
+        self.assertEqual(result.status_code, 200)
+        prompt, context = process.call_args[0][:2]
+        return result.json()['data']['session_id'], prompt, context
+        
+    def test_follow_up_includes_previous_turn(self):
+        """
+        测试同一会话的后续提问附带上一轮对话，并关联到会话
+        """
+        session_id, prompt, context = self.ask('什么是栈？', response='栈是后进先出的结构')
+        self.assertNotIn('之前的对话', prompt)
+        self.assertNotIn('with_history', context)
+        
+        next_session_id, prompt, context = self.ask('它和队列有什么区别？', session_id)
+        
+        self.assertEqual(next_session_id, session_id)
+        self.assertIn('学生：什么是栈？', prompt)
+        self.assertIn('助手：栈是后进先出的结构', prompt)
+        self.assertTrue(prompt.endswith('用户问题：它和队列有什么区别？'))
+        self.assertTrue(context['with_history'])
+        self.assertEqual(AIInteraction.objects.filter(session_id=session_id).count(), 2)
+        self.assertNotIn('session_id', AIInteraction.objects.first().context)
+        
+    def test_other_users_session_is_not_reused(self):
+        """
+        测试不能使用其他用户的会话
+        """
+        from agents.models import ConversationSession
+        
+        other = get_user_model().objects.create_user(username='other', password='testpass123', user_id='C002')
+        session = ConversationSession.objects.create(user=other, summary='其他用户的对话')
+        
+        session_id, prompt, _ = self.ask('问题', session.id)
+        
+        self.assertNotEqual(session_id, session.id)
+        self.assertNotIn('其他用户的对话', prompt)
+        
+    def test_summary_keeps_prompt_bounded(self):
+        """
+        测试超出最近轮数的对话被合并到摘要，提示词长度不随对话变长而增长
+        """
+        from agents import conversation
+        from agents.config import CONVERSATION_CONFIG
+        from agents.models import ConversationSession
+        
+        max_turns = CONVERSATION_CONFIG['MAX_TURNS']
+        session_id, _, _ = self.ask('问题0')
+        for i in range(1, max_turns + 3):
+            self.ask(f'问题{i}', session_id)
+        self.assertTrue(self.queue.submit.called)
+        
+        with mock.patch('agents.conversation._generate_summary', return_value='之前讨论了问题0到问题2') as generate:
+            self.assertTrue(conversation.summarize_session(session_id))
+        self.assertIn('学生：问题0', generate.call_args[0][1])
+        
+        session = ConversationSession.objects.get(id=session_id)
+        self.assertEqual(session.summary, '之前讨论了问题0到问题2')
+        
+        prompt, with_history = conversation.build_conversation_prompt(session, '当前问题')
+        self.assertTrue(with_history)
+        self.assertIn('对话摘要：之前讨论了问题0到问题2', prompt)
+        self.assertNotIn('学生：问题0', prompt)
+        self.assertEqual(prompt.count('学生：'), max_turns)
+        
+        # 已经合并过的轮次不会再次合并
+        self.assertFalse(conversation.summarize_session(session_id))
+        
+    def test_summary_falls_back_to_question_list(self):
+        """
+        测试模型生成摘要失败时保留提问列表
+        """
+        from agents import conversation
+        from agents.config import CONVERSATION_CONFIG
+        from agents.models import ConversationSession
+        
+        session_id, _, _ = self.ask('问题0')
+        for i in range(1, CONVERSATION_CONFIG['MAX_TURNS'] + 1):
+            self.ask(f'问题{i}', session_id)
+            
+        with mock.patch('agents.conversation._generate_summary', side_effect=RuntimeError('模型不可用')):
+            self.assertTrue(conversation.summarize_session(session_id))
+            
+        self.assertIn('问题0', ConversationSession.objects.get(id=session_id).summary)
+
+class AdmissionControlTestCase(TestCase):
+    """
+    请求准入控制测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        self.user = get_user_model().objects.create_user(
+            username='admissionuser',
+            password='testpass123',
+            user_id='D001'
+        )
+        self.client.force_login(self.user)
+        
+    def test_rate_limited_request_returns_429(self):
+        """
+        测试超出用户提问速率时返回 429 和 Retry-After
+        """
+        from agents.admission import AdmissionController
+        
+        config = {'USER_RATE': 0.01, 'USER_BURST': 1}
+        with mock.patch.dict('agents.admission.ADMISSION_CONFIG', config), \
+             mock.patch('agents.views.admission_controller', AdmissionController()), \
+             mock.patch('agents.tasks.async_ai_process', return_value='回答') as process:
+            responses = [
+                self.client.post(
+                    reverse('agents:general_ai_assistant'),
+                    data=json.dumps({'query': '问题', 'async': False}),
+                    content_type='application/json'
+                )
+                for _ in range(2)
+            ]
+            
+        self.assertEqual(responses[0].status_code, 200)
+        self.assertEqual(responses[1].status_code, 429)
+        self.assertEqual(responses[1].json()['error']['code'], 'RATE_LIMITED')
+        self.assertGreaterEqual(int(responses[1]['Retry-After']), 1)
+        self.assertEqual(process.call_count, 1)
+        
+    def test_api_create_rate_limited(self):
+        """
+        测试通过 API 创建后台任务超出提问速率时返回 429，且不创建交互记录
+        """
+        from agents.admission import AdmissionController
+        
+        course = Course.objects.create(name='限流测试课程', teacher='张老师')
+        self.user.is_superuser = True
+        self.user.save()
+        
+        config = {'USER_RATE': 0.01, 'USER_BURST': 1}
+        with mock.patch.dict('agents.admission.ADMISSION_CONFIG', config), \
+             mock.patch('agents.api.views.admission_controller', AdmissionController()), \
+             mock.patch('agents.tasks.ai_job_queue.submit'):
+            responses = [
+                self.client.post(
+                    reverse('agents:agents_api:aiinteraction-list'),
+                    data=json.dumps({'course': course.id, 'query': '问题', 'interaction_type': 'question'}),
+                    content_type='application/json'
+                )
+                for _ in range(2)
+            ]
+            
+        self.assertEqual(responses[0].status_code, 202)
+        self.assertEqual(responses[1].status_code, 429)
+        self.assertEqual(responses[1].json()['error']['code'], 'RATE_LIMITED')
+        self.assertGreaterEqual(int(responses[1]['Retry-After']), 1)
+        self.assertEqual(AIInteraction.objects.count(), 1)
+        
+    def run_queue(self, controller, requests):
+        """
+        占用唯一的运行名额后按顺序排队，返回依次获得名额的请求
+        """
+        import threading
+        import time
+        
+        granted = []
+        
+        def worker(name, user_id, course_id):
+            controller.acquire(user_id, course_id)
+            granted.append(name)
+            controller.release()
+            
+        controller.acquire('holder', None)
+        threads = []
+        for name, user_id, course_id in requests:
+            thread = threading.Thread(target=worker, args=(name, user_id, course_id))
+            thread.start()
+            threads.append(thread)
+            # 等待请求进入队列，保证排队顺序确定
+            while controller.stats()['waiting'] < len(threads):
+                time.sleep(0.001)
+                
+        controller.release()
+        for thread in threads:
+            thread.join(5)
+        return granted
+        
+    def test_fair_queue_round_robins_users(self):
+        """
+        测试排队请求在用户之间轮流放行，先排队的大量请求不会阻塞其他用户
+        """
+        from agents.admission import AdmissionController
+        
+        controller = AdmissionController(max_active=1, max_waiting=10, max_waiting_per_user=5)
+        granted = self.run_queue(controller, [
+            ('a1', 'a', 1), ('a2', 'a', 1), ('a3', 'a', 1), ('b1', 'b', 1), ('c1', 'c', 1),
+        ])
+        
+        self.assertEqual(granted, ['a1', 'b1', 'c1', 'a2', 'a3'])
+        self.assertEqual(controller.stats()['active'], 0)
+        
+    def test_fair_queue_weights_courses(self):
+        """
+        测试课程按权重轮转放行
+        """
+        from agents.admission import AdmissionController
+        
+        controller = AdmissionController(max_active=1, max_waiting=10, max_waiting_per_user=5, course_weights={1: 2})
+        granted = self.run_queue(controller, [
+            ('x1', 'x', 1), ('x2', 'x', 1), ('x3', 'x', 1), ('y1', 'y', 2), ('y2', 'y', 2),
+        ])
+        
+        self.assertEqual(granted, ['x1', 'x2', 'y1', 'x3', 'y2'])
+        
+    def test_bounded_queue_rejects_and_times_out(self):
+        """
+        测试排队已满时立即拒绝，排队超时的请求被移出队列
+        """
+        from agents.admission import AdmissionController, AdmissionRejected
+        
+        controller = AdmissionController(max_active=1, max_waiting=1, max_waiting_per_user=1, queue_timeout=0.05)
+        controller.acquire('holder', None)
+        
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire('a', 1)
+        self.assertEqual(controller.stats()['waiting'], 0)
+        
+        controller._waiting = controller.max_waiting
+        with self.assertRaises(AdmissionRejected) as cm:
+            controller.acquire('b', 1)
+        self.assertEqual(cm.exception.retry_after, controller.retry_after)
+        controller._waiting = 0
+        
+        controller.release()
+        self.assertEqual(controller.stats()['active'], 0)
+        self.assertEqual(controller.stats()['rejected'], 2)
+
+class AgentDeadlineTestCase(TestCase):
+    """
+    代理运行截止时间测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化：模拟模型服务每次回复前等待 0.5 秒
+        """
+        from langchain.docstore.document import Document
+        from agents.agent.config import AgentConfig
+        from agents.agent.core import EduSysAgent
+        from agents.agent.factory import agent_factory
+        from agents.agent.stub_server import StubLLMServer
+        from agents.tools.retriever_tool import EduSysRetrieverTool
+        
+        self.server = StubLLMServer(port=0, latency=0.5).start()
+        self.addCleanup(self.server.stop)
+        
+        retriever_tool = EduSysRetrieverTool([
+            Document(page_content='binary tree traversal: preorder inorder postorder', metadata={'course_id': 1}),
+        ])
+        patches = [
+            mock.patch.dict('os.environ', {'BASE_URL': self.server.base_url, 'API_KEY': 'stub'}),
+            mock.patch.object(agent_factory, 'get_retriever_tool', return_value=retriever_tool),
+            mock.patch.dict('agents.agent.http_client.LLM_HTTP_CONFIG', {'MAX_RETRIES': 0}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+            
+        self.agent = EduSysAgent('question_answering', AgentConfig({
+            'model_id': 'edusys-stub',
+            'verbosity_level': 0,
+            'stream_outputs': False,
+            'answer_mode': 'agent',
+        }))
+        
+    def test_timeout_returns_partial_answer(self):
+        """
+        测试超时后中断代理，以检索到的资料作为部分结果，且不缓存
+        """
+        from agents import tasks
+        from agents.deadline import Deadline
+        
+        context = {'course_id': 1}
+        with mock.patch('agents.tasks.agent_pool') as pool, \
+             mock.patch('agents.tasks.answer_cache') as cache:
+            pool.checkout.return_value.__enter__.return_value = self.agent
+            answer = tasks.run_agent('关于课程1的问题：binary tree', context, deadline=Deadline(0.8))
+            
+        self.assertEqual(context['stop_reason'], 'timeout')
+        self.assertIn('部分结果', answer)
+        self.assertIn('preorder inorder postorder', answer)
+        self.assertFalse(cache.set.called)
+        
+    def test_cancelled_before_model_call(self):
+        """
+        测试已取消的请求不再调用模型
+        """
+        from agents.deadline import Deadline, DeadlineExceeded
+        
+        deadline = Deadline(10)
+        deadline.cancel()
+        
+        with self.assertRaises(DeadlineExceeded) as cm:
+            self.agent.run('关于课程1的问题：binary tree', deadline=deadline)
+            
+        self.assertEqual(cm.exception.reason, 'cancelled')
+        self.assertEqual(self.server.request_count, 0)
+        
+    def test_stream_disconnect_cancels_and_records_partial(self):
+        """
+        测试流式响应中客户端断开连接时取消代理运行，并记录部分结果
+        """
+        from agents.views import stream_ai_response
+        
+        user = get_user_model().objects.create_user(username='deadlineuser', password='testpass123', user_id='E001')
+        context = {'course_id': 1, 'student_id': user.id}
+        
+        with mock.patch('agents.tasks.agent_pool') as pool:
+            pool.checkout.return_value.__enter__.return_value = self.agent
+            stream = stream_ai_response(user.id, None, 'binary tree', '关于课程1的问题：binary tree', context, 'question')
+            for message in stream:
+                if message.startswith('event: step'):
+                    break
+            stream.close()
+            
+        # 第二次模型调用前已取消
+        self.assertEqual(self.server.request_count, 1)
+        self.assertFalse(self.agent.agent.memory.steps[-1].is_final_answer)
+        interaction = AIInteraction.objects.get()
+        self.assertEqual(interaction.context['stop_reason'], 'cancelled')
+        self.assertIn('preorder inorder postorder', interaction.response)
+        
+    def test_cancelled_stream_not_served_from_semantic_cache(self):
+        """
+        测试流式响应被取消后记录的部分结果不作为语义缓存的回答，再次提出相同问题时重新运行代理
+        """
+        from agents import tasks
+        from agents.semantic_cache import semantic_answer_cache
+        from agents.views import stream_ai_response
+        
+        user = get_user_model().objects.create_user(username='deadlinecache', password='testpass123', user_id='E002')
+        embed = mock.Mock(return_value=[1.0, 0.0])
+        
+        with mock.patch('agents.semantic_cache.embed_query', embed), \
+                mock.patch('agents.tasks.embed_query', embed):
+            with mock.patch('agents.tasks.agent_pool') as pool:
+                pool.checkout.return_value.__enter__.return_value = self.agent
+                stream = stream_ai_response(user.id, None, 'binary tree', '用户问题：binary tree', {'student_id': user.id}, 'question')
+                for message in stream:
+                    if message.startswith('event: step'):
+                        break
+                stream.close()
+                
+            interaction = AIInteraction.objects.get()
+            self.assertEqual(interaction.context['stop_reason'], 'cancelled')
+            self.assertIsNone(interaction.query_embedding)
+            
+            with mock.patch('agents.tasks.agent_pool') as pool:
+                pool.checkout.return_value.__enter__.return_value.run.return_value = '二叉树的遍历方式有前序、中序和后序'
+                context = {'student_id': user.id}
+                response = tasks.async_ai_process('用户问题：binary tree', context, query='binary tree')
+                
+            self.assertEqual(response, '二叉树的遍历方式有前序、中序和后序')
+            self.assertNotIn('cache_hit', context)
+            pool.checkout.assert_called_once()
+            
+            # 已有向量的部分结果同样不作为候选
+            AIInteraction.objects.filter(id=interaction.id).update(query_embedding=[1.0, 0.0])
+            self.assertIsNone(semantic_answer_cache.lookup('binary tree', None))
+
+class ModelRoutingTestCase(TestCase):
+    """
+    模型路由测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化
+        """
+        from agents.agent.router import model_router
+        
+        self.router = model_router
+        self.router.clear()
+        self.addCleanup(self.router.clear)
+        self.user = get_user_model().objects.create_user(username='route_student', password='testpass123', user_id='R001')
+        
+    def test_classify(self):
+        """
+        测试按问题复杂程度分类
+        """
+        self.assertEqual(self.router.classify('栈是什么？')[0], 'simple')
+        self.assertEqual(self.router.classify('为什么快速排序平均是 O(n log n)？'), ('complex', 'keyword:为什么'))
+        self.assertEqual(self.router.classify('栈是什么？队列是什么？')[1], 'multi_question')
+        self.assertEqual(self.router.classify('这段代码哪里错了 ```int main() { return 0; }```')[1], 'code')
+        self.assertEqual(self.router.classify('栈是什么？', with_history=True)[1], 'history')
+        self.assertEqual(self.router.classify('栈是什么？', agent_type='course_analysis')[1], 'agent_type')
+        self.assertEqual(self.router.classify('请解释' + '二叉树' * 30)[1], 'length')
+        
+    def test_routes_from_agent_config(self):
+        """
+        测试路由使用数据库代理配置中的模型，修改配置后立即生效
+        """
+        from agents.models import AgentConfig
+        
+        self.assertIsNone(self.router.route('栈是什么？').model_id)
+        
+        config = AgentConfig.objects.create(name='答疑助手', agent_type='question_answering', config={
+            'routes': {
+                'simple': {'model_id': 'small-model', 'model_kwargs': {'temperature': 0.2}},
+                'complex': {'model_id': 'large-model'},
+            }
+        })
+        decision = self.router.route('栈是什么？')
+        self.assertEqual((decision.route, decision.model_id), ('simple', 'small-model'))
+        self.assertEqual(decision.model_kwargs, {'temperature': 0.2})
+        self.assertEqual(self.router.route('比较栈和队列的区别').model_id, 'large-model')
+        
+        config.is_active = False
+        config.save()
+        self.assertIsNone(self.router.route('栈是什么？').model_id)
+        
+    def test_interaction_records_route_and_latency(self):
+        """
+        测试代理使用路由选出的模型，交互记录保存路由结果和耗时
+        """
+        from agents import tasks
+        from agents.agent.router import RouteDecision
+        
+        small_model = mock.sentinel.small_model
+        agent = mock.MagicMock()
+        agent.get_answer_mode.return_value = 'agent'
+        agent.run.return_value = '栈是后进先出的线性表'
+        context = {'course_id': None, 'student_id': self.user.id}
+        
+        with mock.patch('agents.tasks.agent_pool') as pool, \
+             mock.patch.object(self.router, 'route', return_value=RouteDecision('simple', 'short_lookup', 'small-model')), \
+             mock.patch.object(self.router, 'get_model', return_value=small_model):
+            pool.checkout.return_value.__enter__.return_value = agent
+            answer = tasks.run_agent('栈是什么？', context, 'question_answering', '栈是什么？')
+            
+        self.assertEqual(answer, '栈是后进先出的线性表')
+        agent.use_model.assert_called_once_with(small_model)
+        
+        interaction_id = tasks.save_ai_interaction(self.user.id, None, '栈是什么？', answer, 'question', context)
+        interaction = AIInteraction.objects.get(id=interaction_id)
+        self.assertEqual(interaction.model_route, 'simple')
+        self.assertEqual(interaction.model_id, 'small-model')
+        self.assertIsNotNone(interaction.latency)
+        self.assertEqual(interaction.context['route_reason'], 'short_lookup')
+        self.assertNotIn('model_route', interaction.context)
+
+class RetrieverIndexCacheTestCase(TestCase):
+    """
+    课程检索索引缓存测试用例
+    """
+    
+    def setUp(self):
+        """
+        测试初始化：清空共享缓存中的检索索引版本号
+        """
+        from django.core.cache import cache
+        from agents.cache import index_versions
+        cache.clear()
+        index_versions.clear_local()
+        
+    def make_tool(self, **kwargs):
+        from langchain.docstore.document import Document
+        from agents.tools.retriever_tool import EduSysRetrieverTool
+        
+        docs = [
+            Document(page_content=f'course {course_id} topic {topic}', metadata={'course_id': course_id})
+            for course_id in (1, 2, 3)
+            for topic in ('stack', 'queue')
+        ]
+        return EduSysRetrieverTool(docs, **kwargs)
+        
+    def test_course_index_built_once(self):
+        """
+        测试同一课程的检索索引只构建一次，且只包含该课程的文档
+        """
+        tool = self.make_tool()
+        
+        with mock.patch('agents.tools.retriever_tool.InvertedIndex.from_documents',
+                        wraps=type(tool.index).from_documents) as from_documents:
+            first = tool.get_retriever(1)
+            second = tool.get_retriever(1)
+            
+        self.assertIs(first, second)
+        self.assertEqual(from_documents.call_count, 1)
+        self.assertEqual({doc.metadata['course_id'] for doc in first.docs}, {1})
+        self.assertEqual(tool.index_stats()['hits'], 1)
+        
+    def test_lru_respects_capacity(self):
+        """
+        测试超出课程数或分块数上限时淘汰最久未使用的课程
+        """
+        tool = self.make_tool(max_courses=2)
+        tool.get_retriever(1)
+        tool.get_retriever(2)
+        tool.get_retriever(1)
+        tool.get_retriever(3)
+        
+        self.assertEqual(list(tool._course_indexes), [1, 3])
+        self.assertEqual(tool.index_stats()['chunks'], 4)
+        
+        tool = self.make_tool(max_chunks=3)
+        tool.get_retriever(1)
+        tool.get_retriever(2)
+        self.assertEqual(list(tool._course_indexes), [2])
+        
+    def test_update_invalidates_only_that_course(self):
+        """
+        测试课程文档更新后只重建该课程的检索索引
+        """
+        from langchain.docstore.document import Document
+        from agents.agent.factory import agent_factory
+        from agents.signals import knowledge_base_updated
+        
+        tool = self.make_tool()
+        first_course = tool.get_retriever(1)
+        second_course = tool.get_retriever(2)
+        
+        new_docs = [Document(page_content='course 1 topic heap', metadata={'course_id': 1})]
+        with mock.patch.object(agent_factory, '_retriever_tool', tool), \
+             mock.patch.object(agent_factory, '_knowledge_docs', None), \
+             mock.patch('agents.agent.factory.load_indexed_knowledge_base', return_value=(new_docs, [None], [None])) as load:
+            knowledge_base_updated.send(sender=self.__class__, course_id=1)
+            
+        load.assert_called_once_with(1)
+        self.assertIs(tool.get_retriever(2), second_course)
+        rebuilt = tool.get_retriever(1)
+        self.assertIsNot(rebuilt, first_course)
+        self.assertEqual([doc.page_content for doc in rebuilt.docs], ['course 1 topic heap'])
+        self.assertEqual(len(tool.docs), 5)
+        self.assertIn('heap', tool.search('heap')[0][0].page_content)
+        
+    def test_version_bump_from_other_process(self):
+        """
+        测试其他进程递增检索索引版本号（不发送信号）后，检索时只重新加载变化的课程
+        """
+        from langchain.docstore.document import Document
+        from agents.cache import VersionCounter, index_versions
+        import time
+        
+        new_docs = [Document(page_content='course 1 topic heap', metadata={'course_id': 1})]
+        loader = mock.Mock(return_value=(new_docs, [None], [None]))
+        tool = self.make_tool(loader=loader)
+        first_course = tool.get_retriever(1)
+        second_course = tool.get_retriever(2)
+        
+        # update_knowledge_base 命令在另一个进程中更新课程 1
+        VersionCounter('index_version').bump(1)
+        
+        # 版本号的进程内缓存过期前继续使用已加载的文档
+        self.assertIs(tool.get_retriever(1), first_course)
+        loader.assert_not_called()
+        
+        later = time.monotonic() + index_versions.ttl + 1
+        with mock.patch('agents.cache.time.monotonic', return_value=later):
+            rebuilt = tool.get_retriever(1)
+            self.assertIs(tool.get_retriever(2), second_course)
+            
+        loader.assert_called_once_with(1)
+        self.assertEqual([doc.page_content for doc in rebuilt.docs], ['course 1 topic heap'])
+        self.assertEqual(len(tool.docs), 5)
+        
+        # 全局版本变化时重新加载全部文档
+        loader.reset_mock()
+        VersionCounter('index_version').bump(None)
+        with mock.patch('agents.cache.time.monotonic', return_value=later + index_versions.ttl + 1):
+            tool.get_retriever(2)
+        loader.assert_called_once_with(None)
+        self.assertEqual(len(tool.docs), 1)
+
+class InvertedIndexTestCase(TestCase):
+    """
+    增量倒排索引测试用例
+    """
+    
+    def make_docs(self):
+        from langchain.docstore.document import Document
+        
+        texts = [
+            'binary tree traversal preorder inorder postorder',
+            'stack is last in first out',
+            'queue is first in first out',
+            'hash table lookup is constant time',
+            'binary search on sorted array',
+        ]
+        return [Document(page_content=text, metadata={'course_id': 1}) for text in texts]
+        
+    def test_scores_match_rank_bm25(self):
+        """
+        测试评分与 rank_bm25 的 BM25Okapi 一致
+        """
+        from rank_bm25 import BM25Okapi
+        from agents.retrieval import InvertedIndex
+        
+        docs = self.make_docs()
+        index = InvertedIndex.from_documents(docs)
+        reference = BM25Okapi([doc.page_content.split() for doc in docs])
+        
+        for query in ('binary tree', 'first out', 'is', 'graph coloring'):
+            expected = reference.get_scores(query.split())
+            scores = index.get_scores(query.split())
+            for slot, score in enumerate(expected):
+                self.assertAlmostEqual(scores.get(slot, 0.0), score)
+                
+    def test_incremental_updates_match_rebuild(self):
+        """
+        测试添加、更新和删除分块后的检索结果与重新构建的索引一致
+        """
+        from langchain.docstore.document import Document
+        from agents.retrieval import InvertedIndex
+        
+        docs = self.make_docs()
+        index = InvertedIndex.from_documents(docs, compact_ratio=10)
+        index.update(1, Document(page_content='stack push pop operations', metadata={'course_id': 1}))
+        index.remove(3)
+        index.add('faq', Document(page_content='tree height of binary tree', metadata={'course_id': 2}))
+        
+        self.assertEqual(index.stats()['tombstones'], 2)
+        self.assertNotIn(3, index)
+        
+        rebuilt = InvertedIndex.from_documents(index.docs)
+        for query in ('binary tree', 'stack', 'hash table', 'first out'):
+            self.assertEqual(
+                [(doc.page_content, round(score, 6)) for doc, score in index.search(query)],
+                [(doc.page_content, round(score, 6)) for doc, score in rebuilt.search(query)]
+            )
+            
+        postings = index.stats()['postings']
+        self.assertGreater(index.compact(), 0)
+        self.assertEqual(index.stats()['tombstones'], 0)
+        self.assertLess(index.stats()['postings'], postings)
+        self.assertEqual(index.search('hash table'), [])
+        self.assertEqual(
+            [doc.page_content for doc, _ in index.search('tree', doc_filter=lambda doc: doc.metadata['course_id'] == 2)],
+            ['tree height of binary tree']
+        )
+        
+    def test_cached_weights_refreshed_after_update(self):
+        """
+        测试倒排表评分缓存的权重在索引变化后重新计算，结果与 rank_bm25 一致
+        """
+        from langchain.docstore.document import Document
+        from rank_bm25 import BM25Okapi
+        from agents.retrieval import InvertedIndex
+        
+        docs = self.make_docs()
+        index = InvertedIndex.from_documents(docs, scorer='postings')
+        self.assertEqual(index.search('binary binary tree', k=1)[0][0].page_content, docs[0].page_content)
+        
+        index.remove(0)
+        index.add('faq', Document(page_content='binary tree height binary tree', metadata={'course_id': 1}))
+        reference = BM25Okapi([doc.page_content.split() for doc in index.docs])
+        expected = sorted(zip(reference.get_scores('binary binary tree'.split()), range(len(index.docs))),
+                          key=lambda item: (-item[0], item[1]))
+                          
+        results = index.search('binary binary tree', k=2)
+        self.assertEqual([doc.page_content for doc, _ in results], [index.docs[slot].page_content for _, slot in expected[:2]])
+        for (_, score), (expected_score, _) in zip(results, expected):
+            self.assertAlmostEqual(score, expected_score)
+            
+    def test_remove_compacts_automatically(self):
+        """
+        测试墓碑占比超过阈值时自动压缩
+        """
+        from agents.retrieval import InvertedIndex
+        
+        index = InvertedIndex.from_documents(self.make_docs(), compact_ratio=0.3)
+        index.remove(0)
+        self.assertEqual(index.stats()['tombstones'], 1)
+        index.remove(1)
+        self.assertEqual(index.stats()['tombstones'], 0)
+        self.assertEqual(len(index), 3)
+
+class SparseBM25TestCase(TestCase):
+    """
+    稀疏矩阵 BM25 评分测试用例
+    """
+    
+    def make_corpus(self):
+        import random
+        
+        rng = random.Random(1)
+        vocab = [f'w{i}' for i in range(200)]
+        return [rng.choices(vocab, k=rng.randint(5, 40)) for _ in range(300)]
+        
+    def test_scores_match_rank_bm25(self):
+        """
+        测试稀疏矩阵评分与 rank_bm25 一致，并按分数取前 k 个文档
+        """
+        from rank_bm25 import BM25Okapi
+        from agents.retrieval import SparseBM25Matrix
+        
+        corpus = self.make_corpus()
+        matrix = SparseBM25Matrix.from_token_lists(corpus)
+        reference = BM25Okapi(corpus)
+        
+        query = ['w1', 'w2', 'w2', 'w150', 'unknown']
+        expected = reference.get_scores(query)
+        cols, scores = matrix.get_scores(query)
+        for col, score in zip(cols, scores):
+            self.assertAlmostEqual(float(score), expected[col], places=4)
+        self.assertEqual(set(cols.tolist()), {i for i, score in enumerate(expected) if score > 0})
+        
+        top = matrix.top_k(query, 5)
+        self.assertEqual([slot for slot, _ in top], sorted(range(len(corpus)), key=lambda i: -expected[i])[:5])
+        self.assertEqual(matrix.top_k(['unknown']), [])
+        
+    def test_inverted_index_uses_matrix_snapshot(self):
+        """
+        测试倒排索引使用稀疏矩阵评分，索引变化后结果与倒排表评分一致
+        """
+        from langchain.docstore.document import Document
+        from agents.retrieval import InvertedIndex
+        
+        docs = [Document(page_content=' '.join(tokens)) for tokens in self.make_corpus()]
+        with mock.patch.dict('agents.retrieval.inverted_index.RETRIEVAL_CONFIG', {'SPARSE_MIN_DOCS': 1}):
+            sparse_index = InvertedIndex.from_documents(docs, scorer='sparse')
+            postings_index = InvertedIndex.from_documents(docs, scorer='postings')
+            
+            def results(index, query):
+                return [(doc.page_content, round(score, 3)) for doc, score in index.search(query, 5)]
+                
+            self.assertEqual(results(sparse_index, 'w1 w2 w150'), results(postings_index, 'w1 w2 w150'))
+            self.assertTrue(sparse_index.stats()['matrix_current'])
+            
+            for index in (sparse_index, postings_index):
+                index.remove(0)
+                index.add('new', Document(page_content='w1 w1 w2'))
+            sparse_index.build_matrix()
+            self.assertTrue(sparse_index.stats()['matrix_current'])
+            self.assertEqual(results(sparse_index, 'w1 w2 w150'), results(postings_index, 'w1 w2 w150'))
+            
+    def test_benchmark_command(self):
+        """
+        测试检索评分基准测试命令
+        """
+        from io import StringIO
+        from django.core.management import call_command
+        
+        out = StringIO()
+        call_command('benchmark_retrieval', sizes=[200], queries=3, vocab_size=100, stdout=out)
+        output = out.getvalue()
+        for engine in ('rank_bm25', 'postings', 'sparse'):
+            self.assertIn(engine, output)
+            
+        # 超过 max_python_docs 的语料在样本上测试 rank_bm25 并外推，仍输出稀疏矩阵的加速比
+        out = StringIO()
+        call_command('benchmark_retrieval', sizes=[400], queries=3, vocab_size=100, max_python_docs=100, stdout=out)
+        rows = {line.split()[1]: line.split() for line in out.getvalue().splitlines() if line.strip().startswith('400')}
+        self.assertEqual(set(rows), {'rank_bm25*', 'sparse'})
+        self.assertTrue(rows['sparse'][-1].endswith('x'))
+
+class RetrievalTokenizerTestCase(TestCase):
+    """
+    检索分词测试用例
+    """
+    
+    def test_bigram_tokenize(self):
+        """
+        测试中文按相邻两字切分，英文转为小写，标点被忽略
+        """
+        from agents.retrieval import bigram_tokenize
+        
+        self.assertEqual(bigram_tokenize('二叉树遍历'), ['二叉', '叉树', '树遍', '遍历'])
+        self.assertEqual(bigram_tokenize('栈，BFS 与 DFS_2！'), ['栈', 'bfs', '与', 'dfs_2'])
+        self.assertEqual(bigram_tokenize('  '), [])
+        
+    def test_chinese_query_matches_without_spaces(self):
+        """
+        测试不含空格的中文查询能检索到相关文档
+        """
+        from langchain.docstore.document import Document
+        from agents.tools.retriever_tool import EduSysRetrieverTool
+        
+        tool = EduSysRetrieverTool([
+            Document(page_content='栈是后进先出的数据结构。', metadata={'course_id': 1}),
+            Document(page_content='二叉树的遍历分为前序、中序和后序。', metadata={'course_id': 1}),
+            Document(page_content='哈希表的平均查找时间是常数。', metadata={'course_id': 2}),
+        ], tokenizer='bigram')
+        
+        results = tool.search('二叉树如何遍历？', k=1)
+        self.assertIn('二叉树的遍历', results[0][0].page_content)
+        self.assertGreater(results[0][1], 0)
+        self.assertIn('栈', tool.search('什么是栈', course_id=1, k=1)[0][0].page_content)
+        self.assertEqual(tool.index_stats()['tokenizer'], 'bigram')
+        
+    def test_stored_tokens_reused(self):
+        """
+        测试保存知识库时记录分词结果，构建检索索引时不重新分词
+        """
+        from langchain.docstore.document import Document
+        from agents.models import KnowledgeDocument
+        from agents.knowledge_base import knowledge_base_updater, load_indexed_knowledge_base
+        from agents.retrieval import bigram_tokenize
+        from agents.tools.retriever_tool import EduSysRetrieverTool
+        
+        knowledge_base_updater._save_documents([
+            Document(page_content='期末考试在第十八周', metadata={'source_type': 'announcement', 'source_id': 1, 'course_id': 1}),
+        ])
+        stored = KnowledgeDocument.objects.get()
+        self.assertEqual(stored.tokenizer, 'bigram')
+        self.assertEqual(stored.tokens[:3], ['期末', '末考', '考试'])
+        
+        docs, tokens, _ = load_indexed_knowledge_base()
+        self.assertEqual(tokens, [stored.tokens])
+        
+        tokenize = mock.Mock(wraps=bigram_tokenize)
+        with mock.patch.dict('agents.retrieval.tokenizer.TOKENIZERS', {'bigram': tokenize}):
+            tool = EduSysRetrieverTool(docs, tokens, tokenizer='bigram')
+            tool.get_retriever(1)
+        tokenize.assert_not_called()
+        self.assertIn('第十八周', tool.search('期末考试', course_id=1)[0][0].page_content)
+        
+        # 分词方式改变后保存的分词结果不再使用
+        with mock.patch.dict('agents.retrieval.tokenizer.RETRIEVAL_CONFIG', {'TOKENIZER': 'whitespace'}):
+            self.assertEqual(load_indexed_knowledge_base()[1], [None])
+
+class KnowledgeEmbeddingTestCase(TestCase):
+    """
+    知识库文档向量生成和向量检索测试用例
+    """
+    
+    def setUp(self):
+        from agents.models import KnowledgeDocument
+        
+        for i, content in enumerate(['栈是后进先出的数据结构', '队列是先进先出的数据结构', '栈是后进先出的数据结构']):
+            KnowledgeDocument.objects.create(
+                source_type='course_outline',
+                source_id=i,
+                chunk_index=0,
+                content=content,
+                metadata={'course_id': 1}
+            )
+            
+    def fake_embed(self, texts, batch_size=None):
+        import numpy as np
+        
+        return np.array([[1.0, 0.0] if '栈' in text else [0.0, 1.0] for text in texts], dtype=np.float32)
+        
+    def test_embed_skips_unchanged_chunks(self):
+        """
+        测试批量生成向量时相同内容只编码一次，内容未变化的分块不再编码
+        """
+        from agents.models import KnowledgeDocument
+        from agents.knowledge_base import knowledge_base_embedder, load_indexed_knowledge_base
+        
+        with mock.patch('agents.knowledge_base.embedder.embed_texts', side_effect=self.fake_embed) as embed:
+            stats = knowledge_base_embedder.embed_documents()
+            self.assertEqual((stats.total, stats.embedded, stats.reused, stats.skipped), (3, 2, 1, 0))
+            self.assertEqual(len(embed.call_args[0][0]), 2)
+            
+            embed.reset_mock()
+            stats = knowledge_base_embedder.embed_documents()
+            self.assertEqual(stats.skipped, 3)
+            embed.assert_not_called()
+            
+            # 内容变化后旧向量不再加载，重新生成时只编码该分块
+            KnowledgeDocument.objects.filter(source_id=1).update(content='队列按先进先出顺序出队')
+            self.assertEqual(load_indexed_knowledge_base(with_embeddings=True)[2][1], None)
+            stats = knowledge_base_embedder.embed_documents(course_id=1)
+            self.assertEqual((stats.embedded, stats.skipped), (1, 2))
+            
+        docs, _, embeddings = load_indexed_knowledge_base(with_embeddings=True)
+        self.assertEqual(embeddings, [[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+        
+    def test_dense_retriever_mode(self):
+        """
+        测试向量检索按余弦相似度排序并限定课程范围，无法向量化查询时使用 BM25
+        """
+        from langchain.docstore.document import Document
+        from agents.tools.retriever_tool import EduSysRetrieverTool
+        
+        docs = [
+            Document(page_content='栈是后进先出的数据结构', metadata={'course_id': 1}),
+            Document(page_content='队列是先进先出的数据结构', metadata={'course_id': 1}),
+            Document(page_content='栈帧保存函数调用的局部变量', metadata={'course_id': 2}),
+        ]
+        tool = EduSysRetrieverTool(docs, embeddings=[[1.0, 0.0], [0.0, 1.0], [0.9, 0.1]], mode='dense')
+        
+        with mock.patch('agents.tools.retriever_tool.is_embedding_available', return_value=True), \
+             mock.patch('agents.tools.retriever_tool.embed_query', return_value=[0.0, 1.0]):
+            self.assertTrue(tool.uses_dense())
+            results = tool.search('先进先出', k=2)
+            self.assertEqual(results[0][0].page_content, '队列是先进先出的数据结构')
+            self.assertAlmostEqual(results[0][1], 1.0)
+            self.assertEqual(
+                [doc.metadata['course_id'] for doc, _ in tool.search('先进先出', course_id=2)],
+                [2]
+            )
+            
+        with mock.patch('agents.tools.retriever_tool.is_embedding_available', return_value=True), \
+             mock.patch('agents.tools.retriever_tool.embed_query', return_value=None):
+            self.assertIn('栈', tool.search('栈帧', k=1)[0][0].page_content)
+            
+    def test_update_schedules_embedding(self):
+        """
+        测试知识库更新后在后台生成向量，并通过管理命令报告吞吐量
+        """
+        from io import StringIO
+        from django.core.management import call_command
+        from agents.knowledge_base import knowledge_base_embedder
+        from agents.signals import knowledge_base_updated
+        
+        with mock.patch.object(knowledge_base_embedder, 'schedule') as schedule:
+            knowledge_base_updated.send(sender=self.__class__, course_id=1)
+        schedule.assert_called_once_with(1)
+        
+        out = StringIO()
+        with mock.patch('agents.knowledge_base.embedder.embed_texts', side_effect=self.fake_embed):
+            call_command('embed_knowledge_base', batch_size=2, stdout=out)
+        self.assertIn('编码 2 个', out.getvalue())
+        self.assertIn('分块/秒', out.getvalue())
+
+class KnowledgeEmbeddingCommandTestCase(TransactionTestCase):
+    """
+    知识库更新命令向量生成测试用例（后台线程使用自己的数据库连接，需要提交测试数据）
+    """
+    
+    def setUp(self):
+        from agents.models import KnowledgeDocument
+        
+        for i, content in enumerate(['栈是后进先出的数据结构', '队列是先进先出的数据结构', '栈是后进先出的数据结构']):
+            KnowledgeDocument.objects.create(
+                source_type='course_outline',
+                source_id=i,
+                chunk_index=0,
+                content=content,
+                metadata={'course_id': 1}
+            )
+            
+    def fake_embed(self, texts, batch_size=None):
+        import numpy as np
+        
+        return np.array([[1.0, 0.0] if '栈' in text else [0.0, 1.0] for text in texts], dtype=np.float32)
+        
+    def test_update_command_waits_for_embedding_and_bumps_index_version(self):
+        """
+        测试 update_knowledge_base 命令结束前等待后台向量生成完成，
+        向量检索模式下生成向量后递增检索索引版本号，使其他工作进程重新加载向量
+        """
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from agents.cache import index_versions
+        from agents.models import KnowledgeDocument
+        from agents.signals import knowledge_base_updated
+        from agents.knowledge_base import knowledge_base_embedder
+        import io
+        import threading
+        
+        cache.clear()
+        index_versions.clear_local()
+        started = threading.Event()
+        
+        def embed_texts(texts, batch_size=None):
+            # 模拟较慢的编码，命令不等待时会在编码完成前返回
+            started.set()
+            threading.Event().wait(0.2)
+            return self.fake_embed(texts, batch_size)
+            
+        def update_knowledge_base(force=False, course_id=None):
+            knowledge_base_updated.send(sender=self.__class__, course_id=course_id)
+            return []
+            
+        with mock.patch('agents.management.commands.update_knowledge_base.update_knowledge_base', side_effect=update_knowledge_base), \
+                mock.patch('agents.knowledge_base.embedder.is_embedding_available', return_value=True), \
+                mock.patch('agents.knowledge_base.embedder.embed_texts', side_effect=embed_texts), \
+                mock.patch('agents.knowledge_base.embedder.close_old_connections'), \
+                mock.patch.dict('agents.signals.TOOLS_CONFIG', {'edusys_retriever': {'mode': 'dense'}}), \
+                mock.patch('agents.signals.answer_cache'), \
+                mock.patch('agents.signals.semantic_answer_cache'):
+            version = index_versions.current()
+            call_command('update_knowledge_base', course_id=1, stdout=io.StringIO())
+            
+        self.assertTrue(started.is_set())
+        self.assertTrue(knowledge_base_embedder.wait(0))
+        self.assertEqual(KnowledgeDocument.objects.filter(embedding__isnull=False).count(), 3)
+        # 知识库更新和向量生成各递增一次
+        self.assertEqual(index_versions.current(), version + 2)
+        self.assertEqual(index_versions.changes(version, version + 2), {1})
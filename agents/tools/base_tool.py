@@ -1,17 +1,52 @@
 """
 工具基类定义
 """
+import logging
+import time
 from smolagents import Tool
+from agents.deadline import check_deadline
+from agents.tracing import record_tool_call
+
+# 配置日志
+logger = logging.getLogger(__name__)
 
 class BaseEduSysTool(Tool):
     """
     EduSys 工具基类
+    统一记录每次调用的耗时和结果；执行出错时把错误信息作为输出返回给代理，而不是中断代理运行，
+    请求已超时或被取消时不再执行
     """
+    # 执行出错时返回给代理的输出前缀
+    error_prefix = "工具执行失败"
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         
+    def __call__(self, *args, **kwargs):
+        """
+        调用工具并记录执行情况
+        """
+        tool_input = dict(kwargs)
+        tool_input.pop('sanitize_inputs_outputs', None)
+        if args:
+            tool_input['args'] = list(args)
+            
+        check_deadline()
+        
+        start_time = time.perf_counter()
+        try:
+            output = super().__call__(*args, **kwargs)
+        except Exception as e:
+            execution_time = time.perf_counter() - start_time
+            logger.error(f"工具 {self.name} 执行过程中发生错误: {str(e)}")
+            record_tool_call(self.name, tool_input, '', execution_time, success=False, error_message=str(e))
+            return f"{self.error_prefix}: {str(e)}"
+            
+        record_tool_call(self.name, tool_input, output, time.perf_counter() - start_time)
+        return output
+        
     def forward(self, *args, **kwargs):
         """
         工具执行方法，子类需要重写此方法
         """
-        raise NotImplementedError("子类必须实现 forward 方法")
\ No newline at end of file
+        raise NotImplementedError("子类必须实现 forward 方法")
@@ -0,0 +1,236 @@
+"""
+检索结果上下文打包
+对检索到的文档分块去重、合并同一来源中相邻或重叠的分块，并按相关度在令牌预算内截取，
+减少放入代理上下文的重复内容
+"""
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from langchain.docstore.document import Document
+from agents.config import CONTEXT_PACKING_CONFIG
+from agents.utils import char_tokens, estimate_tokens
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _Segment:
+    """
+    同一来源中连续的一段内容
+    """
+    metadata: Dict[str, Any]
+    content: str
+    score: float
+    start: Optional[int] = None
+    chunks: int = 1
+    
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.content)
+
+@dataclass
+class PackedContext:
+    """
+    打包结果
+    """
+    docs: List[Document] = field(default_factory=list)
+    original_tokens: int = 0
+    packed_tokens: int = 0
+    duplicate_chunks: int = 0
+    merged_chunks: int = 0
+    dropped_chunks: int = 0
+    
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.packed_tokens
+
+def _source_key(doc: Document, index: int) -> Tuple:
+    """
+    文档来源，没有来源信息的文档各自独立
+    """
+    source_type = doc.metadata.get('source_type')
+    source_id = doc.metadata.get('source_id')
+    if source_type is None or source_id is None:
+        return ('__doc__', index)
+    return (source_type, source_id)
+
+def _overlap(left: str, right: str, min_overlap: int) -> int:
+    """
+    left 的结尾与 right 的开头重叠的最大长度，小于 min_overlap 时为0
+    """
+    for size in range(min(len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def _trim(text: str, max_tokens: int) -> str:
+    """
+    截取不超过令牌预算的前缀
+    """
+    tokens = 0.0
+    for i, char in enumerate(text):
+        tokens += char_tokens(char)
+        if tokens > max_tokens:
+            return text[:i]
+    return text
+
+class ContextPacker:
+    """
+    检索结果上下文打包器
+    """
+    
+    def __init__(self,
+                 max_tokens: Optional[int] = None,
+                 min_overlap: Optional[int] = None,
+                 min_trim_tokens: Optional[int] = None):
+        """
+        初始化打包器
+        
+        Args:
+            max_tokens (Optional[int]): 令牌预算
+            min_overlap (Optional[int]): 判定两个分块重叠的最小重叠字符数
+            min_trim_tokens (Optional[int]): 剩余预算少于该值时不再截取下一段内容
+        """
+        self.max_tokens = max_tokens or CONTEXT_PACKING_CONFIG['MAX_TOKENS']
+        self.min_overlap = min_overlap or CONTEXT_PACKING_CONFIG['MIN_OVERLAP']
+        self.min_trim_tokens = min_trim_tokens or CONTEXT_PACKING_CONFIG['MIN_TRIM_TOKENS']
+        
+        # 累计统计
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._original_tokens = 0
+        self._packed_tokens = 0
+        
+    def _merge(self, segment: _Segment, doc: Document, score: float) -> bool:
+        """
+        尝试把分块合并到同一来源的内容段中
+        
+        Returns:
+            bool: 是否已合并（包括完全重复）
+        """
+        content = doc.page_content
+        start = doc.metadata.get('start_index')
+        
+        if segment.start is not None and isinstance(start, int):
+            # 分块带有原文偏移量时按偏移量判断相邻或重叠
+            end = start + len(content)
+            if start > segment.end or end < segment.start:
+                return False
+            merged_start = min(start, segment.start)
+            merged = [''] * (max(end, segment.end) - merged_start)
+            merged[start - merged_start:end - merged_start] = content
+            merged[segment.start - merged_start:segment.end - merged_start] = segment.content
+            segment.content = ''.join(merged)
+            segment.start = merged_start
+        elif content in segment.content:
+            pass
+        elif segment.content in content:
+            segment.content = content
+            segment.start = None
+        else:
+            # 没有偏移量时按文本重叠判断（分块时相邻分块之间有重叠部分）
+            overlap = _overlap(segment.content, content, self.min_overlap)
+            if overlap:
+                segment.content += content[overlap:]
+            else:
+                overlap = _overlap(content, segment.content, self.min_overlap)
+                if not overlap:
+                    return False
+                segment.content = content + segment.content[overlap:]
+            segment.start = None
+            
+        segment.score = max(segment.score, score)
+        segment.chunks += 1
+        return True
+        
+    def pack(self, scored_docs: List[Tuple[Document, float]], max_tokens: Optional[int] = None) -> PackedContext:
+        """
+        打包检索结果
+        
+        Args:
+            scored_docs (List[Tuple[Document, float]]): (文档, 分数) 列表
+            max_tokens (Optional[int]): 令牌预算，为None时使用默认值
+            
+        Returns:
+            PackedContext: 打包结果，文档按分数从高到低排列
+        """
+        max_tokens = max_tokens or self.max_tokens
+        packed = PackedContext()
+        
+        segments: Dict[Tuple, List[_Segment]] = {}
+        seen = set()
+        for index, (doc, score) in enumerate(scored_docs):
+            packed.original_tokens += estimate_tokens(doc.page_content)
+            
+            key = _source_key(doc, index)
+            if (key, doc.page_content) in seen:
+                packed.duplicate_chunks += 1
+                continue
+            seen.add((key, doc.page_content))
+            
+            source_segments = segments.setdefault(key, [])
+            if any(self._merge(segment, doc, score) for segment in source_segments):
+                packed.merged_chunks += 1
+                continue
+                
+            start = doc.metadata.get('start_index')
+            source_segments.append(_Segment(
+                metadata=dict(doc.metadata),
+                content=doc.page_content,
+                score=score,
+                start=start if isinstance(start, int) else None
+            ))
+            
+        ordered = sorted(
+            (segment for source_segments in segments.values() for segment in source_segments),
+            key=lambda segment: segment.score,
+            reverse=True
+        )
+        
+        # 按分数从高到低放入，超出预算的内容段截断，剩余预算太少时丢弃
+        remaining = max_tokens
+        for segment in ordered:
+            tokens = estimate_tokens(segment.content)
+            content = segment.content
+            if tokens > remaining:
+                if remaining < self.min_trim_tokens:
+                    packed.dropped_chunks += segment.chunks
+                    continue
+                content = _trim(content, remaining)
+                tokens = estimate_tokens(content)
+                
+            metadata = dict(segment.metadata, score=segment.score, merged_chunks=segment.chunks)
+            metadata.pop('start_index', None)
+            packed.docs.append(Document(page_content=content, metadata=metadata))
+            packed.packed_tokens += tokens
+            remaining -= tokens
+            
+        with self._lock:
+            self._calls += 1
+            self._original_tokens += packed.original_tokens
+            self._packed_tokens += packed.packed_tokens
+            
+        logger.debug(
+            f"检索结果打包完成: {len(scored_docs)} 个分块 -> {len(packed.docs)} 段，"
+            f"令牌 {packed.original_tokens} -> {packed.packed_tokens}，节省 {packed.saved_tokens}"
+        )
+        return packed
+        
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取累计统计
+        
+        Returns:
+            Dict[str, Any]: 打包次数、打包前后的令牌数和节省的令牌数
+        """
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'original_tokens': self._original_tokens,
+                'packed_tokens': self._packed_tokens,
+                'saved_tokens': self._original_tokens - self._packed_tokens,
+            }
+
+# 全局上下文打包器实例
+context_packer = ContextPacker()
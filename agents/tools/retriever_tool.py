@@ -2,18 +2,31 @@
 EduSys 检索工具实现
 """
 import logging
-from typing import List, Optional, Dict, Any
-from smolagents import Tool
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Dict, Any, Tuple
 from langchain.docstore.document import Document
-from langchain_community.retrievers import BM25Retriever
+from agents.cache import index_versions
+from agents.config import CONTEXT_PACKING_CONFIG, TOOLS_CONFIG
+from agents.embeddings import embed_query, is_embedding_available
+from agents.retrieval import DenseIndex, InvertedIndex, get_tokenizer, get_tokenizer_name
+from agents.tools.base_tool import BaseEduSysTool
+from agents.tools.context_packer import context_packer
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-class EduSysRetrieverTool(Tool):
+class EduSysRetrieverTool(BaseEduSysTool):
     """
     EduSys 检索工具
     用于检索 EduSys 系统中的课程内容、公告和作业标准答案
+    全量检索使用可增量更新的倒排索引，课程文档更新时只改动该课程分块的倒排表；
+    课程范围的检索索引在首次检索该课程时用全量索引中的词频构建，不重新分词，
+    缓存在有容量上限的 LRU 中，只在该课程的知识库文档更新后重建。
+    知识库在其他进程中更新（如 update_knowledge_base 命令）时，检索前比对共享缓存中的检索索引版本号，
+    重新加载变化的课程文档。
+    文档和查询使用同一个分词函数（默认按中文相邻两字切分）。
+    配置为向量检索（dense）时按文档向量的余弦相似度检索，没有可用向量时仍使用 BM25
     """
     name = "edusys_retriever"
     description = "检索 EduSys 系统中的课程内容、公告和作业标准答案"
@@ -30,19 +43,185 @@ class EduSysRetrieverTool(Tool):
         }
     }
     output_type = "string"
+    error_prefix = "检索失败"
 
-    def __init__(self, docs: List[Document], **kwargs):
+    def __init__(self,
+                 docs: List[Document],
+                 tokens: Optional[List[Optional[List[str]]]] = None,
+                 embeddings: Optional[List[Optional[List[float]]]] = None,
+                 tokenizer: Optional[str] = None,
+                 mode: Optional[str] = None,
+                 max_courses: Optional[int] = None,
+                 max_chunks: Optional[int] = None,
+                 loader: Optional[Callable[[Optional[int]], Tuple[List[Document], List, List]]] = None,
+                 version: Optional[int] = None,
+                 **kwargs):
         """
         初始化检索工具
         
         Args:
             docs (List[Document]): 知识库文档列表
+            tokens (Optional[List[Optional[List[str]]]]): 每个文档已保存的分词结果，为None的文档重新分词
+            embeddings (Optional[List[Optional[List[float]]]]): 每个文档的向量，没有向量的文档不参与向量检索
+            tokenizer (Optional[str]): 分词方式，为None时使用配置
+            mode (Optional[str]): 检索方式：bm25 或 dense，为None时使用配置
+            max_courses (Optional[int]): 缓存的课程检索索引数上限
+            max_chunks (Optional[int]): 缓存的课程检索索引包含的文档分块总数上限
+            loader (Optional[Callable]): 按课程加载知识库文档、分词结果和向量的函数（课程ID为None时加载全部），
+                检索索引版本号变化时用于重新加载；为None时不检查版本号
+            version (Optional[int]): 传入文档对应的检索索引版本号，为None时使用当前版本号
         """
         super().__init__(**kwargs)
-        self.docs = docs
-        # 初始化检索器
-        self.retriever = BM25Retriever.from_documents(docs, k=10)
+        self.tokenizer = get_tokenizer_name(tokenizer)
+        self.tokenize = get_tokenizer(self.tokenizer)
+        config = TOOLS_CONFIG['edusys_retriever']
+        self.mode = mode or config['mode']
+        self.max_courses = max_courses or config['course_index_max_courses']
+        self.max_chunks = max_chunks or config['course_index_max_chunks']
         
+        # 课程检索索引 LRU，按最近使用排列
+        self._lock = threading.Lock()
+        self._course_indexes: 'OrderedDict[int, InvertedIndex]' = OrderedDict()
+        self._cached_chunks = 0
+        self._hits = 0
+        self._misses = 0
+        
+        # 已加载文档对应的检索索引版本号
+        self.loader = loader
+        self.version = version if version is not None else index_versions.current()
+        self._sync_lock = threading.Lock()
+        
+        self.set_docs(docs, tokens, embeddings)
+        
+    def set_docs(self,
+                 docs: List[Document],
+                 tokens: Optional[List[Optional[List[str]]]] = None,
+                 embeddings: Optional[List[Optional[List[float]]]] = None):
+        """
+        替换全部知识库文档，按课程分组并重建全量倒排索引和向量索引，清空课程检索索引
+        
+        Args:
+            docs (List[Document]): 知识库文档列表
+            tokens (Optional[List[Optional[List[str]]]]): 每个文档已保存的分词结果，为None的文档重新分词
+            embeddings (Optional[List[Optional[List[float]]]]): 每个文档的向量
+        """
+        course_docs: Dict[int, List[Document]] = {}
+        course_keys: Dict[int, List[int]] = {}
+        for key, doc in enumerate(docs):
+            doc_course_id = doc.metadata.get('course_id')
+            if doc_course_id is not None:
+                course_docs.setdefault(doc_course_id, []).append(doc)
+                course_keys.setdefault(doc_course_id, []).append(key)
+                
+        index = InvertedIndex.from_documents(docs, tokens=tokens, preprocess_func=self.tokenize)
+        dense_index = DenseIndex.from_documents(docs, embeddings if embeddings is not None else [None] * len(docs))
+        with self._lock:
+            self._course_docs = course_docs
+            self._course_keys = course_keys
+            self._next_key = len(docs)
+            # 初始化检索索引
+            self.index = index
+            self.dense_index = dense_index
+            self._course_indexes.clear()
+            self._cached_chunks = 0
+            
+    @property
+    def docs(self) -> List[Document]:
+        """
+        全部知识库文档
+        """
+        return self.index.docs
+        
+    def update_course_docs(self,
+                           course_id: int,
+                           docs: List[Document],
+                           tokens: Optional[List[Optional[List[str]]]] = None,
+                           embeddings: Optional[List[Optional[List[float]]]] = None):
+        """
+        替换一门课程的知识库文档：在全量倒排索引和向量索引中只删除和添加该课程的分块，并使该课程的检索索引失效
+        
+        Args:
+            course_id (int): 课程ID
+            docs (List[Document]): 该课程更新后的文档列表
+            tokens (Optional[List[Optional[List[str]]]]): 每个文档已保存的分词结果，为None的文档重新分词
+            embeddings (Optional[List[Optional[List[float]]]]): 每个文档的向量
+        """
+        tokens = tokens if tokens is not None else [None] * len(docs)
+        embeddings = embeddings if embeddings is not None else [None] * len(docs)
+        with self._lock:
+            old_keys = self._course_keys.pop(course_id, [])
+            new_keys = list(range(self._next_key, self._next_key + len(docs)))
+            self._next_key += len(docs)
+            
+            for key in old_keys:
+                self.index.remove(key)
+                self.dense_index.remove(key)
+            for key, doc, doc_tokens, embedding in zip(new_keys, docs, tokens, embeddings):
+                self.index.add(key, doc, doc_tokens)
+                if embedding is not None:
+                    self.dense_index.add(key, doc, embedding)
+                
+            if docs:
+                self._course_docs[course_id] = list(docs)
+                self._course_keys[course_id] = new_keys
+            else:
+                self._course_docs.pop(course_id, None)
+            self._evict(course_id)
+            
+        logger.info(f"课程 {course_id} 的检索文档已更新: 删除 {len(old_keys)} 个分块，添加 {len(docs)} 个分块")
+        
+    def sync(self, loader: Optional[Callable[[Optional[int]], Tuple[List[Document], List, List]]] = None):
+        """
+        比对检索索引版本号，版本号变化后重新加载变化过的课程文档（全局版本变化时重新加载全部文档）
+        版本号在进程内缓存 VERSION_TTL 秒，版本号未变化时不访问数据库
+        
+        Args:
+            loader (Optional[Callable]): 加载知识库文档的函数，为None时使用初始化时传入的函数
+        """
+        loader = loader or self.loader
+        if loader is None:
+            return
+            
+        try:
+            version = index_versions.current()
+            if version == self.version:
+                return
+                
+            with self._sync_lock:
+                if version == self.version:
+                    return
+                course_ids = index_versions.changes(self.version, version)
+                if course_ids is None:
+                    self.set_docs(*loader(None))
+                else:
+                    for course_id in sorted(course_ids):
+                        self.update_course_docs(course_id, *loader(course_id))
+                self.version = version
+                
+            logger.info(f"检索索引已同步到版本 {version}: {'全部课程' if course_ids is None else sorted(course_ids)}")
+            
+        except Exception as e:
+            # 同步失败时继续使用已加载的文档，下次检索时重试
+            logger.error(f"同步检索索引时发生错误: {str(e)}")
+            
+    def invalidate_course(self, course_id: int):
+        """
+        丢弃一门课程的检索索引，下次检索该课程时重建
+        
+        Args:
+            course_id (int): 课程ID
+        """
+        with self._lock:
+            self._evict(course_id)
+            
+    def _evict(self, course_id: int):
+        """
+        从 LRU 中移除课程检索索引（调用方持有锁）
+        """
+        index = self._course_indexes.pop(course_id, None)
+        if index is not None:
+            self._cached_chunks -= len(index)
+            
     def filter_docs_by_course(self, course_id: int) -> List[Document]:
         """
         根据课程ID过滤文档
@@ -53,14 +232,131 @@ class EduSysRetrieverTool(Tool):
         Returns:
             List[Document]: 过滤后的文档列表
         """
-        filtered_docs = []
-        for doc in self.docs:
-            # 检查文档元数据中的课程ID
-            doc_course_id = doc.metadata.get('course_id')
-            if doc_course_id is not None and doc_course_id == course_id:
-                filtered_docs.append(doc)
-        return filtered_docs
+        with self._lock:
+            return list(self._course_docs.get(course_id, []))
     
+    def get_retriever(self, course_id: Optional[int] = None) -> InvertedIndex:
+        """
+        获取检索范围对应的检索索引
+        
+        Args:
+            course_id (Optional[int]): 课程ID，为None时检索全部文档
+            
+        Returns:
+            InvertedIndex: 检索索引
+        """
+        self.sync()
+        
+        if course_id is None:
+            return self.index
+            
+        with self._lock:
+            index = self._course_indexes.get(course_id)
+            if index is not None:
+                self._course_indexes.move_to_end(course_id)
+                self._hits += 1
+                return index
+            self._misses += 1
+            filtered_docs = self._course_docs.get(course_id)
+            filtered_keys = self._course_keys.get(course_id, [])
+            
+        if not filtered_docs:
+            # 如果没有过滤到文档，则使用全部文档检索
+            logger.warning(f"课程ID {course_id} 未找到相关文档，使用全部文档进行检索")
+            return self.index
+            
+        # 在锁外构建索引，复用全量索引中的词频，并发构建同一课程时以先完成的为准
+        index = InvertedIndex.from_documents(
+            filtered_docs,
+            tokens=[self.index.term_freqs(key) for key in filtered_keys],
+            preprocess_func=self.tokenize
+        )
+        with self._lock:
+            if self._course_docs.get(course_id) is not filtered_docs:
+                # 构建期间课程文档已更新，本次结果不缓存
+                return index
+            cached = self._course_indexes.get(course_id)
+            if cached is not None:
+                return cached
+            if len(filtered_docs) <= self.max_chunks:
+                self._course_indexes[course_id] = index
+                self._cached_chunks += len(filtered_docs)
+                # 超出容量时淘汰最久未使用的课程
+                while len(self._course_indexes) > self.max_courses or self._cached_chunks > self.max_chunks:
+                    self._evict(next(iter(self._course_indexes)))
+        return index
+        
+    def index_stats(self) -> Dict[str, Any]:
+        """
+        获取检索索引统计
+        
+        Returns:
+            Dict[str, Any]: 全量倒排索引和向量索引统计、检索方式、分词方式，以及缓存的课程数、分块数和命中情况
+        """
+        with self._lock:
+            return {
+                'index': self.index.stats(),
+                'dense_index': self.dense_index.stats(),
+                'mode': self.mode,
+                'tokenizer': self.tokenizer,
+                'courses': len(self._course_indexes),
+                'chunks': self._cached_chunks,
+                'max_courses': self.max_courses,
+                'max_chunks': self.max_chunks,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+        
+    def uses_dense(self) -> bool:
+        """
+        判断当前是否使用向量检索：配置为 dense、已有文档向量且向量模型可用
+        
+        Returns:
+            bool: 是否使用向量检索
+        """
+        return self.mode == 'dense' and len(self.dense_index) > 0 and is_embedding_available()
+        
+    def dense_search(self, query: str, course_id: Optional[int] = None, k: int = 10) -> Optional[List[Tuple[Document, float]]]:
+        """
+        按文档向量检索
+        
+        Args:
+            query (str): 查询内容
+            course_id (Optional[int]): 课程ID，用于限定检索范围
+            k (int): 返回的文档数
+            
+        Returns:
+            Optional[List[Tuple[Document, float]]]: (文档, 余弦相似度) 列表，无法向量化查询时为None
+        """
+        self.sync()
+        
+        query_vector = embed_query(query)
+        if query_vector is None:
+            return None
+            
+        with self._lock:
+            has_course_docs = course_id is not None and course_id in self._course_docs
+        doc_filter = (lambda doc: doc.metadata.get('course_id') == course_id) if has_course_docs else None
+        return self.dense_index.search(query_vector, k, doc_filter)
+        
+    def search(self, query: str, course_id: Optional[int] = None, k: int = 10) -> List[Tuple[Document, float]]:
+        """
+        检索文档并返回分数（BM25 分数，向量检索时为余弦相似度），供单次检索回答判断检索置信度
+        
+        Args:
+            query (str): 查询内容
+            course_id (Optional[int]): 课程ID，用于限定检索范围
+            k (int): 返回的文档数
+            
+        Returns:
+            List[Tuple[Document, float]]: (文档, 分数) 列表，按分数从高到低排列
+        """
+        if self.uses_dense():
+            results = self.dense_search(query, course_id, k)
+            if results:
+                return results
+        return self.get_retriever(course_id).search(query, k, fill=True)
+        
     def format_results(self, docs: List[Document]) -> str:
         """
         格式化检索结果
@@ -92,29 +388,21 @@ class EduSysRetrieverTool(Tool):
         Returns:
             str: 检索结果
         """
-        try:
-            # 参数验证
-            assert isinstance(query, str), "查询内容必须是字符串"
-            
-            # 根据课程ID过滤文档
-            if course_id is not None:
-                filtered_docs = self.filter_docs_by_course(course_id)
-                if filtered_docs:
-                    # 使用过滤后的文档创建临时检索器
-                    temp_retriever = BM25Retriever.from_documents(filtered_docs, k=10)
-                    retrieved_docs = temp_retriever.invoke(query)
-                else:
-                    # 如果没有过滤到文档，则使用全部文档检索
-                    logger.warning(f"课程ID {course_id} 未找到相关文档，使用全部文档进行检索")
-                    retrieved_docs = self.retriever.invoke(query)
-            else:
-                # 不限制课程范围，使用全部文档检索
-                retrieved_docs = self.retriever.invoke(query)
+        # 参数验证（执行出错时由基类记录并返回"检索失败"）
+        assert isinstance(query, str), "查询内容必须是字符串"
+        
+        if not CONTEXT_PACKING_CONFIG['ENABLED']:
+            # 根据课程ID限定检索范围
+            retrieved_docs = [doc for doc, _ in self.search(query, course_id)]
+            return self.format_results(retrieved_docs)
             
-            # 格式化结果
-            result = self.format_results(retrieved_docs)
-            return result
+        # 去重、合并相邻分块并限制在令牌预算内
+        packed = context_packer.pack(self.search(query, course_id))
+        if packed.saved_tokens:
+            logger.info(
+                f"检索结果已打包: 令牌 {packed.original_tokens} -> {packed.packed_tokens}，"
+                f"节省 {packed.saved_tokens}"
+            )
             
-        except Exception as e:
-            logger.error(f"检索过程中发生错误: {str(e)}")
-            return f"检索失败: {str(e)}"
\ No newline at end of file
+        # 格式化结果
+        return self.format_results(packed.docs)
\ No newline at end of file
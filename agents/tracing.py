@@ -0,0 +1,317 @@
+"""
+AI 代理执行追踪
+在一次代理运行期间收集每个步骤的耗时、令牌用量和工具调用情况，
+保存交互记录后由后台线程批量写入 AgentStep 和 ToolUsage
+"""
+import atexit
+import contextvars
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from django.db import close_old_connections
+from agents.config import TRACE_CONFIG
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class RunTrace:
+    """
+    一次代理运行的追踪记录
+    """
+    
+    def __init__(self, agent_type: str = 'question_answering'):
+        """
+        初始化追踪记录
+        
+        Args:
+            agent_type (str): 代理类型
+        """
+        self.agent_type = agent_type
+        self.tool_usages: List[Dict[str, Any]] = []
+        self.agent_steps: List[Dict[str, Any]] = []
+        # 当前步骤内模型调用的累计耗时
+        self._llm_duration = 0.0
+        
+    def add_llm_duration(self, duration: float):
+        """
+        累加当前步骤的模型调用耗时
+        
+        Args:
+            duration (float): 模型调用耗时（秒）
+        """
+        self._llm_duration += duration
+        
+    def pop_llm_duration(self) -> float:
+        """
+        取出并清零当前步骤的模型调用耗时
+        
+        Returns:
+            float: 模型调用耗时（秒）
+        """
+        duration, self._llm_duration = self._llm_duration, 0.0
+        return duration
+
+# 当前代理运行的追踪记录
+_current_trace: contextvars.ContextVar[Optional[RunTrace]] = contextvars.ContextVar(
+    'edusys_run_trace', default=None
+)
+
+@contextmanager
+def collect_trace(agent_type: str = 'question_answering'):
+    """
+    在上下文中收集代理运行的追踪记录
+    
+    Args:
+        agent_type (str): 代理类型
+        
+    Yields:
+        RunTrace: 追踪记录，上下文内的模型调用、代理步骤和工具调用会记录到其中
+    """
+    trace = RunTrace(agent_type)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # 流式响应的生成器可能在其他上下文中结束
+            _current_trace.set(None)
+
+def get_current_trace() -> Optional[RunTrace]:
+    """
+    获取当前代理运行的追踪记录
+    
+    Returns:
+        Optional[RunTrace]: 追踪记录，不在收集上下文中或追踪已关闭时为None
+    """
+    if not TRACE_CONFIG['ENABLED']:
+        return None
+    return _current_trace.get()
+
+def _to_json(value: Any) -> Any:
+    """
+    将工具输入转换为可以保存到 JSONField 的值
+    """
+    return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+
+def record_tool_call(tool_name: str,
+                     tool_input: Dict[str, Any],
+                     tool_output: Any,
+                     execution_time: float,
+                     success: bool = True,
+                     error_message: str = ''):
+    """
+    记录一次工具调用，不在收集上下文中时忽略
+    
+    Args:
+        tool_name (str): 工具名称
+        tool_input (Dict[str, Any]): 工具输入
+        tool_output (Any): 工具输出
+        execution_time (float): 执行时间（秒）
+        success (bool): 是否成功执行
+        error_message (str): 错误信息
+    """
+    trace = get_current_trace()
+    if trace is None:
+        return
+        
+    trace.tool_usages.append({
+        'tool_name': tool_name,
+        'tool_input': _to_json(tool_input),
+        'tool_output': str(tool_output)[:TRACE_CONFIG['OUTPUT_MAX_LENGTH']],
+        'execution_time': execution_time,
+        'success': success,
+        'error_message': error_message,
+    })
+
+def record_model_call(duration: float):
+    """
+    记录一次模型调用的耗时，不在收集上下文中时忽略
+    
+    Args:
+        duration (float): 模型调用耗时（秒）
+    """
+    trace = get_current_trace()
+    if trace is not None:
+        trace.add_llm_duration(duration)
+
+def record_action_step(memory_step, agent=None):
+    """
+    smolagents 动作步骤回调，记录步骤的耗时、令牌用量和工具调用
+    步骤总耗时减去模型调用耗时即为代码和工具的执行耗时
+    
+    Args:
+        memory_step (ActionStep): 动作步骤
+        agent: 执行步骤的代理
+    """
+    trace = get_current_trace()
+    if trace is None:
+        return
+        
+    duration = memory_step.timing.duration if memory_step.timing else None
+    llm_duration = trace.pop_llm_duration()
+    token_usage = memory_step.token_usage
+    
+    trace.agent_steps.append({
+        'agent_type': trace.agent_type,
+        'step_number': memory_step.step_number,
+        'duration': duration,
+        'llm_duration': llm_duration,
+        'execution_time': max(duration - llm_duration, 0.0) if duration is not None else None,
+        'input_tokens': token_usage.input_tokens if token_usage else None,
+        'output_tokens': token_usage.output_tokens if token_usage else None,
+        'tool_calls': _to_json([
+            {'name': tool_call.name, 'arguments': tool_call.arguments}
+            for tool_call in memory_step.tool_calls or []
+        ]),
+        'is_final_answer': memory_step.is_final_answer,
+        'error_message': str(memory_step.error) if memory_step.error else '',
+    })
+
+def record_answer_step(duration: float,
+                       input_tokens: Optional[int] = None,
+                       output_tokens: Optional[int] = None,
+                       tool_calls: Optional[List[Dict[str, Any]]] = None):
+    """
+    记录不经过代理循环的单次回答（如单次检索回答），作为一个最终回答步骤
+    
+    Args:
+        duration (float): 总耗时（秒）
+        input_tokens (Optional[int]): 输入令牌数
+        output_tokens (Optional[int]): 输出令牌数
+        tool_calls (Optional[List[Dict[str, Any]]]): 调用的工具，包含 name 和 arguments
+    """
+    trace = get_current_trace()
+    if trace is None:
+        return
+        
+    llm_duration = trace.pop_llm_duration()
+    trace.agent_steps.append({
+        'agent_type': trace.agent_type,
+        'step_number': 1,
+        'duration': duration,
+        'llm_duration': llm_duration,
+        'execution_time': max(duration - llm_duration, 0.0),
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'tool_calls': _to_json(tool_calls or []),
+        'is_final_answer': True,
+        'error_message': '',
+    })
+
+def record_planning_step(memory_step, agent=None):
+    """
+    smolagents 规划步骤回调，规划的模型调用耗时不计入下一个动作步骤
+    
+    Args:
+        memory_step (PlanningStep): 规划步骤
+        agent: 执行步骤的代理
+    """
+    trace = get_current_trace()
+    if trace is not None:
+        trace.pop_llm_duration()
+
+class TraceRecorder:
+    """
+    追踪记录写入器
+    记录先进入内存缓冲区，由后台线程定期或攒够一批后用 bulk_create 写入，不占用请求线程
+    """
+    
+    def __init__(self, batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        """
+        初始化写入器
+        
+        Args:
+            batch_size (Optional[int]): 攒够多少条记录后立即写入
+            flush_interval (Optional[float]): 最长写入间隔（秒）
+        """
+        self.batch_size = batch_size or TRACE_CONFIG['BATCH_SIZE']
+        self.flush_interval = flush_interval or TRACE_CONFIG['FLUSH_INTERVAL']
+        
+        self._tool_usages: List[Dict[str, Any]] = []
+        self._agent_steps: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        
+    def record(self, interaction_id: int, trace: Optional[RunTrace]):
+        """
+        登记交互记录的追踪记录
+        
+        Args:
+            interaction_id (int): 交互记录ID
+            trace (Optional[RunTrace]): 追踪记录
+        """
+        if trace is None or not (trace.tool_usages or trace.agent_steps):
+            return
+            
+        with self._lock:
+            self._tool_usages.extend(dict(usage, interaction_id=interaction_id) for usage in trace.tool_usages)
+            self._agent_steps.extend(dict(step, interaction_id=interaction_id) for step in trace.agent_steps)
+            full = len(self._tool_usages) + len(self._agent_steps) >= self.batch_size
+            self._ensure_thread()
+            
+        if full:
+            self._wakeup.set()
+            
+    def _ensure_thread(self):
+        """
+        启动后台写入线程（调用方持有锁）
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='trace-recorder', daemon=True)
+            self._thread.start()
+            
+    def _run(self):
+        """
+        后台写入循环
+        """
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"写入追踪记录时发生错误: {str(e)}")
+            finally:
+                close_old_connections()
+                
+    def flush(self) -> int:
+        """
+        立即写入缓冲区中的全部记录
+        
+        Returns:
+            int: 写入的记录数
+        """
+        from agents.models import AgentStep, ToolUsage
+        
+        with self._lock:
+            tool_usages, self._tool_usages = self._tool_usages, []
+            agent_steps, self._agent_steps = self._agent_steps, []
+            
+        if agent_steps:
+            AgentStep.objects.bulk_create([AgentStep(**step) for step in agent_steps], batch_size=self.batch_size)
+        if tool_usages:
+            ToolUsage.objects.bulk_create([ToolUsage(**usage) for usage in tool_usages], batch_size=self.batch_size)
+            
+        count = len(tool_usages) + len(agent_steps)
+        if count:
+            logger.debug(f"已写入 {len(agent_steps)} 条代理步骤记录和 {len(tool_usages)} 条工具使用记录")
+        return count
+
+# 全局追踪记录写入器实例（每个工作进程一个）
+trace_recorder = TraceRecorder()
+
+@atexit.register
+def _flush_on_exit():
+    """
+    进程退出前写入剩余记录
+    """
+    try:
+        trace_recorder.flush()
+    except Exception as e:
+        logger.error(f"进程退出时写入追踪记录失败: {str(e)}")
@@ -2,7 +2,7 @@
 AI 助手 URL 路由配置
 """
 from django.urls import path, include
-from agents import views
+from agents import views, async_views
 
 app_name = 'agents'
 
@@ -10,16 +10,26 @@ urlpatterns = [
     # AI 交互接口
     path('interactions/', views.ai_interactions_history, name='ai_interactions_history'),
     path('interactions/<int:interaction_id>/', views.ai_interaction_detail, name='ai_interaction_detail'),
+    path('interactions/<int:interaction_id>/status/', views.ai_interaction_status, name='ai_interaction_status'),
     path('interactions/<int:interaction_id>/feedback/', views.ai_feedback_view, name='ai_feedback'),
     
     # 课程相关的 AI 助手接口
     path('courses/<int:course_id>/ask/', views.ai_assistant_view, name='ai_assistant'),
+    path('courses/<int:course_id>/ask/stream/', views.ai_assistant_stream_view, name='ai_assistant_stream'),
+    path('courses/<int:course_id>/ask/batch/', views.ai_assistant_batch_view, name='ai_assistant_batch'),
     
     # 通用 AI 助手接口
     path('ai-assistant/', views.ai_assistant_page, name='ai_assistant_page'),
     path('ai-assistant/ask/', views.general_ai_assistant_view, name='general_ai_assistant'),
+    path('ai-assistant/ask/stream/', views.general_ai_assistant_stream_view, name='general_ai_assistant_stream'),
     path('ai-assistant/clear/', views.clear_chat_history, name='clear_chat_history'),
     
+    # 异步（ASGI）接口
+    path('async/interactions/', async_views.ai_interactions_history, name='async_ai_interactions_history'),
+    path('async/interactions/<int:interaction_id>/', async_views.ai_interaction_detail, name='async_ai_interaction_detail'),
+    path('async/courses/<int:course_id>/ask/', async_views.ai_assistant_view, name='async_ai_assistant'),
+    path('async/ai-assistant/ask/', async_views.general_ai_assistant_view, name='async_general_ai_assistant'),
+    
     # API 接口
     path('api/', include('agents.api.urls')),
 ]
\ No newline at end of file
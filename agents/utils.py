@@ -3,6 +3,8 @@ AI 助手通用工具函数
 """
 import json
 import logging
+import re
+import unicodedata
 from typing import Dict, Any, Optional
 from django.core.paginator import Paginator
 from django.http import JsonResponse
@@ -45,6 +47,19 @@ def format_success_response(data: Dict[str, Any]) -> Dict[str, Any]:
         "data": data
     }
 
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    格式化 Server-Sent Events 消息
+    
+    Args:
+        event (str): 事件类型
+        data (Dict[str, Any]): 事件数据
+        
+    Returns:
+        str: SSE 消息文本
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 def paginate_queryset(queryset, request, limit: int = 20) -> Dict[str, Any]:
     """
     分页查询结果集
@@ -131,4 +146,100 @@ def sanitize_input(text: str) -> str:
     for char in dangerous_chars:
         text = text.replace(char, '')
     
-    return text.strip()
\ No newline at end of file
+    return text.strip()
+
+def normalize_query(text: str) -> str:
+    """
+    规范化用户提问，用于缓存和请求合并的键
+    统一全角/半角和大小写，去除标点并合并空白
+    
+    Args:
+        text (str): 用户提问
+        
+    Returns:
+        str: 规范化后的提问
+    """
+    if not text:
+        return ""
+    
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = ''.join(' ' if unicodedata.category(char).startswith('P') else char for char in text)
+    # 中文之间的空白没有意义，直接去掉
+    text = re.sub(r'(?<=[\u4e00-\u9fff])\s+|\s+(?=[\u4e00-\u9fff])', '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+# 请求处理过程中写入上下文的记录字段（缓存命中、追踪、会话、模型路由、停止原因），不放入代理的提示词
+INTERNAL_CONTEXT_KEYS = frozenset({
+    'cache_hit',
+    'run_trace',
+    'session_id',
+    'with_history',
+    'model_route',
+    'route_reason',
+    'stop_reason',
+})
+
+# 提问者的身份字段：代理没有按用户查询的工具，回答不依赖提问者，不放入代理的提示词，
+# 不同用户提出的相同问题可以合并运行和共享缓存
+USER_CONTEXT_KEYS = frozenset({
+    'student_id',
+    'user_id',
+})
+
+def agent_context(context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    获取放入代理提示词的上下文，去掉请求处理过程中写入的记录字段和提问者的身份字段
+    
+    Args:
+        context (Optional[Dict[str, Any]]): 上下文信息
+        
+    Returns:
+        Dict[str, Any]: 新的上下文字典
+    """
+    return {
+        key: value for key, value in (context or {}).items()
+        if key not in INTERNAL_CONTEXT_KEYS and key not in USER_CONTEXT_KEYS
+    }
+
+def context_fingerprint(context: Optional[Dict[str, Any]]) -> str:
+    """
+    代理可见上下文的稳定文本表示，用于缓存和请求合并的键：代理看到的上下文不同时回答可能不同
+    
+    Args:
+        context (Optional[Dict[str, Any]]): 上下文信息
+        
+    Returns:
+        str: 按键排序的 JSON 文本
+    """
+    return json.dumps(agent_context(context), sort_keys=True, ensure_ascii=False, default=str)
+
+# 中日韩文字每个字符约为一个令牌，其他字符约四个字符一个令牌
+_CJK_PATTERN = re.compile(r'[　-〿㐀-䶿一-鿿豈-﫿＀-￯]')
+
+def char_tokens(char: str) -> float:
+    """
+    估算单个字符对应的令牌数
+    
+    Args:
+        char (str): 字符
+        
+    Returns:
+        float: 令牌数
+    """
+    return 1.0 if _CJK_PATTERN.match(char) else 0.25
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的令牌数，不依赖具体模型的分词器
+    
+    Args:
+        text (str): 文本
+        
+    Returns:
+        int: 令牌数
+    """
+    if not text:
+        return 0
+        
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + -(-(len(text) - cjk_count) // 4)
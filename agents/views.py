@@ -3,8 +3,9 @@ AI 助手视图函数
 """
 import json
 import logging
+import time
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
@@ -13,10 +14,13 @@ from django.views import View
 from django.core.paginator import Paginator
 from django.db import transaction
 from django.conf import settings
+from django.urls import reverse
 
 from agents.models import AIInteraction, AgentConfig
 from agents.agent.core import EduSysAgent, get_edusys_agent
 from agents import tasks
+from agents.jobs import JobQueueFull
+from agents.config import BATCH_CONFIG
 from courses.models import Course
 
 # 配置日志
@@ -44,7 +48,169 @@ def check_ai_access(user, course):
     return False
 
 # 从 utils.py 导入工具函数
-from agents.utils import format_error_response, format_success_response
+from agents.utils import format_error_response, format_success_response, format_sse_event
+from agents.conversation import prepare_conversation
+from agents.admission import AdmissionRejected, admission_controller
+from agents.deadline import STOP_CANCELLED, partial_result
+
+def stream_ai_response(user_id, course_id, question, prompt, context, interaction_type, mode=None):
+    """
+    以 SSE 格式产出 AI 处理事件，完成后保存交互记录
+    
+    Args:
+        user_id (int): 用户ID
+        course_id (int): 课程ID，通用助手为None
+        question (str): 用户提问
+        prompt (str): 提示词
+        context (dict): 上下文信息
+        interaction_type (str): 交互类型
+        mode (str): 回答方式（agent / rag），为None时使用代理配置
+        
+    Yields:
+        str: SSE 消息文本
+    """
+    try:
+        response = None
+        partial_answer = ''
+        try:
+            for event in tasks.stream_ai_process(prompt, context, 'question_answering', question, mode):
+                if event["event"] == "final_answer":
+                    response = event["data"]["response"]
+                elif event["event"] == "step" and event["data"].get("observations"):
+                    partial_answer = event["data"]["observations"]
+                yield format_sse_event(event["event"], event["data"])
+        except GeneratorExit:
+            # 客户端断开连接：代理已随生成器关闭停止运行，记录目前得到的部分结果
+            if response is None:
+                context['stop_reason'] = STOP_CANCELLED
+                try:
+                    tasks.save_ai_interaction(
+                        user_id=user_id,
+                        course_id=course_id,
+                        query=question,
+                        response=partial_result(STOP_CANCELLED, partial_answer),
+                        interaction_type=interaction_type,
+                        context=context
+                    )
+                except Exception:
+                    # 错误已记录日志；生成器正在关闭，不能再产出错误事件
+                    pass
+            raise
+            
+        # 保存交互记录
+        interaction_id = tasks.save_ai_interaction(
+            user_id=user_id,
+            course_id=course_id,
+            query=question,
+            response=response,
+            interaction_type=interaction_type,
+            context=context
+        )
+        
+        yield format_sse_event("done", {
+            "interaction_id": interaction_id,
+            "session_id": context.get("session_id"),
+            "query": question,
+            "response": response,
+            "message": "处理完成"
+        })
+        
+    except AdmissionRejected as e:
+        yield format_sse_event(
+            "error",
+            format_error_response("RATE_LIMITED", str(e), {"retry_after": e.retry_after})["error"]
+        )
+    except Exception as e:
+        logger.error(f"AI 流式处理过程中发生错误: {str(e)}")
+        yield format_sse_event(
+            "error",
+            format_error_response(
+                "INTERNAL_ERROR",
+                "处理请求时发生内部错误",
+                {"error_details": str(e)}
+            )["error"]
+        )
+
+def job_accepted_response(interaction_id, session_id=None):
+    """
+    构造后台任务已提交的响应
+    
+    Args:
+        interaction_id (int): 交互记录ID（即任务ID）
+        session_id (int): 对话会话ID
+        
+    Returns:
+        JsonResponse: 202 响应
+    """
+    return JsonResponse(
+        format_success_response({
+            "task_id": interaction_id,
+            "interaction_id": interaction_id,
+            "session_id": session_id,
+            "status": "pending",
+            "status_url": reverse('agents:ai_interaction_status', kwargs={'interaction_id': interaction_id}),
+            "message": "任务已提交"
+        }),
+        status=202
+    )
+
+def job_queue_full_response(error):
+    """
+    构造任务队列已满的响应
+    
+    Args:
+        error (JobQueueFull): 队列已满异常
+        
+    Returns:
+        JsonResponse: 503 响应
+    """
+    response = JsonResponse(
+        format_error_response(
+            "SERVICE_BUSY",
+            "AI 助手当前繁忙，请稍后重试",
+            {"retry_after": error.retry_after}
+        ),
+        status=503
+    )
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+def admission_rejected_response(error):
+    """
+    构造超出速率限制或排队已满的响应
+    
+    Args:
+        error (AdmissionRejected): 准入控制拒绝异常
+        
+    Returns:
+        JsonResponse: 429 响应
+    """
+    response = JsonResponse(
+        format_error_response(
+            "RATE_LIMITED",
+            str(error),
+            {"retry_after": error.retry_after}
+        ),
+        status=429
+    )
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+def sse_response(stream):
+    """
+    构造 SSE 流式响应
+    
+    Args:
+        stream: SSE 消息生成器
+        
+    Returns:
+        StreamingHttpResponse: 流式响应
+    """
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # 禁止反向代理缓冲，保证事件实时到达客户端
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 @csrf_exempt
 @login_required
@@ -52,14 +218,14 @@ from agents.utils import format_error_response, format_success_response
 def ai_assistant_view(request, course_id):
     """
     AI 助手视图函数
-    处理用户提问并返回 AI 回答
+    处理用户提问，默认提交后台任务并返回任务ID（202），请求指定 "async": false 时直接返回 AI 回答
     
     Args:
         request: HTTP 请求对象
         course_id (int): 课程ID
         
     Returns:
-        JsonResponse: AI 回答结果
+        JsonResponse: 任务已提交的响应或 AI 回答结果
     """
     try:
         # 获取课程对象
@@ -108,8 +274,33 @@ def ai_assistant_view(request, course_id):
             "student_id": request.user.id
         }
         
+        # 限制提问速率
+        admission_controller.check_rate(request.user.id, course_id)
+        
+        # 多轮对话：附带同一会话的历史
+        session, prompt = prepare_conversation(
+            request.user.id, course_id, prompt, context, data.get('session_id'), question
+        )
+        
+        # 默认后台执行：立即返回任务ID，由客户端轮询任务状态，不占用 Web 工作线程等待代理运行；
+        # 请求指定 "async": false 时在本请求中执行并直接返回回答
+        if data.get('async', True):
+            try:
+                interaction_id = tasks.create_ai_job(
+                    user_id=request.user.id,
+                    course_id=course_id,
+                    query=question,
+                    prompt=prompt,
+                    interaction_type=interaction_type,
+                    context=context,
+                    mode=data.get('mode')
+                )
+            except JobQueueFull as e:
+                return job_queue_full_response(e)
+            return job_accepted_response(interaction_id, session.id)
+            
         # 执行 AI 处理
-        response = tasks.async_ai_process(prompt, context, 'question_answering')
+        response = tasks.async_ai_process(prompt, context, 'question_answering', question, data.get('mode'))
         
         # 保存交互记录
         interaction_id = tasks.save_ai_interaction(
@@ -125,12 +316,15 @@ def ai_assistant_view(request, course_id):
         return JsonResponse(
             format_success_response({
                 "interaction_id": interaction_id,
+                "session_id": session.id,
                 "query": question,
                 "response": response,
                 "message": "处理完成"
             })
         )
         
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"AI 助手处理过程中发生错误: {str(e)}")
         return JsonResponse(
@@ -142,6 +336,213 @@ def ai_assistant_view(request, course_id):
             status=500
         )
 
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def ai_assistant_batch_view(request, course_id):
+    """
+    AI 助手批量提问视图函数
+    教师一次提交同一课程的多个问题（如考前检查助手的回答），并发处理后返回每个问题的结果和耗时
+    
+    Args:
+        request: HTTP 请求对象
+        course_id (int): 课程ID
+        
+    Returns:
+        JsonResponse: 每个问题的处理结果
+    """
+    try:
+        # 获取课程对象
+        course = get_object_or_404(Course, id=course_id)
+        
+        # 只有教师可以批量提问
+        if not request.user.is_superuser:
+            return JsonResponse(
+                format_error_response(
+                    "PERMISSION_DENIED",
+                    "只有教师可以使用批量提问功能"
+                ),
+                status=403
+            )
+            
+        # 解析请求数据
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                format_error_response(
+                    "INVALID_REQUEST",
+                    "请求数据格式错误"
+                ),
+                status=400
+            )
+            
+        questions = data.get('queries')
+        interaction_type = data.get('interaction_type', 'question')
+        
+        # 验证参数
+        if not isinstance(questions, list) or not questions:
+            return JsonResponse(
+                format_error_response(
+                    "MISSING_PARAMETER",
+                    "缺少必要参数: queries"
+                ),
+                status=400
+            )
+            
+        questions = [str(question).strip() for question in questions]
+        if not all(questions):
+            return JsonResponse(
+                format_error_response(
+                    "INVALID_PARAMETER",
+                    "问题内容不能为空"
+                ),
+                status=400
+            )
+            
+        if len(questions) > BATCH_CONFIG['MAX_QUESTIONS']:
+            return JsonResponse(
+                format_error_response(
+                    "INVALID_PARAMETER",
+                    f"单次最多提交 {BATCH_CONFIG['MAX_QUESTIONS']} 个问题"
+                ),
+                status=400
+            )
+            
+        # 限制提问速率（一次批量提问计一次）
+        admission_controller.check_rate(request.user.id, course.id)
+        
+        # 并发处理全部问题
+        start_time = time.perf_counter()
+        items = tasks.run_ai_batch(request.user.id, course.id, questions, interaction_type, mode=data.get('mode'))
+        total_duration = time.perf_counter() - start_time
+        
+        results = [
+            {
+                "index": item["index"],
+                "interaction_id": item["interaction_id"],
+                "query": item["query"],
+                "status": item["status"],
+                "response": item["response"],
+                "error": item["error"],
+                "cache_hit": item["cache_hit"],
+                "duration": item["duration"],
+            }
+            for item in items
+        ]
+        completed = sum(1 for item in items if item["status"] == 'completed')
+        
+        return JsonResponse(
+            format_success_response({
+                "course_id": course.id,
+                "count": len(results),
+                "completed": completed,
+                "failed": len(results) - completed,
+                "total_duration": total_duration,
+                "results": results,
+                "message": "处理完成"
+            })
+        )
+        
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"AI 助手批量提问过程中发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "处理请求时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def ai_assistant_stream_view(request, course_id):
+    """
+    AI 助手流式视图函数
+    以 Server-Sent Events 方式实时返回代理执行步骤和回答
+    
+    Args:
+        request: HTTP 请求对象
+        course_id (int): 课程ID
+        
+    Returns:
+        StreamingHttpResponse: SSE 事件流
+    """
+    try:
+        # 获取课程对象
+        course = get_object_or_404(Course, id=course_id)
+        
+        # 检查权限
+        if not check_ai_access(request.user, course):
+            return JsonResponse(
+                format_error_response(
+                    "PERMISSION_DENIED",
+                    "您没有权限访问此课程的 AI 助手功能"
+                ),
+                status=403
+            )
+            
+        # 解析请求数据
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                format_error_response(
+                    "INVALID_REQUEST",
+                    "请求数据格式错误"
+                ),
+                status=400
+            )
+            
+        question = data.get('query')
+        interaction_type = data.get('interaction_type', 'question')
+        
+        # 验证参数
+        if not question:
+            return JsonResponse(
+                format_error_response(
+                    "MISSING_PARAMETER",
+                    "缺少必要参数: query"
+                ),
+                status=400
+            )
+            
+        # 构造提示词
+        prompt = f"关于课程{course_id}的问题：{question}"
+        context = {
+            "course_id": course_id,
+            "student_id": request.user.id
+        }
+        
+        # 限制提问速率
+        admission_controller.check_rate(request.user.id, course_id)
+        
+        # 多轮对话：附带同一会话的历史
+        session, prompt = prepare_conversation(
+            request.user.id, course_id, prompt, context, data.get('session_id'), question
+        )
+        
+        return sse_response(
+            stream_ai_response(request.user.id, course_id, question, prompt, context, interaction_type, data.get('mode'))
+        )
+        
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"AI 助手流式处理过程中发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "处理请求时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
+
 @login_required
 @require_http_methods(["GET"])
 def ai_interactions_history(request):
@@ -255,6 +656,50 @@ def ai_interaction_detail(request, interaction_id):
             status=500
         )
 
+@login_required
+@require_http_methods(["GET"])
+def ai_interaction_status(request, interaction_id):
+    """
+    获取后台 AI 任务状态
+    
+    Args:
+        request: HTTP 请求对象
+        interaction_id (int): 交互记录ID（即任务ID）
+        
+    Returns:
+        JsonResponse: 任务状态，完成后包含 AI 回答
+    """
+    try:
+        # 获取交互记录
+        interaction = get_object_or_404(AIInteraction, id=interaction_id, user=request.user)
+        
+        result = {
+            "task_id": interaction.id,
+            "interaction_id": interaction.id,
+            "status": interaction.status,
+            "query": interaction.query,
+            "started_at": interaction.started_at.isoformat() if interaction.started_at else None,
+            "completed_at": interaction.completed_at.isoformat() if interaction.completed_at else None,
+        }
+        
+        if interaction.status == 'completed':
+            result["response"] = interaction.response
+        elif interaction.status == 'failed':
+            result["error_message"] = interaction.error_message
+            
+        return JsonResponse(format_success_response(result))
+        
+    except Exception as e:
+        logger.error(f"获取 AI 任务状态时发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "获取任务状态时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
+
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
@@ -360,13 +805,13 @@ def async_ai_process(prompt, context=None):
 def general_ai_assistant_view(request):
     """
     通用 AI 助手视图函数
-    处理用户提问并返回 AI 回答，不依赖于特定课程
+    处理用户提问，不依赖于特定课程；默认提交后台任务并返回任务ID（202），请求指定 "async": false 时直接返回 AI 回答
     
     Args:
         request: HTTP 请求对象
         
     Returns:
-        JsonResponse: AI 回答结果
+        JsonResponse: 任务已提交的响应或 AI 回答结果
     """
     try:
         logger.info(f"User in general_ai_assistant_view: {request.user}")
@@ -404,8 +849,33 @@ def general_ai_assistant_view(request):
             "interaction_type": interaction_type
         }
         
+        # 限制提问速率
+        admission_controller.check_rate(request.user.id, None)
+        
+        # 多轮对话：附带同一会话的历史
+        session, prompt = prepare_conversation(
+            request.user.id, None, prompt, context, data.get('session_id'), question
+        )
+        
+        # 默认后台执行：立即返回任务ID，由客户端轮询任务状态，不占用 Web 工作线程等待代理运行；
+        # 请求指定 "async": false 时在本请求中执行并直接返回回答
+        if data.get('async', True):
+            try:
+                interaction_id = tasks.create_ai_job(
+                    user_id=request.user.id,
+                    course_id=None,
+                    query=question,
+                    prompt=prompt,
+                    interaction_type=interaction_type,
+                    context=context,
+                    mode=data.get('mode')
+                )
+            except JobQueueFull as e:
+                return job_queue_full_response(e)
+            return job_accepted_response(interaction_id, session.id)
+            
         # 执行 AI 处理
-        response = tasks.async_ai_process(prompt, context, 'question_answering')
+        response = tasks.async_ai_process(prompt, context, 'question_answering', question, data.get('mode'))
         
         # 保存交互记录（不关联特定课程）
         interaction_id = tasks.save_ai_interaction(
@@ -421,12 +891,15 @@ def general_ai_assistant_view(request):
         return JsonResponse(
             format_success_response({
                 "interaction_id": interaction_id,
+                "session_id": session.id,
                 "query": question,
                 "response": response,
                 "message": "处理完成"
             })
         )
         
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"通用 AI 助手处理过程中发生错误: {str(e)}")
         return JsonResponse(
@@ -438,6 +911,78 @@ def general_ai_assistant_view(request):
             status=500
         )
 
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def general_ai_assistant_stream_view(request):
+    """
+    通用 AI 助手流式视图函数
+    以 Server-Sent Events 方式实时返回代理执行步骤和回答，不依赖于特定课程
+    
+    Args:
+        request: HTTP 请求对象
+        
+    Returns:
+        StreamingHttpResponse: SSE 事件流
+    """
+    try:
+        # 解析请求数据
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse(
+                format_error_response(
+                    "INVALID_REQUEST",
+                    "请求数据格式错误"
+                ),
+                status=400
+            )
+            
+        question = data.get('query')
+        interaction_type = data.get('interaction_type', 'question')
+        
+        # 验证参数
+        if not question:
+            return JsonResponse(
+                format_error_response(
+                    "MISSING_PARAMETER",
+                    "缺少必要参数: query"
+                ),
+                status=400
+            )
+            
+        # 构造提示词
+        prompt = f"用户问题：{question}"
+        context = {
+            "user_id": request.user.id,
+            "interaction_type": interaction_type
+        }
+        
+        # 限制提问速率
+        admission_controller.check_rate(request.user.id, None)
+        
+        # 多轮对话：附带同一会话的历史
+        session, prompt = prepare_conversation(
+            request.user.id, None, prompt, context, data.get('session_id'), question
+        )
+        
+        return sse_response(
+            stream_ai_response(request.user.id, None, question, prompt, context, interaction_type, data.get('mode'))
+        )
+        
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"通用 AI 助手流式处理过程中发生错误: {str(e)}")
+        return JsonResponse(
+            format_error_response(
+                "INTERNAL_ERROR",
+                "处理请求时发生内部错误",
+                {"error_details": str(e)}
+            ),
+            status=500
+        )
+
 @login_required
 def ai_assistant_page(request):
     """
@@ -105,6 +105,17 @@ DATABASES = {
 }
 
 
+# Cache
+# AI 助手的回答缓存依赖共享缓存在多个工作进程之间失效，生产环境请配置 Redis 或 Memcached
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 